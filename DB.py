@@ -1,23 +1,113 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, Date, DateTime, Numeric, ForeignKey
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, Date, DateTime, Numeric, ForeignKey, Index, DDL, event, text
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 # from sqlalchemy.orm import declarative_base
 # from sqlalchemy.orm import relationship
 from datetime import datetime
+import os
+import socket
+import threading
+
+# Pool sizing. Screens end their transaction after each load (release()), so
+# a connection is needed per load or posting in progress, not per open
+# screen. Size it for the cashiers loading or posting at the same time (under
+# POS_WEB_PORT, one per page at most) plus the background workers: searches
+# (debouncer.WORKERS), invoice rendering, summaries and the change feed's own
+# connection. The server's max_connections must cover POOL_SIZE + MAX_OVERFLOW
+# for every process running the app.
+POOL_SIZE = int(os.environ.get("POS_POOL_SIZE", 10))
+MAX_OVERFLOW = int(os.environ.get("POS_POOL_OVERFLOW", 10))
+
+# Sent as application_name on every connection; change notifications carry
+# it as their origin so a terminal can tell its own writes from others'
+APP_NAME = f"hardwarepos-{socket.gethostname()}-{os.getpid()}"[:63]
+
+_ENGINE = None
+_ENGINE_LOCK = threading.Lock()
+
+# Session factory bound to the pooled engine by get_engine()
+SessionLocal = sessionmaker()
+
+
+def get_engine():
+    """Return the process-wide pooled engine, creating it on first use."""
+    global _ENGINE
+    with _ENGINE_LOCK:
+        if _ENGINE is None:
+            host = "localhost"
+            user = "postgres"  # You might want to change this to 'postgres' or your PostgreSQL username
+            password = "$pwd=Mysql5"
+            db = "hardwarepos"
+            port = 5432  # Default PostgreSQL port
+
+            _ENGINE = create_engine(
+                f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db}",
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_pre_ping=True,     # drop connections the server closed while idle
+                pool_recycle=1800,
+                pool_timeout=10,
+                connect_args={"application_name": APP_NAME},
+            )
+            SessionLocal.configure(bind=_ENGINE)
+        return _ENGINE
 
-def connect_db():
-    host = "localhost"
-    user = "postgres"  # You might want to change this to 'postgres' or your PostgreSQL username
-    password = "$pwd=Mysql5"
-    db = "hardwarepos"
-    port = 5432  # Default PostgreSQL port
 
-    engine = create_engine(f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db}")
+def connect_db():
+    engine = get_engine()
     conn = engine.connect()
     return conn, engine
 # connect_db()
 
+
+def new_session(old=None):
+    """
+    Open a fresh session from the pool, closing `old` first so its connection
+    goes back to the pool. Screens call this each time they are built.
+    """
+    if old is not None:
+        try:
+            old.close()
+        except Exception as e:
+            print(f"Error closing session: {e}")
+    get_engine()
+    return SessionLocal()
+
+
+def release(session):
+    """
+    End `session`'s transaction so its connection goes back to the pool.
+
+    Screens call this once a load is done; otherwise a screen's session sits
+    idle in transaction, holding a pooled connection (and an old snapshot)
+    for as long as the screen is open. The session stays usable and takes a
+    connection again on its next query. Loaded objects keep their values
+    (nothing is expired), so the screen can go on showing them without
+    querying again. A session with changes waiting to be committed is left
+    alone: the screen commits or rolls those back itself.
+    """
+    if session.new or session.dirty or session.deleted:
+        return
+    expire_on_commit = session.expire_on_commit
+    try:
+        session.expire_on_commit = False
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        print(f"Error releasing session: {e}")
+    finally:
+        session.expire_on_commit = expire_on_commit
+
+
 Base = declarative_base()
 
+# The trigram search indexes need pg_trgm; create it before the tables
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+def trgm_index(name, column):
+    """GIN trigram index, so ilike '%term%' can use an index instead of a scan."""
+    return Index(name, column, postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"})
+
 
 class Tax(Base):
     __tablename__ = 'taxes'
@@ -71,6 +161,11 @@ class Unit(Base):
 
 class Product(Base):
     __tablename__ = 'products'
+    __table_args__ = (
+        trgm_index("ix_products_title_trgm", "title"),
+        trgm_index("ix_products_code_trgm", "code"),
+        trgm_index("ix_products_note_trgm", "note"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String(100))
@@ -78,7 +173,7 @@ class Product(Base):
     unit_id = Column(Integer, ForeignKey('units.id'))
     sub_category_id = Column(Integer, ForeignKey('subcategory.id'))
     code = Column(String(10))
-    barcode = Column(String(30))
+    barcode = Column(String(30), index=True)
     has_expire = Column(Boolean)
     image = Column(String(100))
     created_at = Column(DateTime, default=datetime.now)
@@ -94,6 +189,12 @@ class Product(Base):
 
 class Stock(Base):
     __tablename__ = 'stocks'
+    __table_args__ = (
+        Index("ix_stocks_product_status_expire", "product_id", "status", "expire_date"),
+        # billing only ever offers active batches
+        Index("ix_stocks_active_product", "product_id", "expire_date",
+              postgresql_where=text("status = 'active'")),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     stock_in = Column(Numeric(10, 2), default=0)
@@ -104,7 +205,7 @@ class Stock(Base):
     actual_price = Column(Numeric(10, 2), nullable=False)
     min_selling_price = Column(Numeric(10, 2), nullable=False)
     selling_price = Column(Numeric(10, 2), nullable=False)
-    expire_date = Column(Date, nullable=True)
+    expire_date = Column(Date, nullable=True, index=True)
     status = Column(String(10), default='active')
     batch_number = Column(String(20))
     created_at = Column(DateTime, default=datetime.now)
@@ -142,6 +243,10 @@ class User(Base):
 
 class Customer(Base):
     __tablename__ = 'customers'
+    __table_args__ = (
+        trgm_index("ix_customers_name_trgm", "name"),
+        trgm_index("ix_customers_mobile_trgm", "mobile"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(100))
@@ -161,6 +266,11 @@ class Customer(Base):
 
 class Invoice(Base):
     __tablename__ = 'invoices'
+    __table_args__ = (
+        Index("ix_invoices_customer_status", "customer_id", "status"),
+        # keyset pagination in Recent Transactions seeks on (created_on, id)
+        Index("ix_invoices_created_on_id", "created_on", "id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     created_on = Column(DateTime, default=datetime.now)
@@ -201,7 +311,7 @@ class InvoiceHasStock(Base):
     __tablename__ = 'invoice_has_stock'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    invoice_id = Column(Integer, ForeignKey('invoices.id', ondelete='CASCADE'), nullable=False)
+    invoice_id = Column(Integer, ForeignKey('invoices.id', ondelete='CASCADE'), nullable=False, index=True)
     stock_id = Column(Integer, ForeignKey('stocks.id'), nullable=False)
     quantity = Column(Numeric(10, 2), nullable=False)
     unit_price = Column(Numeric(10, 2), nullable=False)
@@ -320,6 +430,9 @@ class GRNTransaction(Base):
 
 class Cheque(Base):
     __tablename__ = 'cheques'
+    __table_args__ = (
+        Index("ix_cheques_date_status", "cheque_date", "status"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     cheque_number = Column(String(20), nullable=False)
@@ -341,7 +454,7 @@ class StockMovement(Base):
     __tablename__ = 'stock_movement'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    stock_id = Column(Integer, ForeignKey('stocks.id', ondelete='CASCADE'), nullable=False)
+    stock_id = Column(Integer, ForeignKey('stocks.id', ondelete='CASCADE'), nullable=False, index=True)
     movement_type = Column(String(10), nullable=False)
     quantity = Column(Numeric(10, 2), nullable=False)
     reference_id = Column(Integer)
@@ -369,7 +482,100 @@ class ExpenseTracker(Base):
     description = Column(Text, nullable=False)
     income = Column(Numeric(10, 2), default=0)
     outcome = Column(Numeric(10, 2), default=0)
-    date = Column(DateTime, default=datetime.now)
+    date = Column(DateTime, default=datetime.now, index=True)
+
+
+# Rollups kept current by metrics.py as documents are posted
+class DailyMetric(Base):
+    __tablename__ = 'daily_metrics'
+
+    day = Column(Date, primary_key=True)
+    sales = Column(Numeric(14, 2), default=0)           # invoice totals
+    income = Column(Numeric(14, 2), default=0)          # paid on invoices, by invoice day
+    expense = Column(Numeric(14, 2), default=0)         # paid on GRNs
+    cash_in = Column(Numeric(14, 2), default=0)         # invoice transactions
+    cash_out = Column(Numeric(14, 2), default=0)        # GRN transactions
+    invoice_count = Column(Integer, default=0)
+    grn_count = Column(Integer, default=0)
+
+    def __repr__(self):
+        return f"<DailyMetric(day={self.day}, sales={self.sales}, expense={self.expense})>"
+
+
+# One row per posting, appended instead of updating the day's row so
+# concurrent checkouts don't queue on it; metrics.fold() moves them into
+# daily_metrics in the background
+class DailyMetricDelta(Base):
+    __tablename__ = 'daily_metric_deltas'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False, index=True)
+    sales = Column(Numeric(14, 2), default=0)
+    income = Column(Numeric(14, 2), default=0)
+    expense = Column(Numeric(14, 2), default=0)
+    cash_in = Column(Numeric(14, 2), default=0)
+    cash_out = Column(Numeric(14, 2), default=0)
+    invoice_count = Column(Integer, default=0)
+    grn_count = Column(Integer, default=0)
+
+    def __repr__(self):
+        return f"<DailyMetricDelta(day={self.day}, sales={self.sales}, expense={self.expense})>"
+
+
+class ProductDailySales(Base):
+    __tablename__ = 'product_daily_sales'
+
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    quantity = Column(Numeric(14, 2), default=0)
+    revenue = Column(Numeric(14, 2), default=0)
+
+    def __repr__(self):
+        return f"<ProductDailySales(day={self.day}, product={self.product_id}, qty={self.quantity})>"
+
+
+class ProductStockLevel(Base):
+    __tablename__ = 'product_stock_levels'
+
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    on_hand = Column(Numeric(14, 2), default=0, index=True)
+
+    def __repr__(self):
+        return f"<ProductStockLevel(product={self.product_id}, on_hand={self.on_hand})>"
+
+
+# Report summaries refreshed in the background by summaries.py
+class SalesSummary(Base):
+    __tablename__ = 'sales_summary'
+
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    category_id = Column(Integer, ForeignKey('category.id'), index=True)
+    quantity = Column(Numeric(14, 2), default=0)
+    revenue = Column(Numeric(14, 2), default=0)
+    cost = Column(Numeric(14, 2), default=0)
+
+    def __repr__(self):
+        return f"<SalesSummary(day={self.day}, product={self.product_id}, revenue={self.revenue})>"
+
+
+class LedgerSummary(Base):
+    __tablename__ = 'ledger_summary'
+
+    day = Column(Date, primary_key=True)
+    income = Column(Numeric(14, 2), default=0)
+    outcome = Column(Numeric(14, 2), default=0)
+
+    def __repr__(self):
+        return f"<LedgerSummary(day={self.day}, income={self.income}, outcome={self.outcome})>"
+
+
+class SummaryState(Base):
+    __tablename__ = 'summary_state'
+
+    name = Column(String(30), primary_key=True)
+    last_id = Column(Integer, default=0)        # highest source row id already summarised
+    refreshed_at = Column(DateTime)
 
 
 # Create engine and tables
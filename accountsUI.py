@@ -10,6 +10,11 @@ from sqlalchemy import and_
 from sqlalchemy import Column, Integer, Text, Numeric, DateTime
 from sqlalchemy.orm import declarative_base
 
+import DB
+import summaries
+
+SESSION: Session = None
+
 Base = declarative_base()
 
 class ExpenseTracker(Base):
@@ -22,6 +27,7 @@ class ExpenseTracker(Base):
 
 
 def accounts(page: ft.Page, conn, user_id):
+    global SESSION
     import flet as ft
     from datetime import datetime, timedelta
     from decimal import Decimal, ROUND_HALF_UP
@@ -35,8 +41,8 @@ def accounts(page: ft.Page, conn, user_id):
         session = conn
         _owns_session = False
     else:
-        SessionLocal = sessionmaker(bind=conn, autoflush=False, autocommit=False)
-        session = SessionLocal()
+        SESSION = DB.new_session(SESSION)
+        session = SESSION
         _owns_session = True
 
     # --- helpers
@@ -55,11 +61,14 @@ def accounts(page: ft.Page, conn, user_id):
     month_dd = ft.Dropdown(
         label="Month",
         value=str(current_month),
-        options=[ft.dropdown.Option(str(i), text=calendar.month_name[i]) for i in range(1, 13)],
+        options=[ft.dropdown.Option("0", text="Whole year")] +
+                [ft.dropdown.Option(str(i), text=calendar.month_name[i]) for i in range(1, 13)],
         width=180
     )
 
     def _date_options_for(month: int, year: int):
+        if month == 0:
+            return [ft.dropdown.Option("0", text="All days")]
         days_in_month = calendar.monthrange(year, month)[1]
         return [ft.dropdown.Option("0", text="All days")] + [
             ft.dropdown.Option(str(d)) for d in range(1, days_in_month + 1)
@@ -97,6 +106,7 @@ def accounts(page: ft.Page, conn, user_id):
     total_credit_txt = ft.Text("0.00", weight=ft.FontWeight.BOLD)
     total_debit_txt = ft.Text("0.00", weight=ft.FontWeight.BOLD)
     profit_label = ft.Text("Profit: 0.00", weight=ft.FontWeight.BOLD, color=ft.Colors.GREEN)
+    sales_txt = ft.Text("Sales: 0.00 | Cost: 0.00 | Margin: 0.00", weight=ft.FontWeight.BOLD)
 
     totals_row = ft.Row(
         controls=[
@@ -109,7 +119,7 @@ def accounts(page: ft.Page, conn, user_id):
                 padding=10, bgcolor=ft.Colors.with_opacity(0.03, ft.Colors.ERROR), border_radius=10
             ),
             ft.Container(
-                content=ft.Column([profit_label], spacing=4),
+                content=ft.Column([profit_label, sales_txt], spacing=4),
                 padding=10, border_radius=10
             ),
         ],
@@ -154,28 +164,57 @@ def accounts(page: ft.Page, conn, user_id):
     def _selected_month_day():
         return int(month_dd.value), int(date_dd.value)
 
-    def _query_rows():
+    def _period():
         m, d = _selected_month_day()
+        if m == 0:
+            return datetime(current_year, 1, 1), datetime(current_year + 1, 1, 1)
         if d == 0:
             start = datetime(current_year, m, 1)
             end = datetime(current_year + 1, 1, 1) if m == 12 else datetime(current_year, m + 1, 1)
         else:
             start = datetime(current_year, m, d)
             end = start + timedelta(days=1)
+        return start, end
 
+    def _query_rows():
+        start, end = _period()
         q = session.query(ExpenseTracker).filter(
             and_(ExpenseTracker.date >= start, ExpenseTracker.date < end)
         ).order_by(ExpenseTracker.date.asc(), ExpenseTracker.id.asc())
         return q.all()
 
+    def _year_rows():
+        # one row per month, read from the ledger summary
+        return [
+            ft.DataRow(
+                cells=[
+                    ft.DataCell(ft.Text(f"{current_year}-{m:02d}")),
+                    ft.DataCell(ft.Text(calendar.month_name[m])),
+                    ft.DataCell(ft.Text(money(inc))),
+                    ft.DataCell(ft.Text(money(out))),
+                ]
+            )
+            for m, inc, out in summaries.monthly_ledger(session, current_year)
+        ]
+
     def _load_table():
-        rows = _query_rows()
+        start, end = _period()
+        year_view = month_dd.value == "0"
+        rows = [] if year_view else _query_rows()
         table.rows.clear()
 
-        total_credit = Decimal("0.00")
-        total_debit = Decimal("0.00")
+        # totals come from the summaries, not from re-adding every entry
+        total_credit, total_debit = summaries.ledger_totals(session, start, end)
+        total_credit = Decimal(str(total_credit))
+        total_debit = Decimal(str(total_debit))
+        sales = summaries.sales_totals(session, start, end)
+        sales_txt.value = (f"Sales: {money(sales['revenue'])} | Cost: {money(sales['cost'])} | "
+                           f"Margin: {money(sales['margin'])}")
+
+        if year_view:
+            table.rows.extend(_year_rows())
 
-        if not rows:
+        if not rows and not table.rows:
             table.rows.append(
                 ft.DataRow(
                     cells=[
@@ -192,8 +231,6 @@ def accounts(page: ft.Page, conn, user_id):
                 desc = r.description or ""
                 inc = Decimal(str(r.income or 0))
                 out = Decimal(str(r.outcome or 0))
-                total_credit += inc
-                total_debit += out
 
                 table.rows.append(
                     ft.DataRow(
@@ -217,6 +254,8 @@ def accounts(page: ft.Page, conn, user_id):
             profit_label.value = f"Loss: {money(-net)}"
             profit_label.color = ft.Colors.RED
 
+        if _owns_session:
+            DB.release(session)
         page.update()
 
     def _on_month_change(e):
@@ -7,14 +7,19 @@ from sqlalchemy.orm import Session, sessionmaker
 
 # Assuming DB.py contains SQLAlchemy models
 import DB
+import search_index
+from debouncer import Debouncer
 
-from imggen import generate
 
 selected_unit = ''
 
+SESSION: Session = None
+
 
 def addProduct(page: ft.Page, session: Session, user_id):
-    session = Session(session)
+    global SESSION
+    SESSION = DB.new_session(SESSION)
+    session = SESSION
     # Load initial data using SQLAlchemy ORM
     products_q = session.query(DB.Product).all()
     products = [p.__dict__ for p in products_q]
@@ -27,6 +32,7 @@ def addProduct(page: ft.Page, session: Session, user_id):
 
     sub_category_q = session.query(DB.SubCategory.id, DB.SubCategory.name, DB.SubCategory.category_id).all()
     tmp_sb_ctg = {s.id: [s.name, s.category_id] for s in sub_category_q}
+    DB.release(session)
 
     header = ft.Row(
         controls=[
@@ -56,6 +62,7 @@ def addProduct(page: ft.Page, session: Session, user_id):
         if submit_btn.text == "Add Product":
             # Use SQLAlchemy to get max ID
             max_id = session.query(func.max(DB.Product.id)).scalar()
+            DB.release(session)
             i = max_id if max_id is not None else 0
 
             if i < 10:
@@ -110,6 +117,7 @@ def addProduct(page: ft.Page, session: Session, user_id):
         subcategory_q = session.query(DB.SubCategory.id, DB.SubCategory.name).filter(
             DB.SubCategory.category_id == category[category_DD.value]
         ).all()
+        DB.release(session)
         for s in subcategory_q:
             subCategory[s.name] = s.id
             temp[s.name] = s.id
@@ -279,6 +287,7 @@ def addProduct(page: ft.Page, session: Session, user_id):
                 product.image = os.path.basename(
                     product_image.src) if product_image.src and product_image.src != '/' else None
                 session.commit()
+                search_index.INDEX.upsert_product(product)
         else:
             # Use SQLAlchemy insert
             new_product = DB.Product(
@@ -293,6 +302,8 @@ def addProduct(page: ft.Page, session: Session, user_id):
             )
             session.add(new_product)
             session.commit()
+            search_index.INDEX.upsert_product(new_product)
+        DB.release(session)
 
         image_generate.disabled = True
         reset_form(e)
@@ -340,6 +351,8 @@ def addProduct(page: ft.Page, session: Session, user_id):
             )
             page.update()
             unit_name = units.get(selected_unit, "") if selected_unit else ""
+            # google.genai and PIL are heavy; load them only when asked for an image
+            from imggen import generate
             r = generate(title.value, note.value, unit_name)
             product_image.src = r if r else "src/404.png"
             image_container.content = product_image
@@ -482,22 +495,26 @@ def addProduct(page: ft.Page, session: Session, user_id):
         page.update()
 
     def filter_products(e):
-        query = e.control.value.lower()
-        product_data.data = []
-
-        # Use SQLAlchemy ORM to filter products
-        filtered_products_q = (
-            session.query(DB.Product)
-            .filter(
-                or_(
-                    func.lower(DB.Product.code).like(f'%{query}%'),
-                    func.lower(DB.Product.title).like(f'%{query}%'),
-                    func.lower(DB.Product.note).like(f'%{query}%')
+        product_search(e.control.value.lower())
+
+    def search_products(query):
+        # Runs on the search worker, so it takes its own short-lived session
+        with DB.SessionLocal() as search_session:
+            return (
+                search_session.query(DB.Product)
+                .filter(
+                    or_(
+                        func.lower(DB.Product.code).like(f'%{query}%'),
+                        func.lower(DB.Product.title).like(f'%{query}%'),
+                        func.lower(DB.Product.note).like(f'%{query}%')
+                    )
                 )
+                .limit(5)
+                .all()
             )
-            .limit(5)
-            .all()
-        )
+
+    def show_products(query, filtered_products_q):
+        product_data.data = []
 
         for p in filtered_products_q:
             unit_name = units.get(p.unit_id)
@@ -524,6 +541,8 @@ def addProduct(page: ft.Page, session: Session, user_id):
         product_table.rows = product_data.data
         page.update()
 
+    product_search = Debouncer(search_products, show_products)
+
     search_bar = ft.TextField(
         label="Product",
         hint_text="Search and select product...",
@@ -1,13 +1,16 @@
 import flet as ft
 from datetime import datetime
-import pandas as pd
 from sqlalchemy.orm import Session
 from sqlalchemy import create_engine, update, select, or_, text
 
 import DB
+import rows
+import metrics
+import postings
+from debouncer import Debouncer
 
 CONN: create_engine
-SESSION: Session
+SESSION: Session = None
 
 products = ""
 
@@ -25,7 +28,7 @@ def addStock(page: ft.Page, conn: create_engine, user_id):
     global CONN, products, USER_ID, filtered_products, SESSION
 
     CONN = conn
-    SESSION = Session(CONN)
+    SESSION = DB.new_session(SESSION)
     USER_ID = user_id
 
     # Convert SQL to SQLAlchemy
@@ -36,6 +39,7 @@ def addStock(page: ft.Page, conn: create_engine, user_id):
     units_query = SESSION.query(DB.Unit).all()
     for unit in units_query:
         units[unit.id] = unit.unit
+    DB.release(SESSION)
 
     page.theme_mode = ft.ThemeMode.LIGHT
     page.padding = 0
@@ -100,13 +104,19 @@ def addStock(page: ft.Page, conn: create_engine, user_id):
         max_price.update()
 
     def filter_products(e):
-        global filtered_products
         query = e.control.value.lower()
         if not query:
+            product_search_debouncer.cancel()
             product_dropdown_container.visible = False
+            product_dropdown.update()
+            page.update()
         else:
-            # Convert SQL to SQLAlchemy
-            filtered_products_query = SESSION.query(DB.Product).filter(
+            product_search_debouncer(query)
+
+    def search_products(query):
+        # Runs on the search worker, so it takes its own short-lived session
+        with DB.SessionLocal() as session:
+            filtered_products_query = session.query(DB.Product).filter(
                 or_(
                     DB.Product.code.ilike(f"%{query}%"),
                     DB.Product.id.ilike(f"%{query}%"),
@@ -115,30 +125,36 @@ def addStock(page: ft.Page, conn: create_engine, user_id):
                 )
             ).limit(5).all()
 
-            filtered_products = [p.__dict__ for p in filtered_products_query]
-            page.update()
+            return [p.__dict__ for p in filtered_products_query]
 
-            if filtered_products:
-                product_dropdown.controls = [
-                    ft.ListTile(
-                        title=ft.Text(fp["title"]),
-                        subtitle=ft.Text(f"Code: {fp['code']}", size=12),
-                        trailing=ft.Container(
-                            content=ft.Text(units[fp["unit_id"]], size=12),
-                            bgcolor="#dbeafe",
-                            padding=5,
-                            border_radius=10
-                        ),
-                        on_click=lambda e, p=fp: select_product(p),
-                        data=fp
-                    ) for fp in filtered_products
-                ]
-            else:
-                product_dropdown_container.visible = False
+    def show_products(query, results):
+        global filtered_products
+        filtered_products = results
+        page.update()
+
+        if filtered_products:
+            product_dropdown.controls = [
+                ft.ListTile(
+                    title=ft.Text(fp["title"]),
+                    subtitle=ft.Text(f"Code: {fp['code']}", size=12),
+                    trailing=ft.Container(
+                        content=ft.Text(units[fp["unit_id"]], size=12),
+                        bgcolor="#dbeafe",
+                        padding=5,
+                        border_radius=10
+                    ),
+                    on_click=lambda e, p=fp: select_product(p),
+                    data=fp
+                ) for fp in filtered_products
+            ]
+        else:
+            product_dropdown_container.visible = False
 
         product_dropdown.update()
         page.update()
 
+    product_search_debouncer = Debouncer(search_products, show_products)
+
     def filter_supplier(e):
         query = e.control.value.lower()
         if not query:
@@ -158,6 +174,7 @@ def addStock(page: ft.Page, conn: create_engine, user_id):
             ).limit(5).all()
 
             filtered_suppliers = [s.__dict__ for s in filtered_suppliers_query]
+            DB.release(SESSION)
 
             if filtered_suppliers:
                 supplier_dropdown.controls = [
@@ -553,42 +570,20 @@ def addStock(page: ft.Page, conn: create_engine, user_id):
     def select_product(product):
         global selected_product, selected_stocks
 
+        product_search_debouncer.cancel()
         selected_product = product
 
-        # Convert SQL to SQLAlchemy
-        stock_query = SESSION.query(DB.Stock).filter(DB.Stock.product_id == selected_product['id']).all()
-
-        # Convert to list of dictionaries
-        stock_list = []
-        for stock in stock_query:
-            stock_dict = {c.name: getattr(stock, c.name) for c in stock.__table__.columns}
-            stock_list.append(stock_dict)
-
-        # Create DataFrame for easier manipulation
-        stock = pd.DataFrame(stock_list)
-        if not stock.empty:
-            stock.drop(columns="product_id", inplace=True, errors='ignore')
-
-        temp = stock["status"].copy() if not stock.empty else pd.Series()
-
-        # Update status for expired items
-        if not stock.empty and 'expire_date' in stock.columns:
-            stock["status"] = [
-                ("Expired" if date and date < datetime.now().date() else status_val)
-                for date, status_val in zip(stock["expire_date"], stock["status"])
-            ]
-
-            # Update database for expired items
-            for i, (old_status, new_status) in enumerate(zip(temp, stock["status"])):
-                if old_status != new_status and new_status == "Expired":
-                    SESSION.execute(
-                        update(DB.Stock)
-                        .where(DB.Stock.id == stock['id'].iloc[i])
-                        .values(status='Expired')
-                    )
-            SESSION.commit()
+        # mark this product's lapsed batches Expired, then read its stock
+        postings.expire_batches(SESSION, selected_product['id'])
+        SESSION.commit()
 
-        selected_stocks = stock.to_dict("records") if not stock.empty else []
+        selected_stocks = rows.as_dicts(
+            SESSION,
+            select(*[c for c in DB.Stock.__table__.columns if c.name != "product_id"])
+            .where(DB.Stock.product_id == selected_product['id'])
+            .order_by(DB.Stock.id)
+        )
+        DB.release(SESSION)
 
         product_search.value = product["title"]
         selected_product_id.value = product["id"]
@@ -837,6 +832,8 @@ def addStock(page: ft.Page, conn: create_engine, user_id):
         )
 
         SESSION.add(new_stock)
+        if new_stock.status == "active":
+            metrics.record_stock_in(SESSION, [(new_stock.product_id, new_stock.stock_in)])
         SESSION.commit()
 
         if selected_product["has_expire"]:
@@ -0,0 +1,205 @@
+# allocation.py
+# FEFO stock allocation for checkout. allocate() splits a product quantity
+# across the product's active, unexpired batches, first-expiring first, and
+# row-locks every batch it takes so two terminals can't sell the same units.
+#
+# Batches are claimed with SELECT ... FOR UPDATE SKIP LOCKED: a checkout
+# passes over batches another checkout is holding and takes the next ones,
+# so terminals selling the same product run side by side instead of
+# queueing on its first batch. Only when the free batches can't cover the
+# sale does it wait for the held ones. It then gives back everything the
+# first pass claimed (the pass runs in a savepoint, and rolling a savepoint
+# back releases its row locks) and locks all candidate batches of the
+# sale's products in one statement, in id order, waiting for their holders
+# (plain FOR UPDATE; Postgres re-reads current_stock once the other
+# checkout commits). Every lock a checkout waits for is therefore taken in
+# stock id order, with nothing else held, the same order
+# postings.post_invoice_lines locks hand-picked batches in, so two
+# checkouts can't deadlock on each other. If the stock still isn't enough,
+# OutOfStock is raised and the caller rolls back.
+#
+# Locks last until the caller's transaction ends, so a sale should be
+# allocated before anything else in it takes locks. The stock itself is
+# decremented by postings.post_invoice_lines along with the rest of the
+# invoice, whose UPDATE also refuses to take a batch below zero.
+#
+# next_batch() is the read-only version the billing screen uses to pick
+# the batch a scanned product goes to.
+
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import or_, select
+
+import DB
+
+MAX_CLAIM = 8   # most batches locked per round trip
+
+
+class OutOfStock(Exception):
+    """A sale asks for more than is in stock. Nothing has been written."""
+
+    def __init__(self, requested, available, product_id=None, stock_id=None):
+        self.requested = requested
+        self.available = available
+        self.product_id = product_id
+        self.stock_id = stock_id
+        what = f"batch #{stock_id}" if stock_id is not None else f"product #{product_id}"
+        super().__init__(f"Only {available} left of {what} (asked for {requested})")
+
+
+def _sellable(today):
+    s = DB.Stock
+    return (
+        s.status == 'active',
+        s.current_stock > 0,
+        or_(s.expire_date.is_(None), s.expire_date >= today),
+    )
+
+
+def _fefo(row):
+    # first-expiring first; batches that never expire last, oldest id first
+    return (row.expire_date is None, row.expire_date or date.min, row.id)
+
+
+def _candidates(product_id, today, exclude=()):
+    s = DB.Stock
+    stmt = (
+        select(s.id, s.current_stock, s.selling_price, s.min_selling_price, s.expire_date)
+        .where(s.product_id == product_id, *_sellable(today))
+        .order_by(s.expire_date.asc().nulls_last(), s.id.asc())
+    )
+    if exclude:
+        stmt = stmt.where(s.id.not_in(list(exclude)))
+    return stmt
+
+
+def _claim(session, product_id, need, today, taken):
+    """Lock free FEFO batches into `taken` until `need` is covered; return what is still needed."""
+    # 1 batch first (most sales fit in one), then 2, 4, ... so a small sale
+    # doesn't hold locks on batches it never uses
+    claimed = []
+    limit = 1
+    while need > 0:
+        rows = session.execute(
+            _candidates(product_id, today, taken)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            taken.add(row.id)
+            if need <= 0:
+                continue
+            take = min(need, row.current_stock)
+            claimed.append((row.id, take, row.selling_price))
+            need -= take
+        limit = min(limit * 2, MAX_CLAIM)
+    return need, claimed
+
+
+def _claim_blocking(session, wanted, today):
+    """Lock every candidate batch of `wanted`'s products in id order, waiting for holders, and split."""
+    s = DB.Stock
+    rows = session.execute(
+        select(s.id, s.product_id, s.current_stock, s.selling_price, s.expire_date)
+        .where(s.product_id.in_(sorted({product_id for product_id, _ in wanted})), *_sellable(today))
+        .order_by(s.id)
+        .with_for_update()
+    ).all()
+    batches = defaultdict(list)     # product id -> [[stock id, units left, price]] in FEFO order
+    for row in sorted(rows, key=_fefo):
+        batches[row.product_id].append([row.id, row.current_stock, row.selling_price])
+
+    result = []
+    for product_id, qty in wanted:
+        need, claimed = qty, []
+        for batch in batches[product_id]:
+            if need <= 0:
+                break
+            take = min(need, batch[1])
+            if take > 0:
+                claimed.append((batch[0], take, batch[2]))
+                batch[1] -= take
+                need -= take
+        if need > 0:
+            raise OutOfStock(qty, qty - need, product_id=product_id)
+        result.append(claimed)
+    return result
+
+
+class _Short(Exception):
+    """The free batches don't cover the sale; rolls the SKIP LOCKED pass back."""
+
+
+def allocate_many(session, wanted, today=None):
+    """
+    Claim every (product_id, qty) of `wanted` in first-expiring-first-out order.
+
+    Returns one [(stock_id, qty, selling_price)] per entry, in FEFO order;
+    the batches stay locked until the session's transaction ends. Raises
+    OutOfStock for the first product whose sellable batches hold less than
+    asked for.
+    """
+    wanted = [(product_id, Decimal(str(qty))) for product_id, qty in wanted]
+    today = today or datetime.now().date()
+
+    try:
+        with session.begin_nested():
+            taken, result = set(), []
+            for product_id, qty in wanted:
+                need, claimed = _claim(session, product_id, qty, today, taken)
+                if need > 0:
+                    raise _Short()
+                result.append(claimed)
+        return result
+    except _Short:
+        # the savepoint is gone and with it every lock the first pass took
+        return _claim_blocking(session, wanted, today)
+
+
+def allocate(session, product_id, qty, today=None):
+    """
+    Claim `qty` of `product_id` from its batches in first-expiring-first-out order.
+
+    Returns [(stock_id, qty, selling_price)] in FEFO order; the batches stay
+    locked until the session's transaction ends. Raises OutOfStock when the
+    product's sellable batches hold less than `qty`.
+    """
+    return allocate_many(session, [(product_id, qty)], today)[0]
+
+
+def allocate_lines(session, items, today=None):
+    """
+    Expand product-level sale lines into batch lines for post_invoice_lines().
+
+    `items` are dicts with product_id and qty, and optionally unit_price
+    (defaults to each batch's selling price).
+    """
+    items = sorted(items, key=lambda item: item["product_id"])
+    claims = allocate_many(session, [(item["product_id"], item["qty"]) for item in items], today)
+    lines = []
+    for item, claimed in zip(items, claims):
+        for stock_id, take, price in claimed:
+            lines.append({
+                "stock_id": stock_id,
+                "qty": take,
+                "unit_price": item.get("unit_price", price),
+                "max_price": price,
+            })
+    return lines
+
+
+def next_batch(session, product_id, held=None, today=None):
+    """
+    The first-expiring sellable batch of `product_id` that still has stock
+    once the quantities in `held` ({stock_id: qty}, e.g. what an open bill
+    already holds) are taken out, or None. Nothing is locked.
+    """
+    held = held or {}
+    for row in session.execute(_candidates(product_id, today or datetime.now().date())):
+        if row.current_stock - held.get(row.id, 0) > 0:
+            return row
+    return None
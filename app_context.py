@@ -0,0 +1,114 @@
+# app_context.py
+# Per-page application context, so one process can serve many cashiers
+# (Flet web mode) without them sharing a bill.
+#
+# The screens keep their state where they always have: module globals and
+# class attributes (SESSION, Bill.bills, Tab.tabs, Item.items, bill_tabs,
+# products_list, ...). A context gives its page a private copy of every
+# screen module it opens, executed from the already-imported module's spec,
+# so all of that state - and the DB session each screen opens from the
+# pool - belongs to exactly one page. Process-wide services (the engine
+# pool, search index, change feed, invoice queue, summaries) stay shared;
+# the change feed keeps their caches in step across worker processes.
+#
+# prewarm() loads the page's copies of the other screens in the background
+# once the first one is shown, so later clicks neither import nor execute a
+# module.
+#
+# When the page goes away, close() runs each module's close() hook if it
+# has one, returns its SESSION to the pool, and calls the on_close callbacks.
+
+import importlib.util
+import threading
+import time
+
+import screens
+
+
+def _private_copy(module):
+    """A fresh, unregistered instance of `module`: same code, its own globals."""
+    spec = module.__spec__
+    copy = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(copy)
+    return copy
+
+
+class AppContext:
+    """What one page owns: its user, its screen modules and their sessions."""
+
+    def __init__(self, page, engine, user_id, registry=screens.REGISTRY):
+        self.page = page
+        self.engine = engine
+        self.user_id = user_id
+        self.registry = registry
+        self._modules = {}       # module name -> private copy
+        self._closers = []
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def module(self, index):
+        """This page's copy of nav item `index`'s module, loading it on first use."""
+        name = self.registry[index].module
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("page context is closed")
+            module = self._modules.get(name)
+            if module is None:
+                module = _private_copy(self.registry.module(index))
+                self._modules[name] = module
+        return module
+
+    def loaded_module(self, index):
+        """This page's copy of the module if it has been loaded, else None."""
+        return self._modules.get(self.registry[index].module)
+
+    def build(self, index):
+        """Build nav item `index`'s screen for this page."""
+        fn = getattr(self.module(index), self.registry[index].function)
+        return fn(self.page, self.engine, self.user_id)
+
+    def prewarm(self, skip=(), delay=1.0):
+        """Load every other screen module for this page on a daemon thread, after `delay` seconds."""
+        def run():
+            time.sleep(delay)
+            for index in range(len(self.registry)):
+                if self.closed:
+                    return
+                if index in skip or self.loaded_module(index) is not None:
+                    continue
+                try:
+                    self.module(index)
+                except Exception as e:
+                    if not self.closed:
+                        print(f"Error prewarming {self.registry[index].label}: {e}")
+
+        thread = threading.Thread(target=run, name="prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def on_close(self, callback):
+        self._closers.append(callback)
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            modules, self._modules = list(self._modules.values()), {}
+
+        for module in modules:
+            try:
+                hook = getattr(module, "close", None)
+                if hook is not None:
+                    hook()
+                session = getattr(module, "SESSION", None)
+                if session is not None:
+                    session.close()
+            except Exception as e:
+                print(f"Error closing {module.__name__}: {e}")
+
+        for callback in self._closers:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error closing page context: {e}")
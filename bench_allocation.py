@@ -0,0 +1,224 @@
+# bench_allocation.py
+# Contention benchmark for checkout stock allocation: N simulated cashiers
+# sell the same product at once until its batches run dry.
+#
+# "read-modify-write" is what billingUI.Bill.print_bill used to do: read the
+# batch, subtract in Python and write the result back, with nothing stopping
+# two terminals from selling the same units. "fefo" is allocation.allocate_lines
+# plus postings.post_invoice, the whole checkout: batches claimed
+# first-expiring-first with FOR UPDATE SKIP LOCKED, decremented by a guarded
+# UPDATE, and the invoice, its payment and the dashboard rollups written.
+#
+# Each run seeds a throwaway product with a few batches, commits (the
+# cashiers are separate connections) and deletes everything it made at the end,
+# booking the fefo invoices back out of the daily figures.
+#
+#   python bench_allocation.py                 # 1, 4, 8 and 16 cashiers
+#   python bench_allocation.py --cashiers 12   # one run
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+import DB
+import allocation
+import metrics
+import postings
+
+CASHIER_COUNTS = [1, 4, 8, 16]
+LABEL = "bench allocation"
+BATCHES = 5
+STOCK_PER_BATCH = 40
+
+
+def seed(engine):
+    today = datetime.now().date()
+    with Session(engine) as session:
+        product = DB.Product(title=LABEL, code="BENCHALLOC", has_expire=True)
+        session.add(product)
+        session.flush()
+        session.add_all([
+            DB.Stock(product_id=product.id, stock_in=STOCK_PER_BATCH, stock_out=0,
+                     current_stock=STOCK_PER_BATCH, actual_price=80, min_selling_price=90,
+                     selling_price=100, expire_date=today + timedelta(days=30 * (n + 1)),
+                     status='active')
+            for n in range(BATCHES)
+        ])
+        session.commit()
+        return product.id
+
+
+def cleanup(engine, product_id):
+    with Session(engine) as session:
+        stock_ids = select(DB.Stock.id).where(DB.Stock.product_id == product_id)
+        doomed = session.scalars(
+            select(DB.InvoiceHasStock.invoice_id)
+            .where(DB.InvoiceHasStock.stock_id.in_(stock_ids))
+            .distinct()
+        ).all()
+        # only the fefo invoices carry totals and were booked into the rollups
+        booked = session.execute(
+            select(func.date(DB.Invoice.created_on), func.sum(DB.Invoice.total),
+                   func.sum(DB.Invoice.paid_amount), func.count())
+            .where(DB.Invoice.id.in_(doomed), DB.Invoice.total > 0)
+            .group_by(func.date(DB.Invoice.created_on))
+        ).all() if doomed else []
+        for day, total, paid, count in booked:
+            metrics.record_day(session, day, sales=-total, income=-paid, cash_in=-paid, invoice_count=-count)
+        session.execute(delete(DB.InvoiceHasStock).where(DB.InvoiceHasStock.stock_id.in_(stock_ids)))
+        session.execute(delete(DB.StockMovement).where(DB.StockMovement.stock_id.in_(stock_ids)))
+        if doomed:
+            session.execute(delete(DB.InvoiceTransaction).where(DB.InvoiceTransaction.invoice_id.in_(doomed)))
+            session.execute(delete(DB.ExpenseTracker).where(
+                DB.ExpenseTracker.description.in_([f"Invoice #{i} - {LABEL}" for i in doomed])
+            ))
+            session.execute(delete(DB.Invoice).where(DB.Invoice.id.in_(doomed)))
+        session.execute(delete(DB.ProductDailySales).where(DB.ProductDailySales.product_id == product_id))
+        session.execute(delete(DB.ProductStockLevel).where(DB.ProductStockLevel.product_id == product_id))
+        session.execute(delete(DB.Stock).where(DB.Stock.product_id == product_id))
+        session.execute(delete(DB.Product).where(DB.Product.id == product_id))
+        session.commit()
+
+
+def new_invoice(session):
+    inv = DB.Invoice(created_on=datetime.now(), total=0, discount_amount=0, tax_amount=0,
+                     paid_amount=0, status='paid', user_id=1)
+    session.add(inv)
+    session.flush()
+    return inv.id
+
+
+def read_modify_write(session, product_id, qty):
+    """The old path: pick the first batch, subtract in Python, write it back."""
+    today = datetime.now().date()
+    stock = (
+        session.query(DB.Stock)
+        .filter(DB.Stock.product_id == product_id, DB.Stock.status == 'active',
+                DB.Stock.current_stock > 0, DB.Stock.expire_date >= today)
+        .order_by(DB.Stock.expire_date, DB.Stock.id)
+        .first()
+    )
+    if stock is None:
+        raise allocation.OutOfStock(qty, 0, product_id=product_id)
+    invoice_id = new_invoice(session)
+    time.sleep(0.001)  # the cashier's UI work between reading and writing
+    stock.stock_out = (stock.stock_out or 0) + qty
+    stock.current_stock = (stock.current_stock or 0) - qty
+    if stock.current_stock <= 0:
+        stock.status = 'out'
+    session.add(DB.StockMovement(stock_id=stock.id, movement_type='out', quantity=qty,
+                                 reference_id=invoice_id, reference_type='invoice'))
+    session.add(DB.InvoiceHasStock(invoice_id=invoice_id, stock_id=stock.id, quantity=qty,
+                                   unit_price=stock.selling_price, discount_amount=0))
+    session.flush()
+
+
+def fefo(session, product_id, qty):
+    lines = allocation.allocate_lines(session, [{"product_id": product_id, "qty": qty}])
+    total = sum(Decimal(str(line["qty"])) * Decimal(str(line["unit_price"])) for line in lines)
+    postings.post_invoice(session, user_id=1, account_id=1, customer_id=None, lines=lines,
+                          total=total, paid=total, customer_label=LABEL)
+
+
+def cashier(engine, sell, product_id, stats, lock):
+    rng = random.Random(threading.get_ident())
+    latencies, sold, rejected, failed = [], Decimal(0), 0, 0
+    misses = 0
+    while misses < 3:
+        qty = Decimal(rng.randint(1, 3))
+        start = time.perf_counter()
+        with Session(engine) as session:
+            try:
+                sell(session, product_id, qty)
+                session.commit()
+                sold += qty
+                misses = 0
+            except allocation.OutOfStock:
+                session.rollback()
+                rejected += 1
+                misses += 1
+            except Exception as e:
+                session.rollback()
+                failed += 1
+                misses += 1
+                print(f"Error in cashier: {e}")
+        latencies.append(time.perf_counter() - start)
+    with lock:
+        stats["latencies"].extend(latencies)
+        stats["sold"] += sold
+        stats["rejected"] += rejected
+        stats["failed"] += failed
+
+
+def run(engine, sell, cashiers):
+    product_id = seed(engine)
+    stats = {"latencies": [], "sold": Decimal(0), "rejected": 0, "failed": 0}
+    lock = threading.Lock()
+    try:
+        threads = [
+            threading.Thread(target=cashier, args=(engine, sell, product_id, stats, lock))
+            for _ in range(cashiers)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        with Session(engine) as session:
+            left = session.scalar(
+                select(func.coalesce(func.sum(DB.Stock.current_stock), 0))
+                .where(DB.Stock.product_id == product_id)
+            )
+            negative = session.scalar(
+                select(func.count()).where(DB.Stock.product_id == product_id, DB.Stock.current_stock < 0)
+            )
+    finally:
+        cleanup(engine, product_id)
+
+    initial = BATCHES * STOCK_PER_BATCH
+    checkouts = len(stats["latencies"]) - stats["rejected"] - stats["failed"]
+    latencies = sorted(stats["latencies"])
+    return {
+        "per_second": checkouts / elapsed if elapsed else 0.0,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0,
+        # units sold beyond what the batches held, and sales whose decrement was overwritten
+        "oversold": max(Decimal(0), stats["sold"] - initial),
+        "lost": stats["sold"] - (initial - left),
+        "negative": negative,
+        "failed": stats["failed"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checkout allocation contention benchmark")
+    parser.add_argument("--cashiers", type=int, help="run with this many cashiers only")
+    args = parser.parse_args(argv)
+
+    engine = DB.get_engine()
+    counts = [args.cashiers] if args.cashiers else CASHIER_COUNTS
+    strategies = [("read-modify-write", read_modify_write), ("fefo", fefo)]
+
+    print(f"{BATCHES} batches x {STOCK_PER_BATCH} units, cashiers sell 1-3 units per checkout")
+    print(f"{'cashiers':>8} {'strategy':>18} {'checkouts/s':>12} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'oversold':>9} {'lost':>6} {'neg rows':>9} {'errors':>7}")
+    for n in counts:
+        for name, sell in strategies:
+            r = run(engine, sell, n)
+            print(f"{n:>8} {name:>18} {r['per_second']:>12.1f} {r['p50'] * 1000:>8.1f} "
+                  f"{r['p95'] * 1000:>8.1f} {r['oversold']:>9} {r['lost']:>6} {r['negative']:>9} {r['failed']:>7}")
+
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
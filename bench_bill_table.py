@@ -0,0 +1,63 @@
+# bench_bill_table.py
+# Micro-benchmark for a single +/- click on an open bill.
+#
+# "rebuild" is what Item.add/reduce/cal used to do per click: rebuild the
+# table's row list from Bill.data and re-sum every line total.
+# "ledger" is the current path: adjust BillLedger by the changed line only.
+# The ledger's per-click cost should stay flat as the number of lines grows.
+#
+# This times the Python-side bookkeeping only. It does not include Flet's
+# update / diff, which is most of a click's cost on a long bill: to see that,
+# run the app with POS_PROFILE_UI=1 and compare the controls diffed per
+# second (frame_scheduler.stats()) while clicking on a short and a long bill.
+#
+#   python bench_bill_table.py
+
+import random
+import timeit
+
+from bill_ledger import BillLedger
+
+LINE_COUNTS = [5, 50, 150, 500, 1500]
+CLICKS = 2000
+
+
+def rebuild_click(data, grand_total, key, amount):
+    grand_total[key] = amount
+    rows = [i[0] for i in data.values()]
+    return rows, round(sum(grand_total.values()), 2), len(grand_total)
+
+
+def ledger_click(ledger, key, amount):
+    ledger.set(key, amount)
+    return ledger.total, ledger.count
+
+
+def main():
+    print(f"{'lines':>6} {'rebuild us/click':>18} {'ledger us/click':>17}")
+    for n in LINE_COUNTS:
+        data = {k: [object(), 1] for k in range(n)}
+        grand_total = {k: round(random.uniform(10, 5000), 2) for k in range(n)}
+        ledger = BillLedger()
+        for k, v in grand_total.items():
+            ledger.set(k, v)
+
+        keys = [random.randrange(n) for _ in range(CLICKS)]
+        amounts = [round(random.uniform(10, 5000), 2) for _ in range(CLICKS)]
+        clicks = list(zip(keys, amounts))
+
+        rebuild = timeit.timeit(
+            lambda: [rebuild_click(data, grand_total, k, a) for k, a in clicks], number=1
+        )
+        incremental = timeit.timeit(
+            lambda: [ledger_click(ledger, k, a) for k, a in clicks], number=1
+        )
+
+        # both paths must agree on the bill total
+        assert abs(ledger.total - round(sum(grand_total.values()), 2)) < 0.01
+
+        print(f"{n:>6} {rebuild / CLICKS * 1e6:>18.2f} {incremental / CLICKS * 1e6:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# bench_checkout.py
+# Times the stock side of invoice checkout against the configured database.
+#
+# "per-line" is what billingUI.Bill.print_bill used to do: SESSION.get() each
+# stock, adjust it in Python and add one StockMovement / InvoiceHasStock object
+# per line. "bulk" is postings.post_invoice_lines: one UPDATE ... FROM (VALUES)
+# and one executemany per table. Every run is rolled back.
+#
+#   python bench_checkout.py
+
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy.orm import Session
+
+import DB
+import postings
+
+LINE_COUNTS = [5, 50, 200]
+
+
+def per_line(session, invoice_id, lines, now):
+    for line in lines:
+        qty = Decimal(str(line["qty"]))
+        stock_obj = session.get(DB.Stock, line["stock_id"])
+        if stock_obj:
+            stock_obj.stock_out = (stock_obj.stock_out or 0) + qty
+            stock_obj.current_stock = (stock_obj.current_stock or 0) - qty
+            stock_obj.updated_at = now
+            if stock_obj.current_stock <= 0:
+                stock_obj.status = 'out'
+        session.add(DB.StockMovement(stock_id=line["stock_id"], movement_type='out', quantity=qty,
+                                     reference_id=invoice_id, reference_type='invoice'))
+        session.add(DB.InvoiceHasStock(invoice_id=invoice_id, stock_id=line["stock_id"], quantity=qty,
+                                       unit_price=line["unit_price"], discount_amount=0))
+    session.flush()
+
+
+def bulk(session, invoice_id, lines, now):
+    postings.post_invoice_lines(session, invoice_id, lines, now=now)
+    session.flush()
+
+
+def timed(conn, fn, lines):
+    session = Session(conn)
+    try:
+        inv = DB.Invoice(created_on=datetime.now(), total=0, discount_amount=0, tax_amount=0,
+                         paid_amount=0, status='paid', user_id=1)
+        session.add(inv)
+        session.flush()
+        start = time.perf_counter()
+        fn(session, inv.id, lines, datetime.now())
+        return time.perf_counter() - start
+    finally:
+        session.rollback()
+        session.close()
+
+
+def main():
+    conn, engine = DB.connect_db()
+    with Session(conn) as session:
+        stocks = session.query(DB.Stock.id, DB.Stock.selling_price).order_by(DB.Stock.id).limit(max(LINE_COUNTS)).all()
+    conn.rollback()
+
+    if not stocks:
+        print("No stocks in the database; load some data first (onlineDBLoad.py).")
+        return
+
+    print(f"{'lines':>6} {'per-line ms':>12} {'bulk ms':>9}")
+    for n in LINE_COUNTS:
+        lines = [
+            {"stock_id": s.id, "qty": 1, "unit_price": s.selling_price, "max_price": s.selling_price}
+            for s in stocks[:n]
+        ]
+        old = timed(conn, per_line, lines)
+        new = timed(conn, bulk, lines)
+        print(f"{len(lines):>6} {old * 1000:>12.1f} {new * 1000:>9.1f}")
+
+    conn.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# bench_grn.py
+# Times GRN posting against the configured database for 10 / 100 / 1000 lines.
+#
+# "per-line" replays what grnUI.Bill.print_bill used to do for each stock line:
+# commit the stock, sleep 0.1s, look the id up with max(id), then commit the
+# movement. "bulk" is postings.post_grn: one transaction, one multi-row stock
+# INSERT ... RETURNING and one executemany for the movements.
+# Every run is rolled back, so the database is left as it was.
+#
+#   python bench_grn.py            # bulk only
+#   python bench_grn.py --per-line # also time the old path (slow: 0.1s/line)
+
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import DB
+import postings
+
+LINE_COUNTS = [10, 100, 1000]
+
+
+def make_lines(product_ids, n):
+    return [
+        {
+            "product_id": product_ids[i % len(product_ids)],
+            "qty": 10,
+            "cost": 100,
+            "min_price": 110,
+            "sell_price": 120,
+            "expire_date": None,
+        }
+        for i in range(n)
+    ]
+
+
+def bulk(conn, supplier_id, lines):
+    session = Session(conn)
+    start = time.perf_counter()
+    try:
+        postings.post_grn(
+            session, user_id=1, account_id=1, supplier_id=supplier_id,
+            supplier_label="bench", lines=lines, total=1000 * len(lines),
+        )
+        return time.perf_counter() - start
+    finally:
+        session.rollback()
+        session.close()
+
+
+def per_line(conn, supplier_id, lines):
+    # The old path committed as it went; run it inside an outer transaction
+    # with savepoints so it can still be rolled back afterwards.
+    trans = conn.begin_nested() if conn.in_transaction() else conn.begin()
+    session = Session(conn, join_transaction_mode="create_savepoint")
+    start = time.perf_counter()
+    try:
+        grn = DB.GRN(total_amount=0, discount_amount=0, paid_amount=0, status="paid",
+                     supplier_id=supplier_id, user_id=1)
+        session.add(grn)
+        session.commit()
+        grn_id = session.query(func.max(DB.GRN.id)).scalar()
+        for line in lines:
+            session.add(DB.Stock(
+                stock_in=line["qty"], current_stock=line["qty"], product_id=line["product_id"],
+                actual_price=line["cost"], min_selling_price=line["min_price"],
+                selling_price=line["sell_price"], expire_date=None,
+            ))
+            session.commit()
+            time.sleep(0.1)
+            stock_id = session.query(func.max(DB.Stock.id)).scalar()
+            session.add(DB.StockMovement(stock_id=stock_id, movement_type="in", quantity=line["qty"],
+                                         reference_id=grn_id, reference_type="grn"))
+            session.commit()
+        return time.perf_counter() - start
+    finally:
+        session.close()
+        trans.rollback()
+
+
+def main():
+    with_per_line = "--per-line" in sys.argv
+    conn, engine = DB.connect_db()
+
+    with Session(conn) as session:
+        product_ids = [p for (p,) in session.query(DB.Product.id).limit(50)]
+        supplier_id = session.query(func.min(DB.Supplier.id)).scalar()
+    conn.rollback()
+
+    if not product_ids:
+        print("No products in the database; load some data first (onlineDBLoad.py).")
+        return
+
+    print(f"{datetime.now():%Y-%m-%d %H:%M}  products={len(product_ids)}")
+    print(f"{'lines':>6} {'bulk s':>10} {'per-line s':>12}")
+    for n in LINE_COUNTS:
+        lines = make_lines(product_ids, n)
+        t_bulk = bulk(conn, supplier_id, lines)
+        t_old = per_line(conn, supplier_id, lines) if with_per_line else None
+        print(f"{n:>6} {t_bulk:>10.3f} {(f'{t_old:.3f}' if t_old is not None else '-'):>12}")
+
+    conn.close()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# bench_invoice_render.py
+# Renders 1,000 invoices in memory with ProfessionalInvoiceGenerator.
+#
+# "cold" clears the invoice_assets cache before every invoice, which is what
+# each render used to pay (PIL logo drawing, font load, PNG encode).
+# "warm" keeps the cache, so only the invoice's own content is drawn.
+#
+#   python bench_invoice_render.py [count]
+
+import io
+import random
+import sys
+import time
+
+import invoice_assets
+from invoice_generator import Customer, InvoiceItem, ProfessionalInvoiceGenerator
+
+
+def make_invoice(n):
+    items = [
+        InvoiceItem(f"Item {i}", round(random.uniform(50, 5000), 2), random.randint(1, 20))
+        for i in range(random.randint(1, 25))
+    ]
+    customer = Customer(name=f"Customer {n}", phone="0770000000")
+    return items, customer
+
+
+def render(invoices, cold):
+    generator = ProfessionalInvoiceGenerator()
+    start = time.perf_counter()
+    for n, (items, customer) in enumerate(invoices):
+        if cold:
+            invoice_assets.clear()
+        generator.create_invoice(
+            invoice_number=f"INV-{n}",
+            customer=customer,
+            items=items,
+            tax_rate=0,
+            output_path=io.BytesIO(),
+        )
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    random.seed(1)
+    invoices = [make_invoice(n) for n in range(count)]
+
+    cold = render(invoices, cold=True)
+    warm = render(invoices, cold=False)
+    print(f"{count} invoices")
+    print(f"cold: {cold:.2f}s ({cold / count * 1000:.2f} ms/invoice)")
+    print(f"warm: {warm:.2f}s ({warm / count * 1000:.2f} ms/invoice)")
+
+
+if __name__ == "__main__":
+    main()
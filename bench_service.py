@@ -0,0 +1,180 @@
+# bench_service.py
+# Load generator for pos_service.py: many concurrent keep-alive clients
+# replaying a mix of product searches, allocation quotes and (optionally)
+# checkouts, reporting p50 / p99 latency and transactions per second per
+# operation and overall.
+#
+# Checkouts write real invoices and take real stock, so they are off unless
+# the mix asks for them.
+#
+#   python pos_service.py &
+#   python bench_service.py                                  # 1, 8, 32 and 64 clients
+#   python bench_service.py --clients 32 --seconds 20
+#   python bench_service.py --mix search=60,allocate=30,checkout=10
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+
+CLIENT_COUNTS = [1, 8, 32, 64]
+QUERIES = ["", "a", "e", "cement", "paint", "pipe", "nail", "1", "2"]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"search", "allocate", "checkout"}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown operations: {', '.join(sorted(unknown))}")
+    return mix
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        data = json.loads(await self.reader.readexactly(length)) if length else None
+        return status, data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+async def sellable_products(host, port):
+    """[(product_id, price)] with stock on hand, to aim quotes and checkouts at."""
+    client = Client(host, port)
+    try:
+        found = {}
+        for q in QUERIES:
+            status, products = await client.request("GET", f"/products?q={q}&limit=50")
+            if status == 200:
+                for p in products:
+                    if p["stocks"]:
+                        found[p["id"]] = p["stocks"][0]["selling_price"]
+        return list(found.items())
+    finally:
+        await client.close()
+
+
+async def run_client(host, port, mix, products, deadline, samples, rng):
+    client = Client(host, port)
+    ops, weights = zip(*mix.items())
+    try:
+        while time.perf_counter() < deadline:
+            op = rng.choices(ops, weights)[0]
+            if op == "search":
+                method, path, payload = "GET", f"/products?q={rng.choice(QUERIES)}", None
+            elif op == "allocate":
+                product_id, _ = rng.choice(products)
+                method, path, payload = "POST", "/allocations", {"product_id": product_id, "qty": rng.randint(1, 3)}
+            else:
+                product_id, _ = rng.choice(products)
+                method, path, payload = "POST", "/invoices", {
+                    "items": [{"product_id": product_id, "qty": 1}],
+                }
+            start = time.perf_counter()
+            try:
+                status, _ = await client.request(method, path, payload)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                status = 0
+                await client.close()
+                client = Client(host, port)
+            samples[op].append((time.perf_counter() - start, status))
+    finally:
+        await client.close()
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def report_line(label, clients, entries, seconds):
+    ok = sorted(latency for latency, status in entries if status == 200)
+    conflicts = sum(1 for _, status in entries if status == 409)
+    errors = len(entries) - len(ok) - conflicts
+    p50 = statistics.median(ok) if ok else 0.0
+    return (f"{clients:>7} {label:>9} {len(ok) / seconds:>9.1f} {p50 * 1000:>8.1f} "
+            f"{percentile(ok, 0.99) * 1000:>8.1f} {conflicts:>9} {errors:>7}")
+
+
+async def run(host, port, clients, seconds, mix, products):
+    samples = defaultdict(list)
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_client(host, port, mix, products, deadline, samples, random.Random(n))
+        for n in range(clients)
+    ])
+    elapsed = time.perf_counter() - start
+
+    for op in mix:
+        print(report_line(op, clients, samples[op], elapsed))
+    print(report_line("all", clients, [s for entries in samples.values() for s in entries], elapsed))
+
+
+async def main_async(args):
+    mix = dict(args.mix)
+    products = []
+    if {"allocate", "checkout"} & set(mix):
+        products = await sellable_products(args.host, args.port)
+        if not products:
+            print("No products with stock; quotes and checkouts are left out of the mix.")
+            mix.pop("allocate", None)
+            mix.pop("checkout", None)
+    if not mix:
+        return
+
+    print(f"mix {mix}, {args.seconds}s per run against http://{args.host}:{args.port}")
+    print(f"{'clients':>7} {'op':>9} {'tx/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'conflicts':>9} {'errors':>7}")
+    for clients in ([args.clients] if args.clients else CLIENT_COUNTS):
+        await run(args.host, args.port, clients, args.seconds, mix, products)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for pos_service.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--clients", type=int, help="run with this many clients only")
+    parser.add_argument("--seconds", type=float, default=10.0, help="length of each run")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("search=75,allocate=25"),
+                        help="operation weights, e.g. search=60,allocate=30,checkout=10")
+    asyncio.run(main_async(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
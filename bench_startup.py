@@ -0,0 +1,84 @@
+# bench_startup.py
+# Startup cost of the app.
+#
+# "first frame" launches main.py with POS_STARTUP_PROBE=1, which prints the
+# time from the top of main.py to the first page.add() and exits; the wall
+# time also counts interpreter start. Needs the database and a display.
+# "imports" runs `python -X importtime -c "import <module>"` for what main
+# imports eagerly and for each screen module (now loaded on first click),
+# and lists each one's cumulative import time and heaviest dependencies.
+#
+#   python bench_startup.py             # both
+#   python bench_startup.py --imports   # import breakdown only
+
+import os
+import subprocess
+import sys
+import time
+
+from screens import SCREENS
+
+EAGER = ["flet", "sqlalchemy", "DB", "migrate", "search_index", "metrics", "summaries", "invoice_queue", "screens"]
+RUNS = 3
+TOP = 5
+
+
+def first_frame():
+    env = dict(os.environ, POS_STARTUP_PROBE="1")
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "main.py"], env=env, capture_output=True, text=True, timeout=120)
+        wall = time.perf_counter() - started
+        probe = next((line.split()[1] for line in out.stdout.splitlines() if line.startswith("first-frame")), None)
+        if probe is None:
+            print(f"  no first frame (exit {out.returncode}): {out.stderr.strip().splitlines()[-1:]}")
+            return
+        print(f"  first frame {float(probe) * 1000:8.0f} ms   wall {wall * 1000:8.0f} ms")
+
+
+def import_times(module):
+    """(cumulative us for `module`, [(cumulative us, package)] of its heaviest imports)"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    at = next((i for i, (_, name) in enumerate(rows) if name.strip() == module), None)
+    if at is None:
+        return None, []
+    # importtime prints children before their parent: walk back from the
+    # module's line to the previous top-level entry, keeping direct imports
+    deps = []
+    for us, name in reversed(rows[:at]):
+        if not name.startswith("  "):
+            break
+        if not name.startswith("    "):
+            deps.append((us, name))
+    deps.sort(reverse=True)
+    return rows[at][0], deps[:TOP]
+
+
+def imports():
+    for title, modules in [("eager (main.py)", EAGER), ("screens (on first click)", [s.module for s in SCREENS])]:
+        print(f"{title}:")
+        for module in modules:
+            total, deps = import_times(module)
+            if total is None:
+                print(f"  {module:<22} failed to import")
+                continue
+            heaviest = ", ".join(f"{name.strip()} {us / 1000:.0f}ms" for us, name in deps)
+            print(f"  {module:<22} {total / 1000:8.0f} ms   {heaviest}")
+
+
+def main():
+    if "--imports" not in sys.argv:
+        print("time to first frame:")
+        first_frame()
+    imports()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# bench_virtual_table.py
+# Memory and per-scroll cost of the history tables for 1k / 10k / 100k rows.
+#
+# "datarows" is what the screens used to do: one ft.DataRow (plus a second
+# one for the dummy header table) per loaded row. "virtual" is VirtualTable:
+# a list of tuples plus a fixed pool of row controls re-bound on scroll.
+# The virtual table's control count and scroll cost should stay flat.
+#
+#   python bench_virtual_table.py
+
+import random
+import timeit
+import tracemalloc
+from datetime import datetime
+
+import flet as ft
+
+from virtual_table import VColumn, VirtualTable
+
+ROW_COUNTS = [1000, 10000, 100000]
+SCROLLS = 500
+
+
+def make_rows(n):
+    now = datetime.now()
+    return [(i, now, 1500.0, 1500.0, "paid", f"Customer {i}", "Cashier") for i in range(n)]
+
+
+def datarows(rows):
+    def row(r):
+        return ft.DataRow([ft.DataCell(ft.Container(ft.Text(str(v)))) for v in r])
+    return [row(r) for r in rows], [row(r) for r in rows]
+
+
+def virtual(rows):
+    table = VirtualTable([VColumn(label) for label in
+                          ["Invoice ID", "Date", "Total", "Paid", "Status", "Customer", "Cashier"]])
+    table.set_rows(rows)
+    return table
+
+
+def scroll(table, n):
+    # what _on_scroll does for a jump to a random position, minus the UI diff
+    for _ in range(SCROLLS):
+        table._first = random.randrange(max(1, n - 30))
+        table._render()
+
+
+def measure(build, rows):
+    tracemalloc.start()
+    built = build(rows)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return built, size
+
+
+def main():
+    print(f"{'rows':>7} {'datarows MB':>12} {'virtual MB':>11} {'controls':>9} {'scroll us':>10}")
+    for n in ROW_COUNTS:
+        rows = make_rows(n)
+        _, old = measure(datarows, rows) if n <= 10000 else (None, None)
+        table, new = measure(virtual, rows)
+
+        per_scroll = timeit.timeit(lambda: scroll(table, n), number=1) / SCROLLS
+
+        old_mb = f"{old / 1e6:.1f}" if old is not None else "skipped"
+        print(f"{n:>7} {old_mb:>12} {new / 1e6:>11.1f} {len(table._pool):>9} {per_scroll * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# bill_ledger.py
+# Running totals for an open bill. Line totals are kept in integer cents so
+# the running sum never drifts, and every change costs the same no matter how
+# many lines the bill already has.
+
+
+class BillLedger:
+    """Line totals plus a running subtotal; set() and remove() are O(1)."""
+
+    def __init__(self):
+        self.lines = dict()     # line key (stock id) -> line total in cents
+        self._cents = 0
+
+    def set(self, key, amount):
+        """Set a line's total, adjusting the subtotal by the difference only."""
+        cents = int(round(float(amount) * 100))
+        self._cents += cents - self.lines.get(key, 0)
+        self.lines[key] = cents
+
+    def remove(self, key):
+        self._cents -= self.lines.pop(key, 0)
+
+    def clear(self):
+        self.lines.clear()
+        self._cents = 0
+
+    @property
+    def count(self):
+        return len(self.lines)
+
+    @property
+    def total(self):
+        return round(self._cents / 100, 2)
+
+    def __bool__(self):
+        return bool(self.lines)
@@ -1,18 +1,27 @@
 import decimal
+import threading
 import time
 
 import flet as ft
 from datetime import datetime
-import pandas as pd
-from invoice_generator import export_invoice_from_db
 from sqlalchemy import insert, create_engine, select, or_
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 import DB
+import allocation
+import change_feed
+import frame_scheduler
+import invoice_queue
+import metrics
+import postings
+import search_index
+from debouncer import Debouncer
+from bill_ledger import BillLedger
+from allocation import OutOfStock
 from sqlalchemy import or_, func, cast
 from sqlalchemy.types import String
 from sqlalchemy.exc import IntegrityError
 
-SESSION: Session
+SESSION: Session = None
 
 TAX = 0
 
@@ -37,8 +46,17 @@ products_list = ft.ResponsiveRow(
 
 customers = dict()
 
+scan_lock = threading.Lock()
+
+# guards filtered_products / Product.data against the search worker and change feed
+grid_lock = threading.RLock()
+
 CONN: create_engine
 USER_ID: int
+
+# set by bill(): re-runs the product search for whatever is in the search bar
+_refresh_products = None
+PAGE: ft.Page = None
 ACCOUNT_ID: int = 1
 
 class Bill:
@@ -63,7 +81,10 @@ class Bill:
 
         self.data = dict()
         self.dummy_data = dict()
-        self.grandTotal = dict()
+        # id(row) -> its position in bill_table.rows / dummy_table.rows, for replace_row()
+        self.bill_rows = dict()
+        self.dummy_rows = dict()
+        self.ledger = BillLedger()
 
         self.grand_total = ft.Text(
             currency + "0.0",
@@ -165,6 +186,8 @@ class Bill:
             padding=0
         )
 
+        self.customer_search = Debouncer(self.search_customers, self.show_customers)
+
         self.customer_dropdown_container = ft.Container(
             content=self.customer_dropdown,
             margin=ft.margin.only(top=5),
@@ -235,7 +258,7 @@ class Bill:
         )
 
         self.total_amount = ft.Text(
-            value=str(round(sum(self.grandTotal.values()), 2)),
+            value=str(round(self.ledger.total, 2)),
             style=self.body_text
         )
 
@@ -258,12 +281,12 @@ class Bill:
 
         self.tax_amount = ft.Text(
             text_align=ft.TextAlign.RIGHT,
-            value=currency + str(round(sum(self.grandTotal.values()) * float(TAX) / 100, 2)),
+            value=currency + str(round(self.ledger.total * float(TAX) / 100, 2)),
             style=self.body_text
         )
 
         self.amount_to_be_paid = ft.Text(
-            value=currency + str(round(sum(self.grandTotal.values()) * (100+float(TAX)) / 100, 2)),
+            value=currency + str(round(self.ledger.total * (100+float(TAX)) / 100, 2)),
             style=self.body_text
         )
 
@@ -290,7 +313,7 @@ class Bill:
         )
 
         self.balance = ft.Text(
-            value=currency + str(round(sum(self.grandTotal.values()), 2)),
+            value=currency + str(round(self.ledger.total, 2)),
             style=self.body_text,
             color=ft.Colors.RED
         )
@@ -567,15 +590,29 @@ class Bill:
         
         self.bills.append(self)
 
+    def refresh_totals(self):
+        """
+        Push the running totals to their labels. Only these controls are sent
+        to the client, so a quantity change costs the same on a 5-line bill
+        as on a 150-line one.
+        """
+        self.grand_total.value = currency + str(self.ledger.total)
+        self.total_items.value = str(self.ledger.count) + " Item(s)"
+        self.proceed_to_payment.disabled = not self.ledger
+        self.proceed_to_payment.style = ft.ButtonStyle(
+            color=ft.Colors.GREEN if self.ledger else ft.Colors.GREY,
+        )
+        frame_scheduler.FRAMES.mark(self.grand_total, self.total_items, self.proceed_to_payment)
+
     def load_bill(self, e=None):
         """
         Method to transition from bill view to payment view.
         Called when 'Proceed to Payment' button is clicked.
         """
         Tab.tabs[bill_tabs.selected_index].content = self.payment_area
-        self.total_amount.value = currency + str(round(sum(self.grandTotal.values()), 2))
-        self.tax_amount.value = currency + str(round(sum(self.grandTotal.values()) * float(TAX) / 100, 2))
-        self.amount_to_be_paid.value = currency + str(round(sum(self.grandTotal.values()) * (100+float(TAX)) / 100, 2))
+        self.total_amount.value = currency + str(round(self.ledger.total, 2))
+        self.tax_amount.value = currency + str(round(self.ledger.total * float(TAX) / 100, 2))
+        self.amount_to_be_paid.value = currency + str(round(self.ledger.total * (100+float(TAX)) / 100, 2))
         self.balance.value = currency + str(round(float(self.paid_amount.value if self.paid_amount.value else "0.00") - float(self.amount_to_be_paid.value.split(" ")[1]), 2))
         self.paid_amount.value = ""
         self.page.update()
@@ -592,6 +629,7 @@ class Bill:
             existing_customer = SESSION.query(DB.Customer).filter(
                 DB.Customer.mobile == mobile_number.strip()
             ).first()
+            DB.release(SESSION)
             
             if existing_customer:
                 # If we're updating an existing customer and it's their own mobile, allow it
@@ -654,139 +692,69 @@ class Bill:
 
         # Begin a fresh transaction
         try:
-            # Start a new transaction context
             SESSION.close()
-            SESSION = Session(CONN)
-            SESSION.begin()
-            
-            # Create new customer if needed (ORM)
-            if self.new_customer:
-                try:
-                    new_cust = DB.Customer(
-                        name=self.customer_name.value,
-                        mobile=self.customer_mobile.value.strip(),
-                    )
-                    SESSION.add(new_cust)
-                    SESSION.flush()  # allocate id
-                    self.customer_id = new_cust.id
-                except IntegrityError as err:
-                    SESSION.rollback()
-                    self.customer_mobile.error_text = "This mobile number already exists in the system"
-                    self.page.open(ft.SnackBar(
-                        ft.Text("Cannot create customer: Mobile number already exists!", color=ft.Colors.WHITE), 
-                        bgcolor=ft.Colors.RED, 
-                        duration=3000
-                    ))
-                    self.page.update()
-                    return
-
-            # Create invoice (ORM)
-            inv = DB.Invoice(
-                created_on=now_dt,
-                total=Decimal(self.amount_to_be_paid.value.split(' ')[1]),
-                discount_amount=Decimal(self.discount_amount.value or "0"),
-                tax_amount=Decimal(self.tax_amount.value.split(' ')[1]),
-                paid_amount=Decimal(self.paid_amount.value or "0"),
-                status='paid' if balance_amount >= -0.01 else 'pending',  # Fixed balance comparison
-                customer_id=self.customer_id,
-                user_id=USER_ID,
-            )
-            SESSION.add(inv)
-            SESSION.flush() 
-            invoice_id = inv.id
-
-            # Payment transaction (ORM)
-            paid_decimal = Decimal(self.paid_amount.value or "0")
-            if paid_decimal > 0:
-                txn = DB.InvoiceTransaction(
-                    amount=paid_decimal,
-                    date=now_dt,
-                    invoice_id=invoice_id,
-                    account_id=ACCOUNT_ID,
-                    transaction_type='payment',
-                    cheque_number=self.cheque_number.value if self.cheque_number.value else None,
-                )
-                SESSION.add(txn)
-
-                expense_entry = DB.ExpenseTracker(
-                    description=f"Invoice #{invoice_id} - {self.customer_name.value}",
-                    income=paid_decimal,
-                    outcome=Decimal(0),
-                    date=now_dt
-                )
-                
-                SESSION.add(expense_entry)
-
-            # Update stock + movements + invoice items (ORM)
-            for stock_id, stock in Item.items.items():
-                qty = Decimal(str(stock["count"]))
-                unit_price = Decimal(str(stock["price"]))
-                max_price = Decimal(str(stock["max_price"]))
-
-                stock_obj = SESSION.get(DB.Stock, stock_id)
-                if stock_obj:
-                    stock_obj.stock_out = (stock_obj.stock_out or 0) + qty
-                    stock_obj.current_stock = (stock_obj.current_stock or 0) - qty
-                    stock_obj.updated_at = now_dt
-                    if stock_obj.current_stock <= 0:
-                        stock_obj.status = 'out'
-
-                SESSION.add(DB.StockMovement(
-                    stock_id=stock_id,
-                    movement_type='out',
-                    quantity=qty,
-                    reference_id=invoice_id,
-                    reference_type='invoice'
-                ))
+            SESSION = DB.SessionLocal()
 
-                SESSION.add(DB.InvoiceHasStock(
-                    invoice_id=invoice_id,
-                    stock_id=stock_id,
-                    quantity=qty,
-                    unit_price=unit_price,
-                    discount_amount=max_price - unit_price
-                ))
-
-            # Handle cheque if present
+            cheque = None
             if self.cheque_amount.value:
                 try:
-                    date = self.cheque_number.suffix_text.split("-")
-                    yr = int(date[0])
-                    mon = int(date[1])
-                    day = int(date[2])
-                    cheque = DB.Cheque(
-                        cheque_number=self.cheque_number.value,
-                        cheque_date=datetime(yr, mon, day),
-                        customer_id=self.customer_id,
-                        invoice_id=invoice_id,
-                        amount=Decimal(self.cheque_amount.value),
-                        status='pending',
-                    )
-                    expenses = DB.ExpenseTracker(
-                        description=f"Cheque #{self.cheque_number.value} - Invoice #{invoice_id} - {self.customer_name.value}",
-                        outcome=Decimal(self.cheque_amount.value),
-                        income=Decimal(0),
-                        date=now_dt
-                    )
-                    SESSION.add(cheque)
-                    SESSION.add(expenses)
+                    yr, mon, day = (int(part) for part in self.cheque_number.suffix_text.split("-")[:3])
+                    cheque = {
+                        "cheque_number": self.cheque_number.value,
+                        "cheque_date": datetime(yr, mon, day),
+                        "amount": Decimal(self.cheque_amount.value),
+                    }
                 except (ValueError, IndexError) as date_err:
                     print(f"Invalid cheque date format: {date_err}")
 
-            # Customer credit handling - only if balance is significantly negative
-            if balance_amount < -0.01 and self.customer_id:
-                customer_obj = SESSION.get(DB.Customer, self.customer_id)
-                if customer_obj:
-                    # balance_amount is negative; subtracting increases credit owed
-                    customer_obj.credit = (customer_obj.credit or 0) - Decimal(str(balance_amount))
+            # Customer, invoice, payment, cheque, credit, rollups and the stock
+            # side (set-based) in one unit of work
+            try:
+                invoice_id = postings.post_invoice(
+                    SESSION,
+                    user_id=USER_ID,
+                    account_id=ACCOUNT_ID,
+                    customer_id=self.customer_id,
+                    new_customer={
+                        "name": self.customer_name.value,
+                        "mobile": self.customer_mobile.value.strip(),
+                    } if self.new_customer else None,
+                    customer_label=self.customer_name.value,
+                    lines=[
+                        {
+                            "stock_id": stock_id,
+                            "qty": stock["count"],
+                            "unit_price": stock["price"],
+                            "max_price": stock["max_price"],
+                        }
+                        for stock_id, stock in Item.items.items()
+                    ],
+                    total=Decimal(self.amount_to_be_paid.value.split(' ')[1]),
+                    discount=Decimal(self.discount_amount.value or "0"),
+                    tax=Decimal(self.tax_amount.value.split(' ')[1]),
+                    paid=Decimal(self.paid_amount.value or "0"),
+                    cheque=cheque,
+                    cheque_number=self.cheque_number.value if self.cheque_number.value else None,
+                    now=now_dt,
+                )
+            except IntegrityError:
+                if not self.new_customer:
+                    raise
+                SESSION.rollback()
+                self.customer_mobile.error_text = "This mobile number already exists in the system"
+                self.page.open(ft.SnackBar(
+                    ft.Text("Cannot create customer: Mobile number already exists!", color=ft.Colors.WHITE),
+                    bgcolor=ft.Colors.RED,
+                    duration=3000
+                ))
+                self.page.update()
+                return
 
             # Single commit for the entire transaction
             SESSION.commit()
 
-            # Export PDF/PNG/JPG (uses ORM inside helper)
-            print(SESSION)
-            # export_invoice_pdf_png_jpg(SESSION, invoice_id, TAX)
-            export_invoice_from_db(SESSION, invoice_id, TAX)
+            # Render the PDF in the background; the cashier can start the next bill now
+            invoice_queue.QUEUE.submit(invoice_id, TAX, on_done=self.invoice_rendered)
             # generator = ProfessionalInvoiceGenerator()
             # generator.create_invoice(
             #     invoice_number=SESSION.get(DB.Invoice, invoice_id).id,
@@ -804,41 +772,27 @@ class Bill:
             self.delete_bill(e)
 
             # Show comprehensive success message
-            success_message = f"✓ Invoice #{invoice_id} saved successfully!\n✓ PDF receipt exported to local files"
+            success_message = f"✓ Invoice #{invoice_id} saved successfully!\n✓ PDF receipt queued for export"
             self.page.open(ft.SnackBar(
                 ft.Text(success_message, color=ft.Colors.WHITE), 
                 bgcolor=ft.Colors.GREEN, 
                 duration=3000
             ))
 
-            # Reload products (ORM)
-            products = (
-                SESSION.query(DB.Product)
-                .order_by(DB.Product.id.asc())
-                .limit(18)
-                .all()
-            )
-            filtered_products = [
-                {
-                    "id": p.id, "title": p.title, "note": p.note,
-                    "unit_id": p.unit_id, "sub_category_id": p.sub_category_id,
-                    "code": p.code, "barcode": p.barcode, "has_expire": p.has_expire,
-                    "image": p.image,
-                } for p in products
-            ]
-            Product.data = []
-            Stock.data = dict()
-            for i in filtered_products:
-                Product(self.page, i["id"], i["title"], i["note"], i["unit_id"], i["image"])
-            products_list.controls = Product.data
+            # Reload products with their stocks (ORM)
+            show_products(self.page, load_products())
             self.page.update()
 
-            # Export PDF/PNG/JPG (uses ORM inside helper)
-            # export_invoice_pdf_png_jpg(SESSION, invoice_id, TAX)
-            export_invoice_from_db(SESSION, invoice_id, TAX)
-            
             return None
-            
+
+        except OutOfStock as e:
+            # another terminal sold these units first; nothing was written
+            SESSION.rollback()
+            self.page.open(ft.SnackBar(ft.Text(str(e)), bgcolor=ft.Colors.ORANGE, duration=3000))
+            show_products(self.page, load_products())
+            self.page.update()
+            return None
+
         except Exception as e:
             # Safe rollback - check if session is still active
             try:
@@ -848,7 +802,7 @@ class Bill:
                 print(f"Rollback failed: {rollback_err}")
                 # Create a new session if the current one is broken
                 SESSION.close()
-                SESSION = Session(CONN)
+                SESSION = DB.SessionLocal()
             
             print(f"Error in print_bill: {e}")
             self.page.open(ft.SnackBar(ft.Text(f"Error: {str(e)}"), bgcolor=ft.Colors.RED, duration=3000))
@@ -937,6 +891,7 @@ class Bill:
             self.customer_id = None
             self.customer_mobile.value = ""
         self.customer_name.value = customer["name"].title()
+        self.customer_search.cancel()
         self.hide_dropdown()
 
     def show_dropdown(self, e=None):
@@ -944,28 +899,30 @@ class Bill:
         self.page.update()
 
     def filter_customer(self, e):
-        global customers
         query = (self.customer_name.value or "").lower().strip()
         if query == "":
+            self.customer_search.cancel()
             self.hide_dropdown()
             return
 
-        self.show_dropdown()
-
-        # ORM
-        results = (
-            SESSION.query(DB.Customer)
-            .filter(
-                or_(
-                    DB.Customer.name.ilike(f"%{query}%"),
-                    DB.Customer.mobile.ilike(f"%{query}%"),
+        self.customer_search(query)
+
+    def search_customers(self, query):
+        # Runs on the search worker, so it takes its own short-lived session
+        with DB.SessionLocal() as session:
+            results = (
+                session.query(DB.Customer)
+                .filter(
+                    or_(
+                        DB.Customer.name.ilike(f"%{query}%"),
+                        DB.Customer.mobile.ilike(f"%{query}%"),
+                    )
                 )
+                .limit(5)
+                .all()
             )
-            .limit(5)
-            .all()
-        )
 
-        customers = [
+        return [
             {
                 "id": c.id,
                 "name": c.name or "",
@@ -975,6 +932,11 @@ class Bill:
             for c in results
         ]
 
+    def show_customers(self, query, results):
+        global customers
+        customers = results
+
+        self.customer_dropdown.visible = True
         self.customer_dropdown.controls = [
                                             ft.ListTile(
                                                 title=ft.Text(customer["name"]),
@@ -1006,6 +968,18 @@ class Bill:
                                         ]
         self.page.update()
 
+    def invoice_rendered(self, invoice_id, path):
+        # called from the invoice queue's worker thread
+        if path:
+            message, color = f"✓ Invoice #{invoice_id} PDF exported to {path}", ft.Colors.GREEN
+        else:
+            message, color = f"Invoice #{invoice_id} PDF could not be exported; it will be retried on the next start", ft.Colors.RED
+        try:
+            self.page.open(ft.SnackBar(ft.Text(message, color=ft.Colors.WHITE), bgcolor=color, duration=3000))
+            self.page.update()
+        except Exception as e:
+            print(f"Error showing invoice export status: {e}")
+
     def delete_bill(self, e):
         n = self.bills.index(self)-1
         Tab.tabs.pop(n)
@@ -1077,10 +1051,15 @@ class Item:
         self.stock = stock
         self.unit = unit
 
-        if Bill.bills[bill_tabs.selected_index + 1].data.get(self.s_id, [ft.Row(), 0])[1] < self.stock:
-            self.counter = Bill.bills[bill_tabs.selected_index + 1].data.get(self.s_id, [ft.Row(), 0])[1] + 1
+        # the bill this line belongs to, even if another tab is selected later
+        self.bill = Bill.bills[bill_tabs.selected_index + 1]
+
+        prev_row, prev_count = self.bill.data.get(self.s_id, [None, 0])
+        prev_dummy_row = self.bill.dummy_data.get(self.s_id, [None, 0])[0]
+        if prev_count < self.stock:
+            self.counter = prev_count + 1
         else:
-            self.counter = Bill.bills[bill_tabs.selected_index + 1].data.get(self.s_id, [ft.Row(), 0])[1]
+            self.counter = prev_count
         self.add_btn = ft.ElevatedButton(
             text="+",
             width=30,
@@ -1138,10 +1117,7 @@ class Item:
             text_align=ft.TextAlign.CENTER,
         )
 
-        Bill.bills[bill_tabs.selected_index + 1].grandTotal[self.s_id] = round(self.counter * float(self.price.value), 2)
-
-        Bill.bills[bill_tabs.selected_index + 1].grand_total.value = currency + str(round(sum(Bill.bills[bill_tabs.selected_index + 1].grandTotal.values()), 2))
-        Bill.bills[bill_tabs.selected_index + 1].total_items.value = str(len(Bill.bills[bill_tabs.selected_index + 1].grandTotal.values())) + " Item(s)"
+        self.bill.ledger.set(self.s_id, round(self.counter * float(self.price.value), 2))
 
         self.row = ft.DataRow(
             [
@@ -1181,12 +1157,12 @@ class Item:
             ],
         )
 
-        Bill.bills[bill_tabs.selected_index + 1].data[self.s_id] = [self.row, self.counter]
+        self.bill.data[self.s_id] = [self.row, self.counter]
+        self.bill.dummy_data[self.s_id] = [self.dummy_row, self.counter]
 
-        Bill.bills[bill_tabs.selected_index + 1].dummy_data[self.s_id] = [self.dummy_row, self.counter]
-        Bill.bills[bill_tabs.selected_index + 1].bill_table.rows = [i[0] for i in Bill.bills[bill_tabs.selected_index + 1].data.values()]
-
-        Bill.bills[bill_tabs.selected_index + 1].dummy_table.rows = [i[0] for i in Bill.bills[bill_tabs.selected_index + 1].dummy_data.values()]
+        # replace the line in place if this batch is already on the bill, otherwise append it
+        replace_row(self.bill.bill_table, self.bill.bill_rows, prev_row, self.row)
+        replace_row(self.bill.dummy_table, self.bill.dummy_rows, prev_dummy_row, self.dummy_row)
 
         try:
             scroll_to_end()
@@ -1195,9 +1171,6 @@ class Item:
         if int(self.count.value) == self.stock:
             self.add_btn.disabled = True
 
-        Bill.bills[bill_tabs.selected_index + 1].proceed_to_payment.disabled = False
-        Bill.bills[bill_tabs.selected_index + 1].proceed_to_payment.style = ft.ButtonStyle(color=ft.Colors.GREEN,)
-
         temp = {
             "count": 0,
             "price": self.rate,
@@ -1206,23 +1179,15 @@ class Item:
 
         self.items[self.s_id] = {"count": self.items.get(self.s_id, temp)["count"] + 1, "price":self.rate, "max_price": self.rate}
 
-        self.page.update()
+        self.bill.refresh_totals()
+        frame_scheduler.FRAMES.mark(self.bill.bill_table, self.bill.dummy_table)
 
     def add(self, e):
         self.count.value = str(int(self.count.value) + 1)
         self.reduce_btn.disabled = False
-        self.cal()
-        if int(self.count.value) == self.stock:
-            self.add_btn.disabled = True
-
         self.reduce_btn.text = "-"
         self.reduce_btn.icon = None
-        Bill.bills[bill_tabs.selected_index + 1].grand_total.value = currency + str(round(sum(Bill.bills[bill_tabs.selected_index + 1].grandTotal.values()), 2))
-        Bill.bills[bill_tabs.selected_index + 1].total_items.value = str(len(Bill.bills[bill_tabs.selected_index + 1].grandTotal.values())) + " Item(s)"
-
-        Bill.bills[bill_tabs.selected_index + 1].proceed_to_payment.opacity = False
-        Bill.bills[bill_tabs.selected_index + 1].proceed_to_payment.style = ft.ButtonStyle(color=ft.Colors.GREEN,)
-        self.page.update()
+        self.cal()
 
     def cal(self, e=None):
         try:
@@ -1234,7 +1199,7 @@ class Item:
             self.count.value = str(int(self.stock))
 
         if self.count.value == "0":
-            self.reduce(e)
+            self.remove()
             return 0
 
         if self.count.value == "":
@@ -1243,6 +1208,8 @@ class Item:
         if int(self.count.value) == 1:
             self.reduce_btn.text = "🗑"
 
+        self.add_btn.disabled = int(self.count.value) >= self.stock
+
         self.total.value = str(round(float(self.price.value) * float(self.count.value), 2))
         self.dummy_count.width = self.count.width
         self.dummy_price.width = self.price.width
@@ -1250,28 +1217,19 @@ class Item:
 
         self.counter = int(self.count.value)
 
-        if Bill.bills[bill_tabs.selected_index + 1].data[self.s_id]:
-            Bill.bills[bill_tabs.selected_index + 1].data[self.s_id] = [self.row, self.counter]
+        self.bill.data[self.s_id] = [self.row, self.counter]
+        self.bill.ledger.set(self.s_id, round(self.counter * float(self.price.value), 2))
 
-        Bill.bills[bill_tabs.selected_index + 1].grandTotal[self.s_id] = round(self.counter * float(self.price.value), 2)
-
-        Bill.bills[bill_tabs.selected_index + 1].grand_total.value = currency + str(round(sum(Bill.bills[bill_tabs.selected_index + 1].grandTotal.values()), 2))
-        Bill.bills[bill_tabs.selected_index + 1].total_items.value = str(len(Bill.bills[bill_tabs.selected_index + 1].grandTotal.values())) + " Item(s)"
-
-        if not Bill.bills[bill_tabs.selected_index + 1].grandTotal:
-            Bill.bills[bill_tabs.selected_index + 1].proceed_to_payment.disabled = True
-            Bill.bills[bill_tabs.selected_index + 1].proceed_to_payment.style = ft.ButtonStyle(color=ft.Colors.GREY,)
-
-        self.dummy_row.update()
         self.items[self.s_id]["count"] = self.count.value
         self.items[self.s_id]["price"] = self.price.value
 
-        self.page.update()
+        # push only this line and the totals, not the whole page
+        frame_scheduler.FRAMES.mark(self.count, self.total, self.add_btn, self.reduce_btn, self.dummy_row)
+        self.bill.refresh_totals()
 
     def reduce(self, e):
         if self.reduce_btn.text == "🗑":
-            del Bill.bills[bill_tabs.selected_index + 1].data[self.s_id]
-            del Bill.bills[bill_tabs.selected_index + 1].grandTotal[self.s_id]
+            self.remove()
         else:
             self.count.value = str(int(self.count.value) - 1)
             self.add_btn.disabled = False
@@ -1281,16 +1239,38 @@ class Item:
 
             self.cal()
 
-        Bill.bills[bill_tabs.selected_index + 1].grand_total.value = currency + str(round(sum(Bill.bills[bill_tabs.selected_index + 1].grandTotal.values()), 2))
-        Bill.bills[bill_tabs.selected_index + 1].total_items.value = str(len(Bill.bills[bill_tabs.selected_index + 1].grandTotal.values())) + " Item(s)"
-
-        Bill.bills[bill_tabs.selected_index + 1].bill_table.rows = [i[0] for i in Bill.bills[bill_tabs.selected_index + 1].data.values()]
-
-        if not Bill.bills[bill_tabs.selected_index + 1].grandTotal:
-            Bill.bills[bill_tabs.selected_index + 1].proceed_to_payment.disabled = True
-            Bill.bills[bill_tabs.selected_index + 1].proceed_to_payment.style = ft.ButtonStyle(color=ft.Colors.GREY,)
-
-        self.page.update()
+    def remove(self):
+        self.bill.data.pop(self.s_id, None)
+        self.bill.dummy_data.pop(self.s_id, None)
+        self.bill.ledger.remove(self.s_id)
+        self.items.pop(self.s_id, None)
+
+        replace_row(self.bill.bill_table, self.bill.bill_rows, self.row, None)
+        replace_row(self.bill.dummy_table, self.bill.dummy_rows, self.dummy_row, None)
+        frame_scheduler.FRAMES.mark(self.bill.bill_table, self.bill.dummy_table)
+        self.bill.refresh_totals()
+
+
+def replace_row(table, positions, old_row, new_row):
+    """
+    Swap, append or drop a single DataRow without rebuilding the table's row
+    list. `positions` maps id(row) -> index in table.rows and is kept in step,
+    so finding the old row doesn't scan the bill.
+    """
+    if table.rows is None:
+        table.rows = []
+    i = positions.pop(id(old_row), None) if old_row is not None else None
+    if i is None:
+        if new_row is not None:
+            positions[id(new_row)] = len(table.rows)
+            table.rows.append(new_row)
+    elif new_row is None:
+        table.rows.pop(i)
+        for row in table.rows[i:]:
+            positions[id(row)] -= 1
+    else:
+        table.rows[i] = new_row
+        positions[id(new_row)] = i
 
 
 class Stock:
@@ -1347,7 +1327,7 @@ class Stock:
                 self.stck.bgcolor = ft.Colors.GREY_400
             else:
                 self.stck.bgcolor = ft.Colors.GREY_100
-            self.page.update()
+            frame_scheduler.FRAMES.mark(self.stck)
 
         if self.stck not in self.data.get(self.p_id, []):
             self.data[self.p_id] = self.data.get(self.p_id, []) + [self.stck]
@@ -1356,14 +1336,12 @@ class Stock:
         if Tab.tabs[bill_tabs.selected_index].content == Bill.bills[bill_tabs.selected_index + 1].payment_area:
             Bill.bills[bill_tabs.selected_index + 1].back()
         Item(self.page, self.p_id, self.s_id, self.p_name, self.price, self.min_price, self.available, self.unit)
-        self.page.update()
 
 
 class Product:
     data = []
 
-    def __init__(self, page, p_id, title, note, unit, image):
-        global SESSION
+    def __init__(self, page, p_id, title, note, unit, image, stocks):
         self.page = page
         self.id = p_id
         self.title = title
@@ -1371,37 +1349,8 @@ class Product:
         self.unit = unit
         self.image = image
 
-        # ORM: load active stocks for this product
-        stocks = (
-            SESSION.query(DB.Stock)
-            .filter(DB.Stock.product_id == self.id, DB.Stock.status == 'active')
-            .order_by(DB.Stock.id.asc())
-            .all()
-        )
-
-        # respect expire_date filter like your original
-        today = datetime.now().date()
-        filtered = []
-        for s in stocks:
-            # include if expire_date is None or >= today
-            if s.expire_date is None or s.expire_date >= today:
-                filtered.append(s)
-
-        # Convert to dicts that make_card() expected earlier
-        self.stocks = [
-            {
-                "stock_id": s.id,
-                "product_id": s.product_id,
-                "current_stock": s.current_stock,
-                "min_selling_price": s.min_selling_price,
-                "selling_price": s.selling_price,
-                "expire_date": s.expire_date,
-                "status": s.status,
-                # unit name is on Product -> Unit; use cached 'unit' arg
-                "unit_name": units.get(self.unit, ""),
-            }
-            for s in filtered
-        ]
+        # stock dicts come ready-made from load_products()
+        self.stocks = stocks
 
         self.make_card()
 
@@ -1412,7 +1361,7 @@ class Product:
         else:
             self.stock_details.visible = False
             self.img.visible = True
-        self.page.update()
+        frame_scheduler.FRAMES.mark(self.stock_details, self.img)
 
     def make_card(self):
         for i in self.stocks:
@@ -1518,25 +1467,74 @@ def scroll_to_end():
     Bill.bills[bill_tabs.selected_index+1].bill_box.scroll_to(offset=-1, duration=0, curve=ft.AnimationCurve.EASE_IN_OUT)
 
 
-def bill(page: ft.Page, conn, user_id):
-    global filtered_products, CONN, USER_ID, SESSION, TAX
-
-    CONN = conn
-    SESSION = Session(CONN)
-    USER_ID = user_id
+def scan_barcode(page, barcode):
+    """
+    Scanner fast path: resolve a full barcode through the search index and add
+    the product's FEFO batch straight to the active bill, no card click needed.
+    Once the bill holds all of a batch, the next scan goes to the next batch.
+    """
+    product_id = search_index.INDEX.by_barcode(barcode)
+    if product_id is None:
+        page.open(ft.SnackBar(ft.Text(f"Unknown barcode: {barcode}"), bgcolor=ft.Colors.RED, duration=1500))
+        return False
+
+    with scan_lock:
+        product = SESSION.get(DB.Product, product_id)
+        bill_ = Bill.bills[bill_tabs.selected_index + 1]
+        held = {s_id: count for s_id, (_, count) in bill_.data.items()}
+        stock = allocation.next_batch(SESSION, product_id, held)
+        on_bill = not stock and allocation.next_batch(SESSION, product_id) is not None
+        DB.release(SESSION)
+        if not stock:
+            message = f"{product.title}: all stock is already on this bill" if on_bill \
+                else f"{product.title}: no stock available"
+            page.open(ft.SnackBar(ft.Text(message), bgcolor=ft.Colors.RED, duration=1500))
+            return False
+
+        if Tab.tabs[bill_tabs.selected_index].content == bill_.payment_area:
+            bill_.back()
+        Item(page, product_id, stock.id, product.title, stock.selling_price, stock.min_selling_price,
+             stock.current_stock, units.get(product.unit_id, ""))
+    return True
+
+
+def load_products(query=None, limit=18):
+    """
+    Load the billing grid with set-based queries: the products ranked by the
+    search index plus their active, unexpired stocks in one selectinload,
+    instead of a stock query per card. Returns dicts shaped the way
+    Product.make_card() expects.
+    """
+    today = datetime.now().date()
+    # also called from the search worker, so use a short-lived pooled session
+    with DB.SessionLocal() as session:
+        return _load_products(session, query, limit, today)
+
+
+def _load_products(session, query, limit, today):
+    # rank with the in-memory index, then fetch just those products
+    return _products_by_id(session, search_index.INDEX.search(query, limit), today)
+
+
+def _products_by_id(session, ids, today):
+    """Product dicts for `ids`, in that order; unknown ids are left out."""
+    products_q = (
+        session.query(DB.Product)
+        .options(
+            selectinload(
+                DB.Product.stocks.and_(
+                    DB.Stock.status == 'active',
+                    or_(DB.Stock.expire_date.is_(None), DB.Stock.expire_date >= today),
+                )
+            )
+        )
+    )
 
-    # TAX (ORM)
-    tax_row = SESSION.query(DB.Variables.value).filter(DB.Variables.name == 'tax_percentage').first()
-    TAX = float(tax_row[0]) if tax_row else 0.0
+    rank = {pid: n for n, pid in enumerate(ids)}
+    products = products_q.filter(DB.Product.id.in_(ids)).all() if ids else []
+    products.sort(key=lambda p: rank[p.id])
 
-    # Products (ORM)
-    products = (
-        SESSION.query(DB.Product)
-        .order_by(DB.Product.id.asc())
-        .limit(18)
-        .all()
-    )
-    filtered_products = [
+    return [
         {
             "id": p.id,
             "title": p.title,
@@ -1547,66 +1545,203 @@ def bill(page: ft.Page, conn, user_id):
             "barcode": p.barcode,
             "has_expire": p.has_expire,
             "image": p.image,
+            "stocks": [
+                {
+                    "stock_id": st.id,
+                    "product_id": st.product_id,
+                    "current_stock": st.current_stock,
+                    "min_selling_price": st.min_selling_price,
+                    "selling_price": st.selling_price,
+                    "expire_date": st.expire_date,
+                    "status": st.status,
+                    "unit_name": units.get(p.unit_id, ""),
+                }
+                for st in sorted(p.stocks, key=lambda st: st.id)
+            ],
         }
         for p in products
     ]
 
+
+def show_products(page, products=None):
+    """Rebuild the grid, from `products` if given, else the current filtered_products."""
+    global filtered_products
+    with grid_lock:
+        if products is not None:
+            filtered_products = products
+        Product.data = []
+        Stock.data = dict()
+        for i in filtered_products:
+            Product(page, i["id"], i["title"], i["note"], i["unit_id"], i["image"], i["stocks"])
+        products_list.controls = Product.data
+
+
+def repaint_products(page, product_ids):
+    """
+    Reload the shown products among `product_ids` and rebuild only their
+    cards. Returns True if the grid changed.
+    """
+    with grid_lock:
+        shown = {p["id"]: n for n, p in enumerate(filtered_products)}
+        ids = [pid for pid in product_ids if pid in shown]
+        if not ids:
+            return False
+        with DB.SessionLocal() as session:
+            fresh = {p["id"]: p for p in _products_by_id(session, ids, datetime.now().date())}
+
+        for pid in ids:
+            p = fresh.get(pid)
+            if p is None:
+                continue  # deleted; dropped below
+            n = shown[pid]
+            filtered_products[n] = p
+            Stock.data.pop(pid, None)
+            Product(page, p["id"], p["title"], p["note"], p["unit_id"], p["image"], p["stocks"])
+            Product.data[n] = Product.data.pop()
+
+        if len(fresh) < len(ids):
+            gone = set(ids) - set(fresh)
+            keep = [n for n, p in enumerate(filtered_products) if p["id"] not in gone]
+            filtered_products[:] = [filtered_products[n] for n in keep]
+            Product.data[:] = [Product.data[n] for n in keep]
+        return True
+
+
+def refresh():
+    """Screen-cache hook: reload the product grid after stock or product changes."""
+    if _refresh_products is not None:
+        _refresh_products()
+
+
+def load_settings(session):
+    """TAX and the units map."""
+    global TAX
+
+    # TAX (ORM)
+    tax_row = session.query(DB.Variables.value).filter(DB.Variables.name == 'tax_percentage').first()
+    TAX = float(tax_row[0]) if tax_row else 0.0
+
     # Units map (ORM)
+    fresh = dict(session.query(DB.Unit.id, DB.Unit.unit).all())
     units.clear()
-    for uid, uname in SESSION.query(DB.Unit.id, DB.Unit.unit).all():
-        units[uid] = uname
+    units.update(fresh)
+
+
+# ---- live updates (change_feed.py): stock, product, customer and setting
+# changes from any terminal, applied to what this screen already shows ----
+
+def _products_changed(changes):
+    if PAGE is None:
+        return
+    if changes is None:
+        refresh()
+        return
+    ids = {c.product_id if c.table == "stocks" else c.id for c in changes}
+    ids.discard(None)
+    if repaint_products(PAGE, ids):
+        frame_scheduler.FRAMES.mark(products_list)
+
+
+def _customers_changed(changes):
+    # re-run the open customer search so the dropdown shows current credit
+    if PAGE is None or not Bill.bills:
+        return
+    for bill_ in Bill.bills:
+        if bill_.customer_dropdown.visible:
+            bill_.filter_customer(None)
+
+
+def _settings_changed(changes):
+    if PAGE is None:
+        return
+    with DB.SessionLocal() as session:
+        load_settings(session)
+    if changes is None or any(c.table == "units" for c in changes):
+        refresh()
+
+
+_unsubscribe = []
+
+
+def _subscribe():
+    if not _unsubscribe:
+        _unsubscribe.extend([
+            change_feed.FEED.subscribe("stocks", _products_changed),
+            change_feed.FEED.subscribe("products", _products_changed),
+            change_feed.FEED.subscribe("customers", _customers_changed),
+            change_feed.FEED.subscribe("variables", _settings_changed),
+            change_feed.FEED.subscribe("units", _settings_changed),
+        ])
+
+
+def close():
+    """The page is gone (app_context.py): stop following changes."""
+    global PAGE
+    PAGE = None
+    while _unsubscribe:
+        _unsubscribe.pop()()
+
+
+def bill(page: ft.Page, conn, user_id):
+    global CONN, USER_ID, SESSION, PAGE
+
+    CONN = conn
+    PAGE = page
+    _subscribe()
+    SESSION = DB.new_session(SESSION)
+    USER_ID = user_id
+
+    load_settings(SESSION)
+
+    # Products + active stocks (ORM, one batched load)
+    search_index.INDEX.ensure_built(SESSION)
+    DB.release(SESSION)
+    products = load_products()
 
     if not Tab.tabs:
         global invoice_tab
         Bill(page)
         invoice_tab = Tab(page)
 
-    Product.data = []
-    Stock.data = dict()
-
-    for i in filtered_products:
-        Product(page, i["id"], i["title"], i["note"], i["unit_id"], i["image"])
-
-    def filter_products(e=None, q=None):
-        global filtered_products, customers
-        query = (e.control.value if e else q or "").strip()
-
-        # Products filter (ORM)
-        products_q = (
-            SESSION.query(DB.Product)
-            .filter(
-                or_(
-                    DB.Product.code.ilike(f"%{query}%"),
-                    cast(DB.Product.id, String).ilike(f"%{query}%"),
-                    DB.Product.title.ilike(f"%{query}%"),
-                    DB.Product.note.ilike(f"%{query}%"),
-                )
-            )
-            .order_by(DB.Product.id.asc())
-            .limit(18)
-        )
-        products = products_q.all()
-        filtered_products = [
-            {
-                "id": p.id,
-                "title": p.title,
-                "note": p.note,
-                "unit_id": p.unit_id,
-                "sub_category_id": p.sub_category_id,
-                "code": p.code,
-                "barcode": p.barcode,
-                "has_expire": p.has_expire,
-                "image": p.image,
-            }
-            for p in products
-        ]
+    show_products(page, products)
 
-        Product.data = []
-        Stock.data = dict()
-        for i in filtered_products:
-            Product(page, i["id"], i["title"], i["note"], i["unit_id"], i["image"])
+    def show_filtered_products(query, products):
+        # runs on the search worker: send just the grid at the next frame, not the whole page
+        show_products(page, products)
+        frame_scheduler.FRAMES.mark(products_list)
 
-        products_list.controls = Product.data
+    # Products filter (ORM) runs debounced on the search worker
+    filter_products = Debouncer(
+        search=lambda query: load_products(query.strip()),
+        render=show_filtered_products,
+    )
+
+    scan_mode = False
+
+    def search_changed(e):
+        # in scan mode the scanner types the full code and submits; don't search per character
+        if not scan_mode:
+            filter_products(e.control.value)
+
+    def search_submitted(e):
+        if scan_mode:
+            barcode = (e.control.value or "").strip()
+            e.control.value = ""
+            if barcode:
+                scan_barcode(page, barcode)
+            e.control.focus()
+            # the scanned line marks its own rows; only the cleared field is left
+            frame_scheduler.FRAMES.mark(e.control)
+
+    def toggle_scan_mode(e):
+        nonlocal scan_mode
+        scan_mode = not scan_mode
+        filter_products.cancel()
+        search_bar.value = ""
+        search_bar.label = "Scan Barcode" if scan_mode else "Search Product"
+        search_bar.prefix_icon = ft.Icons.QR_CODE_SCANNER if scan_mode else ft.Icons.INVENTORY
+        scan_btn.icon_color = ft.Colors.BLUE if scan_mode else None
+        search_bar.focus()
         page.update()
 
     search_bar = ft.TextField(
@@ -1617,10 +1752,18 @@ def bill(page: ft.Page, conn, user_id):
         border_width=2,
         prefix_icon=ft.Icons.INVENTORY,
         suffix_icon=ft.Icons.SEARCH,
-        on_change=lambda e: filter_products(e),
+        on_change=search_changed,
+        on_submit=search_submitted,
     )
 
-    products_list.controls = Product.data
+    global _refresh_products
+    _refresh_products = lambda: filter_products("" if scan_mode else search_bar.value or "")
+
+    scan_btn = ft.IconButton(
+        icon=ft.Icons.QR_CODE_SCANNER,
+        tooltip="Barcode scan mode",
+        on_click=toggle_scan_mode,
+    )
 
     product_display = ft.Container(
         ft.Column(
@@ -1634,7 +1777,7 @@ def bill(page: ft.Page, conn, user_id):
         ft.Column(
             controls=[
                 ft.Container(
-                    search_bar
+                    ft.Row([search_bar, scan_btn])
                 ),
                 ft.Container(
                     product_display,
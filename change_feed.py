@@ -0,0 +1,168 @@
+# change_feed.py
+# Cross-terminal change notifications. Triggers from migration 0003 NOTIFY
+# pos_changes for every committed change to stocks, products, units,
+# customers and variables; each terminal runs one listener thread that
+# LISTENs on its own connection and hands the changes to whoever caches
+# those rows (the billing grid, the search index), so a sale on one till
+# shows up on the others without polling or rebuilding screens.
+#
+# Notifications that arrive close together are delivered as one batch.
+# Row handlers get [Change] for their table, from every terminal including
+# this one. Changes made by other terminals are also published on
+# events.BUS by table name, so screens without row handlers get marked
+# stale the same way local commits do.
+#
+# After the connection drops, the listener reconnects and calls every row
+# handler with None: notifications may have been missed, reload everything.
+
+import json
+import select
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+import DB
+import events
+
+CHANNEL = "pos_changes"
+
+Change = namedtuple("Change", "table op id product_id origin")
+
+
+class ChangeFeed:
+    """
+    LISTEN on `channel` in a daemon thread and dispatch row changes.
+    start(engine) begins listening.
+
+    subscribe(table, handler) registers handler(changes) and returns a
+    function that unsubscribes; changes is a list of Change, or None after
+    a reconnect.
+    """
+
+    def __init__(self, channel=CHANNEL, coalesce=0.2, bus=events.BUS, origin=DB.APP_NAME):
+        self.engine = None
+        self.channel = channel
+        self.coalesce = coalesce
+        self.bus = bus
+        self.origin = origin
+        self._handlers = defaultdict(list)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, table, handler):
+        with self._lock:
+            self._handlers[table].append(handler)
+
+        def unsubscribe():
+            with self._lock:
+                if handler in self._handlers[table]:
+                    self._handlers[table].remove(handler)
+        return unsubscribe
+
+    def start(self, engine):
+        self.engine = engine
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ---- listener thread ----
+
+    def _run(self):
+        connected_before = False
+        backoff = 1
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._listen()
+                if connected_before:
+                    self._resync()
+                connected_before = True
+                backoff = 1
+                self._pump(conn)
+            except Exception as e:
+                print(f"Error in change feed: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _listen(self):
+        # a dedicated connection, taken out of the pool: it sits in LISTEN for good
+        raw = self.engine.raw_connection()
+        raw.detach()
+        conn = raw.driver_connection
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+        return conn
+
+    def _pump(self, conn):
+        pending = []
+        deadline = None
+        while not self._stop.is_set():
+            timeout = 5.0 if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([conn], [], [], timeout)
+            if ready:
+                conn.poll()
+                while conn.notifies:
+                    change = self._parse(conn.notifies.pop(0).payload)
+                    if change is not None:
+                        pending.append(change)
+                if pending and deadline is None:
+                    deadline = time.monotonic() + self.coalesce
+            if deadline is not None and time.monotonic() >= deadline:
+                batch, pending, deadline = pending, [], None
+                self._dispatch(batch)
+
+    @staticmethod
+    def _parse(payload):
+        try:
+            data = json.loads(payload)
+            return Change(data["table"], data["op"], data.get("id"), data.get("product_id"), data.get("origin"))
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Error parsing change notification {payload!r}: {e}")
+            return None
+
+    def _dispatch(self, changes):
+        by_table = defaultdict(list)
+        for change in changes:
+            by_table[change.table].append(change)
+
+        for table, table_changes in by_table.items():
+            self._call(table, table_changes)
+
+        # local commits already went out through events.track()
+        remote = {c.table for c in changes if c.origin != self.origin}
+        if remote and self.bus is not None:
+            self.bus.publish(*remote)
+
+    def _resync(self):
+        with self._lock:
+            tables = [table for table, handlers in self._handlers.items() if handlers]
+        for table in tables:
+            self._call(table, None)
+        if tables and self.bus is not None:
+            self.bus.publish(*tables)
+
+    def _call(self, table, changes):
+        with self._lock:
+            handlers = list(self._handlers[table])
+        for handler in handlers:
+            try:
+                handler(changes)
+            except Exception as e:
+                print(f"Error handling {table} changes: {e}")
+
+
+FEED = ChangeFeed()
@@ -0,0 +1,113 @@
+# check_metrics.py
+# Consistency check for the dashboard rollups in metrics.py. Inside one
+# transaction it rebuilds the rollups, then posts a part-paid credit sale
+# dated yesterday, a customer payment against it and a batch expiry through
+# postings.py, the way the screens do. It then compares the rollups kept
+# incrementally by those postings with what metrics.rebuild() computes from
+# the raw tables, and fails on any difference.
+# Everything is rolled back, so the database is left as it was.
+#
+#   python migrate.py && python check_metrics.py
+
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import DB
+import metrics
+import postings
+
+def snapshot(session):
+    """Every rollup row as {table: {key: values}}, leaving out rows that are all zero."""
+    daily = {
+        row.day: tuple(Decimal(str(getattr(row, c) or 0)) for c in metrics.DAILY_COLUMNS)
+        for row in session.scalars(select(DB.DailyMetric))
+    }
+    sales = {
+        (row.day, row.product_id): (Decimal(str(row.quantity or 0)), Decimal(str(row.revenue or 0)))
+        for row in session.scalars(select(DB.ProductDailySales))
+    }
+    levels = {
+        row.product_id: Decimal(str(row.on_hand or 0))
+        for row in session.scalars(select(DB.ProductStockLevel))
+    }
+    return {
+        "daily_metrics": {k: v for k, v in daily.items() if any(v)},
+        "product_daily_sales": {k: v for k, v in sales.items() if any(v)},
+        "product_stock_levels": {k: v for k, v in levels.items() if v},
+    }
+
+
+def seed(session, now):
+    user = DB.User(name="Metrics check", username="metrics-check-seed", password="-", role="cashier")
+    account = DB.Account(name="Metrics check")
+    customer = DB.Customer(name="Metrics check", mobile="metrics-check")
+    product = DB.Product(title="Metrics check", code="MCHECK", has_expire=True)
+    session.add_all([user, account, customer, product])
+    session.flush()
+
+    today = now.date()
+    batch = dict(product_id=product.id, actual_price=80, min_selling_price=90, selling_price=100)
+    fresh = DB.Stock(stock_in=10, stock_out=0, current_stock=10, expire_date=today + timedelta(days=60),
+                     status='active', **batch)
+    lapsed = DB.Stock(stock_in=5, stock_out=0, current_stock=5, expire_date=today - timedelta(days=1),
+                      status='active', **batch)
+    sold_out = DB.Stock(stock_in=3, stock_out=3, current_stock=0, expire_date=today - timedelta(days=2),
+                        status='out', **batch)
+    session.add_all([fresh, lapsed, sold_out])
+    session.flush()
+    metrics.record_stock_in(session, [(product.id, 15)])
+    return user.id, account.id, customer.id, product.id, fresh.id
+
+
+def main():
+    engine = DB.get_engine()
+    metrics.ensure(engine)
+    now = datetime.now()
+    with Session(engine) as session:
+        try:
+            metrics.rebuild(session)
+            user_id, account_id, customer_id, product_id, stock_id = seed(session, now)
+
+            # a credit sale yesterday, part paid: income and cash_in land on yesterday
+            postings.post_invoice(
+                session, user_id=user_id, account_id=account_id, customer_id=customer_id,
+                lines=[{"stock_id": stock_id, "qty": 2, "unit_price": 100, "max_price": 100}],
+                total=200, paid=50, customer_label="Metrics check", now=now - timedelta(days=1),
+            )
+            # paid off today: cash_in today, income on the invoice's day
+            postings.post_customer_payment(session, customer_id=customer_id, account_id=account_id,
+                                           cash=120, now=now)
+            # the lapsed active batch leaves the stock level, the sold-out one changes nothing
+            postings.expire_batches(session, product_id, today=now.date())
+
+            # the deltas the postings appended, folded the way SummaryScheduler does
+            metrics.fold(session)
+            incremental = snapshot(session)
+            metrics.rebuild(session)
+            rebuilt = snapshot(session)
+        finally:
+            session.rollback()
+    engine.dispose()
+
+    failed = 0
+    for table, expected in rebuilt.items():
+        kept = incremental[table]
+        drifted = [key for key in sorted(set(expected) | set(kept), key=str) if kept.get(key) != expected.get(key)]
+        for key in drifted:
+            print(f"FAIL  {table} {key}: incremental {kept.get(key)}, rebuild {expected.get(key)}")
+        if not drifted:
+            print(f"ok    {table}: {len(expected)} row(s)")
+        failed += len(drifted)
+
+    if failed:
+        print(f"{failed} rollup row(s) drifted from rebuild().")
+        sys.exit(1)
+    print("Incremental rollups match rebuild().")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# check_query_plans.py
+# Query-plan regression check for the indexes in migrations/. Seeds a few
+# thousand products, stocks, customers and invoices inside one transaction,
+# ANALYZEs them, then EXPLAINs the billing, recent-transaction and customer
+# queries the screens run and fails if any of them falls back to a
+# sequential scan on the table its index is meant to serve.
+# Everything is rolled back, so the database is left as it was.
+#
+#   python migrate.py && python check_query_plans.py
+
+import json
+import sys
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import or_, select, text, tuple_
+
+import DB
+
+PRODUCTS = 20000
+CUSTOMERS = 20000
+INVOICES = 50000
+
+INDEX_SCANS = {"Index Scan", "Index Only Scan", "Bitmap Heap Scan"}
+
+SEED = [
+    """INSERT INTO users (name, username, password, role)
+       VALUES ('Plan check', 'plan-check-seed', '-', 'cashier')""",
+    f"""INSERT INTO products (title, code, note)
+        SELECT 'Seed ' || md5(g::text), 'S' || g, 'seed note ' || md5((-g)::text)
+          FROM generate_series(1, {PRODUCTS}) g""",
+    """INSERT INTO stocks (product_id, stock_in, current_stock, actual_price, min_selling_price,
+                          selling_price, expire_date, status, batch_number)
+       SELECT p.id, 10, 10, 100, 110, 120, CURRENT_DATE + mod(p.id * 7 + b, 400) - 30,
+              CASE WHEN b = 3 THEN 'active' ELSE 'out' END, 'seed'
+         FROM products p CROSS JOIN generate_series(1, 3) b
+        WHERE p.code LIKE 'S%'""",
+    f"""INSERT INTO customers (name, mobile, credit)
+        SELECT 'Seed ' || md5(g::text), 'seed' || g, 0
+          FROM generate_series(1, {CUSTOMERS}) g""",
+    f"""INSERT INTO invoices (created_on, total, paid_amount, status, customer_id, user_id, notes)
+        SELECT now() - g * interval '1 minute', 1000, 1000,
+               CASE WHEN mod(g, 10) = 0 THEN 'pending' ELSE 'paid' END,
+               c.id, (SELECT id FROM users WHERE username = 'plan-check-seed'), 'seed'
+          FROM generate_series(1, {INVOICES}) g
+          JOIN customers c ON c.mobile = 'seed' || (1 + mod(g, {CUSTOMERS}))""",
+    """INSERT INTO invoice_has_stock (invoice_id, stock_id, quantity, unit_price)
+       SELECT i.id, s.id, 1, 120
+         FROM (SELECT id, row_number() OVER (ORDER BY id) rn FROM invoices WHERE notes = 'seed') i
+         JOIN (SELECT id, row_number() OVER (ORDER BY id) rn FROM stocks WHERE batch_number = 'seed') s
+           ON s.rn = i.rn""",
+    "ANALYZE products",
+    "ANALYZE stocks",
+    "ANALYZE customers",
+    "ANALYZE invoices",
+    "ANALYZE invoice_has_stock",
+]
+
+
+def scans(plan):
+    """Yield (node type, relation, index) for every node of an EXPLAIN JSON plan."""
+    yield plan["Node Type"], plan.get("Relation Name"), plan.get("Index Name")
+    for child in plan.get("Plans", []):
+        yield from scans(child)
+
+
+def explain(conn, stmt):
+    compiled = stmt.compile(conn, compile_kwargs={"literal_binds": True})
+    raw = conn.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+    plan = raw if isinstance(raw, list) else json.loads(raw)
+    return list(scans(plan[0]["Plan"]))
+
+
+def checks(conn):
+    """[(name, statement, table that must be read through an index)]"""
+    product_ids = [pid for (pid,) in conn.execute(
+        select(DB.Product.id).where(DB.Product.code.like("S%")).order_by(DB.Product.id).limit(20))]
+    customer = conn.execute(
+        select(DB.Customer.id, DB.Customer.name, DB.Customer.mobile)
+        .where(DB.Customer.mobile == f"seed{CUSTOMERS // 2}")).one()
+    invoice_id = conn.execute(
+        select(DB.Invoice.id).where(DB.Invoice.customer_id == customer.id).limit(1)).scalar()
+    name_term = f"%{customer.name[5:17]}%"
+    mobile_term = f"%{customer.mobile}%"
+    today = date.today()
+
+    return [
+        ("billing: active stocks of the listed products",
+         select(DB.Stock).where(
+             DB.Stock.product_id.in_(product_ids),
+             DB.Stock.status == 'active',
+             or_(DB.Stock.expire_date.is_(None), DB.Stock.expire_date >= today)),
+         "stocks"),
+        ("billing: product search",
+         select(DB.Product.id).where(or_(
+             DB.Product.title.ilike(name_term),
+             DB.Product.code.ilike(name_term),
+             DB.Product.note.ilike(name_term))),
+         "products"),
+        ("billing: customer lookup",
+         select(DB.Customer).where(or_(
+             DB.Customer.name.ilike(mobile_term),
+             DB.Customer.mobile.ilike(mobile_term))).limit(5),
+         "customers"),
+        ("recent transactions: latest invoices",
+         select(DB.Invoice.id, DB.Invoice.created_on, DB.Invoice.total)
+         .order_by(DB.Invoice.created_on.desc(), DB.Invoice.id.desc()).limit(20),
+         "invoices"),
+        ("recent transactions: deep page in a date range",
+         select(DB.Invoice.id, DB.Invoice.created_on, DB.Invoice.total)
+         .where(DB.Invoice.created_on >= datetime.now() - timedelta(days=30),
+                tuple_(DB.Invoice.created_on, DB.Invoice.id) < (datetime.now() - timedelta(days=20), invoice_id))
+         .order_by(DB.Invoice.created_on.desc(), DB.Invoice.id.desc()).limit(20),
+         "invoices"),
+        ("recent transactions: invoice lines",
+         select(DB.InvoiceHasStock).where(DB.InvoiceHasStock.invoice_id == invoice_id),
+         "invoice_has_stock"),
+        ("customers: search",
+         select(DB.Customer).where(or_(
+             DB.Customer.name.ilike(name_term),
+             DB.Customer.mobile.ilike(name_term))),
+         "customers"),
+        ("customers: pending invoices",
+         select(DB.Invoice).where(DB.Invoice.customer_id == customer.id, DB.Invoice.status == 'pending'),
+         "invoices"),
+    ]
+
+
+def main():
+    engine = DB.get_engine()
+    failed = 0
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            for sql in SEED:
+                conn.execute(text(sql))
+
+            for name, stmt, table in checks(conn):
+                nodes = [(kind, index) for kind, rel, index in explain(conn, stmt) if rel == table]
+                ok = nodes and all(kind in INDEX_SCANS for kind, _ in nodes)
+                used = ", ".join(f"{kind}{f' on {index}' if index else ''}" for kind, index in nodes)
+                print(f"{'ok  ' if ok else 'FAIL'}  {name}: {used or 'no scan of ' + table}")
+                failed += not ok
+        finally:
+            trans.rollback()
+    engine.dispose()
+
+    if failed:
+        print(f"{failed} query plan(s) regressed.")
+        sys.exit(1)
+    print("All query plans use their indexes.")
+
+
+if __name__ == "__main__":
+    main()
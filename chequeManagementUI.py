@@ -115,6 +115,7 @@ class ChequeManager:
             )
             self.cheque_list.controls.append(list_item)
 
+        DB.release(SESSION)
         self.page.update()
 
     def show_cheque_details(self, cheque):
@@ -186,6 +187,7 @@ class ChequeManager:
             fields.extend([status_dropdown, update_button])
 
         self.details_container.content = ft.Column(fields, scroll=ft.ScrollMode.AUTO)
+        DB.release(SESSION)
         self.page.update()
 
     def update_cheque_status(self, cheque, new_status):
@@ -381,7 +383,7 @@ def handle_bounced_cheque_single(cheque):
 def chequeManagement(page: ft.Page, conn, user_id):
     global CONN, SESSION, USER_ID
     CONN = conn
-    SESSION = Session(bind=conn)
+    SESSION = DB.new_session(SESSION)
     USER_ID = user_id
 
     page.title = "Cheque Management System"
@@ -392,6 +394,7 @@ def chequeManagement(page: ft.Page, conn, user_id):
     due_cheques = check_yesterday_cheques()
     if due_cheques:
         show_status_update_dialog(page, due_cheques)
+    DB.release(SESSION)
 
     # Create cheque manager
     cheque_manager = ChequeManager(page)
@@ -1,22 +1,33 @@
 import decimal
-import time
 from datetime import datetime
 
 import flet as ft
-import pandas as pd
 from sqlalchemy.orm import Session
 from sqlalchemy import create_engine
 import DB
+import parties
+import postings
+import rows
 from sqlalchemy import or_, select
+from virtual_table import VColumn, VirtualTable
 
 theme_color = ft.Colors.GREEN
 
 SELECTED_CUSTOMER_ID = None
 CONN:create_engine
-SESSION:Session
+SESSION:Session = None
+APP = None
 ACCOUNT_ID = 0
 CURRENCY = "Rs. "
 
+def id_name(iid, n):
+    v = str(iid)
+    for i in [10 ** i for i in range(n, 0, -1)]:
+        if iid < i:
+            v = "0" + v
+    return v
+
+
 class CustomerDetailsApp:
     def __init__(self, page: ft.Page):
         self.page = page
@@ -25,40 +36,36 @@ class CustomerDetailsApp:
 
         self.selected_customer_id = None
 
-        self.dummy_table = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("Invoice ID", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Date", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Amount", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Paid Amount", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Status", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
+        self.invoice_table = VirtualTable(
+            [
+                VColumn("Invoice ID", expand=2, format=lambda iid: f"inv-{id_name(iid, 9)}"),
+                VColumn("Date", expand=2),
+                VColumn("Amount"),
+                VColumn("Paid Amount"),
+                VColumn("Status", style=self.status_style),
             ],
-
-            border=ft.border.all(1, ft.Colors.GREY_200),
+            header_color=theme_color + "600",
             bgcolor=theme_color + "100",
-            heading_row_color=theme_color + "600",
-            data_row_max_height=0,
-            data_row_min_height=0,
-            border_radius=8,
-            expand=True
         )
 
-        self.invoice_table = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("Invoice ID", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Date", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Amount", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Paid Amount", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Status", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
+        # one row per customer: (id, (name, mobile), credit, invoices, unpaid, last invoice)
+        self.customer_table = VirtualTable(
+            [
+                VColumn("ID"),
+                VColumn("Name / Mobile", expand=3, format=lambda nm: f"{nm[0]}\n{nm[1]}"),
+                VColumn("Credit", expand=2),
+                VColumn("Invoices"),
+                VColumn("Unpaid", expand=2),
+                VColumn("Last Invoice", expand=2, format=lambda d: d.strftime('%Y-%m-%d') if d else "-"),
             ],
-
-            border=ft.border.all(1, ft.Colors.GREY_200),
-            bgcolor=theme_color + "100",
-            heading_row_color=theme_color + "600",
-            border_radius=8,
-            heading_row_height=0,
-            expand=True
+            row_height=52,
+            header_color=ft.Colors.GREY_100,
+            header_text_color=ft.Colors.GREY_900,
+            select_color=theme_color + "50",
+            on_select=self.select_customer,
         )
+        self.selected_customer = None
+
         self.customer_details = ft.Container(
             ft.Row(
                 [
@@ -124,41 +131,7 @@ class CustomerDetailsApp:
                     self.customer_details,
                     ft.Stack(
                         [
-                            ft.Column(
-                                [
-                                    ft.Container(
-                                        ft.Row(
-                                            [
-                                                ft.Container(
-                                                    content=self.dummy_table,
-                                                    expand=True,
-                                                )
-                                            ],
-                                            expand=True
-                                        ),
-                                    ),
-                                    ft.Container(
-                                        ft.Column(
-                                            [
-                                                ft.Row(
-                                                    [
-                                                        ft.Container(
-                                                            content=self.invoice_table,
-                                                            expand=True,
-                                                        )
-                                                    ],
-                                                    expand=True
-                                                ),
-                                            ],
-                                            scroll=ft.ScrollMode.AUTO
-                                        ),
-                                        expand=True,
-                                    )
-                                ],
-                                spacing=0,
-                                expand=True,
-                                alignment=ft.MainAxisAlignment.START
-                            ),
+                            self.invoice_table.control,
                             ft.FloatingActionButton(
                                 icon=ft.Icons.ADD,
                                 on_click=self.add_amount,
@@ -176,167 +149,83 @@ class CustomerDetailsApp:
         )
 
 
-    class Customer:
-        data = dict()
-
-        def __init__(self, page, cid, name, mobile, credit, invoices, dummyTable, invoiceTable, customerDetails):
-            self.page:ft.Page = page
-            self.id = cid
-            self.name = name
-            self.mobile = mobile
-            self.credit = credit
-            self.invoices = invoices
-            self.dummyTable = dummyTable
-            self.invoiceTable = invoiceTable
-            self.customerDetails = customerDetails
-            self.rows = ft.DataRow(
-                [
-                    ft.DataCell(
-                        ft.Text(self.id),
-                    ),
-                    ft.DataCell(
-                        ft.Column(
-                            [
-                                ft.Text(self.name),
-                                ft.Text(self.mobile),
-                            ]
-                        )
-                    ),
-                    ft.DataCell(
-                        ft.Text(self.credit),
-                    )
-                ],
-                on_select_changed=self.select,
-            )
-
-            self.data[self.id] = self
-
-            self.page.update()
-
-        def id_name(self, iid: str, n):
-            v = str(iid)
-            for i in [10 ** i for i in range(n, 0, -1)]:
-                if iid < i:
-                    v = "0" + v
-            return v
-
-        def select(self, e=None):
-            print("url:", self.page.url)
-            # Using pandas to read invoice data for the selected customer
-            stmt = select(
-                DB.Invoice.id,
-                DB.Invoice.created_on,
-                DB.Invoice.total,
-                DB.Invoice.paid_amount,
-                DB.Invoice.status
-            ).where(
-                DB.Invoice.customer_id == self.id
-            )
-
-            # Use pandas to read the SQL query
-            invoices_df = pd.read_sql(stmt, CONN)
-            result = invoices_df.to_dict('records')
-
-            for i, cstmr in self.data.items():
-                cstmr.rows.color = ft.Colors.WHITE
+    def select_customer(self, index, customer, session=None):
+        cid, (name, mobile), credit = customer[:3]
+        # invoice history for the selected customer, loaded only now
+        stmt = select(
+            DB.Invoice.id,
+            DB.Invoice.created_on,
+            DB.Invoice.total,
+            DB.Invoice.paid_amount,
+            DB.Invoice.status
+        ).where(
+            DB.Invoice.customer_id == cid
+        )
 
-            if e:
-                e.control.color = theme_color + "50"
+        if session is None:
+            result = rows.fetch_all(SESSION, stmt)
+            DB.release(SESSION)
+        else:
+            result = rows.fetch_all(session, stmt)
 
-            self.customerDetails.content = ft.Row(
-                [
-                    ft.Row(
-                        [
-                            ft.Icon(
-                                ft.Icons.ACCOUNT_CIRCLE,
-                                color=theme_color
-                            ),
-                            ft.Text(
-                                self.name,
-                                size=12,
-                                weight=ft.FontWeight.BOLD,
-                                selectable=True
-                            )
-                        ]
-                    ),
-                    ft.Row(
-                        [
-                            ft.Icon(
-                                ft.Icons.CONTACT_PHONE,
-                                color=theme_color
-                            ),
-                            ft.Text(
-                                self.mobile,
-                                size=12,
-                                weight=ft.FontWeight.BOLD,
-                            )
-                        ]
-                    ),
-                    ft.Row(
-                        [
-                            ft.Icon(
-                                ft.Icons.CURRENCY_EXCHANGE,
-                                color=theme_color
-                            ),
-                            ft.Text(
-                                str(self.credit),
-                                size=12,
-                                weight=ft.FontWeight.BOLD,
-                            )
-                        ]
-                    ),
-                ],
-                expand=True,
-                alignment=ft.MainAxisAlignment.SPACE_BETWEEN
-            )
+        self.selected_customer = customer
 
-            self.invoiceTable.rows = [
-                ft.DataRow(
+        self.customer_details.content = ft.Row(
+            [
+                ft.Row(
                     [
-                        ft.DataCell(
-                            ft.Text(f'inv-{self.id_name(invoice["id"], 9)}'),
+                        ft.Icon(
+                            ft.Icons.ACCOUNT_CIRCLE,
+                            color=theme_color
                         ),
-                        ft.DataCell(
-                            ft.Text(str(invoice["created_on"]).upper()),
-                        ),
-                        ft.DataCell(
-                            ft.Text(str(invoice["total"])),
-                        ),
-                        ft.DataCell(
-                            ft.Text(str(invoice["paid_amount"])),
-                        ),
-                        ft.DataCell(
-                            ft.Text(str(invoice["status"])),
+                        ft.Text(
+                            name,
+                            size=12,
+                            weight=ft.FontWeight.BOLD,
+                            selectable=True
                         )
                     ]
-                ) for invoice in result
-            ]
-
-            self.dummyTable.rows = [
-                ft.DataRow(
+                ),
+                ft.Row(
                     [
-                        ft.DataCell(
-                            ft.Text(f'inv-{self.id_name(invoice["id"], 9)}'),
-                        ),
-                        ft.DataCell(
-                            ft.Text(str(invoice["created_on"])),
-                        ),
-                        ft.DataCell(
-                            ft.Text(str(invoice["total"])),
+                        ft.Icon(
+                            ft.Icons.CONTACT_PHONE,
+                            color=theme_color
                         ),
-                        ft.DataCell(
-                            ft.Text(str(invoice["paid_amount"])),
+                        ft.Text(
+                            mobile,
+                            size=12,
+                            weight=ft.FontWeight.BOLD,
+                        )
+                    ]
+                ),
+                ft.Row(
+                    [
+                        ft.Icon(
+                            ft.Icons.CURRENCY_EXCHANGE,
+                            color=theme_color
                         ),
-                        ft.DataCell(
-                            ft.Text(str(invoice["status"])),
+                        ft.Text(
+                            str(credit),
+                            size=12,
+                            weight=ft.FontWeight.BOLD,
                         )
                     ]
-                ) for invoice in result
-            ]
-            global SELECTED_CUSTOMER_ID
-            SELECTED_CUSTOMER_ID = self.id
+                ),
+            ],
+            expand=True,
+            alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+        )
 
-            self.page.update()
+        self.invoice_table.set_rows(
+            (invoice.id, str(invoice.created_on).upper(), invoice.total,
+             invoice.paid_amount, invoice.status)
+            for invoice in result
+        )
+        global SELECTED_CUSTOMER_ID
+        SELECTED_CUSTOMER_ID = cid
+
+        self.page.update()
 
     def pay(self, e):
         amount =  float(self.pay_cash.value) if self.pay_cash.value else 0
@@ -356,111 +245,31 @@ class CustomerDetailsApp:
             self.page.update()
             return
 
-        customer = SESSION.get(DB.Customer, SELECTED_CUSTOMER_ID)
-        customer.credit -= decimal.Decimal(amount) + decimal.Decimal(cheque_amount)
-        SESSION.commit()
-
-        stmt = select(
-            DB.Invoice.id,
-            DB.Invoice.total,
-            DB.Invoice.paid_amount
-        ).where(
-            DB.Invoice.customer_id == SELECTED_CUSTOMER_ID,
-            DB.Invoice.status == 'pending'
-        )
-
-        # Use pandas to read the SQL query
-        invoices_df = pd.read_sql(stmt, SESSION.bind)
-        invs = invoices_df.to_dict('records')
-
-        if amount:
-            expenses = DB.ExpenseTracker(
-                description=f"Money deposit - {customer.name}",
-                income=cheque_amount,
-            )
-
-            SESSION.add(expenses)
-            SESSION.commit()
-            CONN.commit()
-            for invoice in invs:
-                inv = SESSION.get(DB.Invoice, invoice["id"])
-                transfer = DB.InvoiceTransaction()
-                balance = invoice["total"] - invoice["paid_amount"]
-
-                transfer.invoice_id = inv.id
-                transfer.amount = decimal.Decimal(amount)
-                transfer.account_id = ACCOUNT_ID
-
-                if balance <= amount:
-                    inv.paid_amount += decimal.Decimal(balance)
-                    inv.status = "paid"
-                    amount -= balance
-                else:
-                    inv.paid_amount += decimal.Decimal(amount)
-                    SESSION.commit()
-                    break
-
-                SESSION.commit()
-
-            CONN.commit()
-
-            time.sleep(0.1)
-
-
-            invoices_df = pd.read_sql(stmt, SESSION.bind)
-            invs = invoices_df.to_dict('records')
-
-        if cheque_amount:
-            cheque = DB.Cheque()
-            cheque.cheque_number = cheque_number
-            cheque.amount = decimal.Decimal(cheque_amount)
-            cheque.cheque_date = cheque_date
-            cheque.customer_id = SELECTED_CUSTOMER_ID
-            cheque.status = "pending"
-
-            expenses = DB.ExpenseTracker(
-                description=f"Cheque deposit - {cheque_number} - {customer.name}",
-                income=cheque_amount,
+        # credit, cheque, deposits and the per-invoice payments in one transaction
+        try:
+            postings.post_customer_payment(
+                SESSION,
+                customer_id=SELECTED_CUSTOMER_ID,
+                account_id=ACCOUNT_ID,
+                cash=decimal.Decimal(str(amount)),
+                cheque={
+                    "cheque_number": str(cheque_number),
+                    "cheque_date": cheque_date,
+                    "amount": decimal.Decimal(str(cheque_amount)),
+                } if cheque_amount else None,
             )
-
-            SESSION.add(cheque)
-            SESSION.commit()
-            SESSION.add(expenses)
             SESSION.commit()
-            CONN.commit()
-
-            for invoice in invs:
-                inv = SESSION.get(DB.Invoice, invoice["id"])
-                transfer = DB.InvoiceTransaction()
-
-                balance = invoice["total"] - invoice["paid_amount"]
-
-                transfer.amount = decimal.Decimal(cheque_amount)
-                transfer.cheque_number = cheque_number
-                print(inv.id)
-                transfer.invoice_id = inv.id
-                transfer.account_id = ACCOUNT_ID
-
-                if balance <= cheque_amount:
-                    inv.paid_amount += decimal.Decimal(balance)
-                    inv.status = "paid"
-                    cheque_amount -= balance
-
-                else:
-                    inv.paid_amount += decimal.Decimal(cheque_amount)
-
-                    SESSION.commit()
-                    break
-
-            CONN.commit()
+        except Exception as e:
+            SESSION.rollback()
+            print(f"Error recording payment: {e}")
+            self.page.open(ft.SnackBar(ft.Text(f"Error: {e}"), bgcolor=ft.Colors.RED, duration=3000))
+            return
 
         self.page.close(self.pop)
 
-        CONN.commit()
-
-        #self.filter_customer()
-        self.Customer.data[SELECTED_CUSTOMER_ID].select()
-        self.page.update()
+        # credit and invoice statuses changed: reload the customer row as well
+        # as its invoices, not just the invoices under the old row
+        refresh()
 
 
 
@@ -531,18 +340,19 @@ class CustomerDetailsApp:
         )
 
 
-        customer = pd.read_sql(select(
+        customer = rows.fetch_one(SESSION, select(
             DB.Customer.name,
             DB.Customer.credit
         ).where(
             DB.Customer.id == SELECTED_CUSTOMER_ID
-        ), CONN).to_dict("records")[0]
+        ))
+        DB.release(SESSION)
 
         self.pay_cash = ft.TextField(
             label="Deposit Amount",
             hint_text="0.00",
             prefix_text="Rs. ",
-            suffix_text=customer["credit"],
+            suffix_text=str(customer.credit),
             input_filter=ft.InputFilter(
                 allow=True,
                 regex_string=r"\d\b"
@@ -568,7 +378,7 @@ class CustomerDetailsApp:
         )
 
         self.pop = ft.AlertDialog(
-            title=customer["name"],
+            title=customer.name,
             content=content,
             actions=[
                 yes, no
@@ -580,119 +390,18 @@ class CustomerDetailsApp:
         self.page.open(self.pop)
         self.page.update()
 
-    def filter_customer(self, e=None):
-        query = e.control.value.lower() if e else ''
-
-        # Using pandas to search customers with LIKE functionality
-
-        search_pattern = f"%{query}%"
-
-        customer_query = select(
-            DB.Customer.id,
-            DB.Customer.name,
-            DB.Customer.mobile,
-            DB.Customer.credit
-        ).where(
-            or_(
-                DB.Customer.name.ilike(search_pattern),
-                DB.Customer.mobile.ilike(search_pattern)
-            )
-        ).limit(20)
-
-        customers_df = pd.read_sql(customer_query, CONN)
-        result = customers_df.to_dict("records")
-
-        self.Customer.data = dict()
-
-        for customer in result:
-            # Get invoices for each customer using pandas
-            invoices = SESSION.query(DB.Invoice.id) \
-                .filter(DB.Invoice.customer_id == customer['id']) \
-                .all()
+    def filter_customer(self, e=None, session=None):
+        query = (self.search_field.value or '').lower()
 
-            # Extract just the ID values
-            invoices = [invoice.id for invoice in invoices]
-
-
-            self.Customer(
-                self.page,
-                customer["id"],
-                customer["name"],
-                customer["mobile"],
-                customer["credit"],
-                invoices,
-                self.dummy_table,
-                self.invoice_table,
-                self.customer_details
-            )
-
-        self.customer_details_container.content = ft.Container(
-            ft.Row(
-                [
-                    ft.Column(
-                        [
-                            ft.Container(
-                                ft.Row(
-                                    [
-                                        ft.DataTable(
-                                            columns=[
-                                                ft.DataColumn(
-                                                    ft.Text("ID")
-                                                ),
-                                                ft.DataColumn(
-                                                    ft.Text("Name / Mobile")
-                                                ),
-                                                ft.DataColumn(
-                                                    ft.Text("Credit")
-                                                )
-                                            ],
-                                            expand=True,
-                                        ),
-                                    ],
-                                    expand=True,
-                                )
-                            ),
-                            ft.Container(
-                                ft.Column(
-                                    [
-                                        ft.Row(
-                                            [
-                                                ft.DataTable(
-                                                    columns=[
-                                                        ft.DataColumn(
-                                                            ft.Text("ID")
-                                                        ),
-                                                        ft.DataColumn(
-                                                            ft.Text("Name / Mobile")
-                                                        ),
-                                                        ft.DataColumn(
-                                                            ft.Text("Credit")
-                                                        )
-                                                    ],
-                                                    heading_row_height=0,
-                                                    rows=list(i.rows for i in self.Customer.data.values()),
-                                                    expand=True,
-                                                ),
-                                            ],
-                                            expand=True,
-                                        )
-                                    ],
-                                    expand=True,
-                                    scroll=ft.ScrollMode.AUTO
-                                ),
-                                expand=True
-                            ),
-                        ],
-                        spacing=0,
-                        alignment=ft.MainAxisAlignment.START,
-                        expand=True,
-                    ),
-                ],
-                expand=True,
-                alignment=ft.MainAxisAlignment.START,
-            ),
-            alignment=ft.Alignment(0, 0),
+        # one grouped query: each customer with invoice count, unpaid balance
+        # and last invoice date; the invoices themselves load on select
+        self.customer_table.set_rows(
+            (c.id, (c.name, c.mobile), c.credit, c.invoice_count, c.outstanding, c.last_activity)
+            for c in parties.customers(session or SESSION, query)
         )
+        if session is None:
+            DB.release(SESSION)
+        self.customer_details_container.content = self.customer_table.control
 
         self.page.update()
 
@@ -704,6 +413,10 @@ class CustomerDetailsApp:
         }
         return Colors.get(status, (ft.Colors.GREY_100, ft.Colors.GREY_800))
 
+    def status_style(self, status):
+        bgcolor, color = self.get_status_color(str(status).capitalize())
+        return {"bgcolor": bgcolor, "color": color, "weight": ft.FontWeight.BOLD}
+
     def build(self):
         # Header
         header = ft.Column(
@@ -831,11 +544,31 @@ def customerDetails(page: ft.Page, conn, user_id):
 
     SELECTED_CUSTOMER_ID = None
     CONN = conn
-    SESSION = Session(CONN)
+    SESSION = DB.new_session(SESSION)
     app = CustomerDetailsApp(page)
 
+    global APP
+    APP = app
     return app.build()
 
 
+def refresh():
+    """
+    Screen cache hook: customers or invoices changed; reload the list and the
+    open customer. Runs on the events thread, so it reads through its own
+    short-lived session, never the one the screen's handlers use.
+    """
+    if not APP or not APP.customer_table.rows:
+        return
+    with DB.SessionLocal() as session:
+        APP.filter_customer(session=session)
+        if SELECTED_CUSTOMER_ID is not None:
+            for index, row in enumerate(APP.customer_table.rows):
+                if row[0] == SELECTED_CUSTOMER_ID:
+                    APP.customer_table.select(index, notify=False)
+                    APP.select_customer(index, row, session=session)
+                    break
+
+
 if __name__ == "__main__":
     ft.app(target=customerDetails)
\ No newline at end of file
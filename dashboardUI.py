@@ -8,13 +8,13 @@ from flet import (
 from flet.core.responsive_row import ResponsiveRow
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import date
 
-import pandas as pd
+import metrics
 
 CONN:create_engine
 
-SESSION:Session
+SESSION:Session = None
 
 def percentage(page, n):
     return page * n / 100
@@ -62,37 +62,16 @@ def dashboard_row_1(page):
             )
         return out
    
-    today = datetime(datetime.today().year, datetime.today().month, datetime.today().day)
-    
-    todayIncome = 0
-    todayExpenses = 0
-    pendingPayments = 0
-    totalIncome = 0
-    totalExpenses = 0
-
-    try:
-        todayIncome = \
-        pd.read_sql(f"SELECT SUM(paid_amount) FROM invoices WHERE created_on>='{today}' AND status='paid';",
-                    CONN).to_dict('records')[0]["SUM(paid_amount)"]
-        todayExpenses = \
-        pd.read_sql(f"SELECT SUM(paid_amount) FROM grn WHERE created_on>='{today}' AND status='paid';", CONN).to_dict(
-            'records')[0]["SUM(paid_amount)"]
-        pendingPayments = \
-        pd.read_sql(f"SELECT SUM(paid_amount) FROM grn WHERE status = 'pending';", CONN).to_dict('records')[0][
-            "SUM(paid_amount)"]
-
-        totalIncome = float(pd.read_sql("SELECT SUM(amount) FROM invoice_transactions;", CONN).to_dict('records')[0]["SUM(amount)"])
-        totalExpenses = float(
-            pd.read_sql(f"SELECT SUM(amount) FROM grn_transactions; ", CONN).to_dict('records')[0]["SUM(amount)"])
-    except:
-        pass
-
-
+    summary = metrics.today_summary(SESSION)
+    todayIncome = round(summary["income"], 2)
+    todayExpenses = round(summary["expense"], 2)
+    pendingPayments = round(summary["pending"], 2)
+    currentCash = round(summary["cash"], 2)
 
     lst = [
         ["Today Income", f"LKR. {todayIncome if todayIncome else 0}", Colors.GREEN, Icons.ARROW_DOWNWARD],
         ["Today Expense", f"LKR. {todayExpenses if todayExpenses else 0}", Colors.RED, Icons.ARROW_UPWARD],
-        [f"Current Cash", f"LKR. {round(totalIncome - totalExpenses, 2)}", Colors.BLUE, Icons.WALLET],
+        [f"Current Cash", f"LKR. {currentCash}", Colors.BLUE, Icons.WALLET],
         ["Pending Payments", f"LKR. {pendingPayments}", Colors.ORANGE, Icons.PAYMENTS],
     ]
 
@@ -125,11 +104,9 @@ def pending_payments_tab(page):
         return out
 
     lst = [
-        ["Ceramic World Ltd.", "LKR. 1250", "Payment for premium bathroom tiles and fixtures delivered last week. Due date: Tomorrow", Colors.ORANGE,],
-        ["Royal Bath Supplies", "LKR. 950.00", "Outstanding balance for luxury bathtub collection. Payment overdue by 3 days", Colors.RED,],
-        ["Tile Masters Inc.", "1,000.00", "Monthly supply agreement payment for ceramic floor tiles. Due in 5 days", Colors.GREEN_ACCENT_400,],
-        ["Ceramic World Ltd.", "LKR. 1250", "Payment for premium bathroom tiles and fixtures delivered last week. Due date: Tomorrow", Colors.ORANGE,],
-        ["Royal Bath Supplies", "LKR. 950.00", "Outstanding balance for luxury bathtub collection. Payment overdue by 3 days", Colors.RED,],
+        [name, f"LKR. {credit:,.2f}", f"{company}: outstanding supplier credit" if company else "Outstanding supplier credit",
+         Colors.RED if i == 0 else Colors.ORANGE]
+        for i, (name, company, credit) in enumerate(metrics.pending_suppliers(SESSION))
     ]
 
     return Column(
@@ -167,13 +144,10 @@ def most_sold_tab(page):
         )
         return out
 
+    colors = [Colors.BLUE, Colors.ORANGE, Colors.GREEN, Colors.YELLOW, Colors.PURPLE]
     lst = [
-        ["Premium Wall Tiles", 142, Colors.BLUE],
-        ["Ceramic Floor Tiles", 32, Colors.ORANGE],
-        ["Bathroom Fixtures Set", 89, Colors.GREEN],
-        ["Designer Washbasins", 76, Colors.YELLOW],
-        ["Luxury Bathtubs", 42, Colors.PURPLE],
-        ["Premium Wall Tiles", 142, Colors.BLUE]
+        [title, f"{qty:g}", colors[i % len(colors)]]
+        for i, (title, qty) in enumerate(metrics.top_sellers(SESSION))
     ]
 
     return Column(
@@ -265,11 +239,8 @@ def low_stock_tab(page):
         return out
 
     lst = [
-        ["Premium Wall Tiles", 142, Colors.RED],
-        ["Ceramic Floor Tiles", 32, Colors.RED],
-        ["Bathroom Fixtures Set", 89 , Colors.RED],
-        ["Designer Washbasins", 76 , Colors.RED],
-        ["Luxury Bathtubs", 42 , Colors.RED]
+        [title, f"{on_hand:g}", Colors.RED]
+        for title, on_hand in metrics.low_stock(SESSION)
     ]
 
     return Column(
@@ -323,13 +294,12 @@ def expiry_alert_tab(page):
 
         return out
 
-    lst = [
-        ["Tile Adhesive Premium", 15, 25, Colors.PURPLE],
-        ["Grout Sealer", 10, 30, Colors.BLUE],
-        ["Cleaning Solutions", 45, 50, Colors.GREEN],
-        ["Tile Adhesive Premium", 15, 25, Colors.PURPLE],
-        ["Grout Sealer", 10, 30, Colors.BLUE],
-    ]
+    today = date.today()
+    lst = []
+    for title, expire_date, current_stock in metrics.near_expiry(SESSION):
+        days = (expire_date - today).days
+        clr = Colors.PURPLE if days <= 7 else Colors.BLUE if days <= 15 else Colors.GREEN
+        lst.append([title, days, f"{current_stock:g}", clr])
 
     return Column(
         controls=[
@@ -353,8 +323,8 @@ def dashboard(page, conn, user_id):
     global CONN, SESSION
 
     CONN = conn
-    SESSION = Session(CONN)
-    return Container(
+    SESSION = DB.new_session(SESSION)
+    content = Container(
         content=Column(
             controls=[
                 dashboard_row_1(page),
@@ -366,3 +336,6 @@ def dashboard(page, conn, user_id):
         padding=percentage(page.width, 1),
 
     )
+    # everything is read; don't hold a connection while the dashboard is shown
+    DB.release(SESSION)
+    return content
@@ -0,0 +1,79 @@
+# debouncer.py
+# Debounced, cancellable search for the lookup fields (products, customers,
+# suppliers). Keystrokes only schedule work; the query runs on a worker
+# thread once typing pauses, and only the newest query's results are rendered.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# A small pool shared by every page: lookups run off the Flet event thread,
+# and one cashier's slow search doesn't queue everyone else's behind it (in
+# web mode each page has its own fields). The search functions take their
+# own short-lived sessions, so at most WORKERS connections go to searches.
+WORKERS = 4
+_WORKERS = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="search")
+
+
+class Debouncer:
+    """
+    Wraps a search function and a render function.
+
+    Calling the debouncer with a query restarts the delay timer. When the
+    timer fires, `search(query)` runs on a search worker and
+    `render(query, results)` is called with its results, unless a newer
+    query arrived in the meantime, in which case the stale results are
+    dropped.
+    """
+
+    def __init__(self, search, render, delay: float = 0.15):
+        self.search = search
+        self.render = render
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._timer = None
+        self._generation = 0
+        self._running = threading.Lock()    # one search at a time per field
+
+    def __call__(self, query):
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self._submit, (generation, query))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        """Drop the pending query and any search still in flight."""
+        with self._lock:
+            self._generation += 1
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+    def _is_current(self, generation):
+        return generation == self._generation
+
+    def _submit(self, generation, query):
+        if self._is_current(generation):
+            _WORKERS.submit(self._run, generation, query)
+
+    def _run(self, generation, query):
+        with self._running:
+            self._search(generation, query)
+
+    def _search(self, generation, query):
+        if not self._is_current(generation):
+            return
+        try:
+            results = self.search(query)
+        except Exception as e:
+            print(f"Search failed for {query!r}: {e}")
+            return
+        if not self._is_current(generation):
+            return
+        try:
+            self.render(query, results)
+        except Exception as e:
+            print(f"Error rendering results for {query!r}: {e}")
@@ -0,0 +1,100 @@
+# events.py
+# Table-change events. Sessions made by DB.SessionLocal are tracked: every
+# table they insert into, update or delete from (ORM flushes as well as
+# Core insert()/update()/delete() run through the session) is noted, and
+# when the transaction commits the bus publishes those table names.
+# Subscribers (the screen cache) use them to refresh or drop what they show
+# instead of rebuilding everything on every visit.
+#
+# Handlers run on one dispatcher thread, after the commit, never inside it.
+
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+ALL = "*"
+
+
+class EventBus:
+    """
+    Publish/subscribe on table names.
+
+    subscribe(topic, handler) registers handler(tables) for a table name, or
+    for ALL; it returns a function that unsubscribes. publish(*tables) calls
+    every matching handler once with the frozenset of tables.
+    """
+
+    def __init__(self):
+        self._handlers = defaultdict(list)
+        self._lock = threading.Lock()
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="events")
+
+    def subscribe(self, topic, handler):
+        with self._lock:
+            self._handlers[topic].append(handler)
+
+        def unsubscribe():
+            with self._lock:
+                if handler in self._handlers[topic]:
+                    self._handlers[topic].remove(handler)
+        return unsubscribe
+
+    def publish(self, *tables):
+        tables = frozenset(tables)
+        if tables:
+            self._worker.submit(self._dispatch, tables)
+
+    def _dispatch(self, tables):
+        with self._lock:
+            handlers = list(self._handlers[ALL])
+            for table in tables:
+                handlers.extend(h for h in self._handlers[table] if h not in handlers)
+        for handler in handlers:
+            try:
+                handler(tables)
+            except Exception as e:
+                print(f"Error handling change to {sorted(tables)}: {e}")
+
+
+BUS = EventBus()
+
+
+# ---- session tracking ----
+
+def _touched(session):
+    return session.info.setdefault("touched_tables", set())
+
+
+def _after_flush(session, flush_context):
+    touched = _touched(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__tablename__", None)
+        if table:
+            touched.add(table)
+
+
+def _do_orm_execute(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, "table", None)
+        if table is not None:
+            _touched(state.session).add(table.name)
+
+
+def _after_commit(session):
+    touched = session.info.pop("touched_tables", None)
+    if touched:
+        BUS.publish(*touched)
+
+
+def _after_rollback(session):
+    session.info.pop("touched_tables", None)
+
+
+def track(session_factory):
+    """Publish committed table changes made through sessions from `session_factory`."""
+    event.listen(session_factory, "after_flush", _after_flush)
+    event.listen(session_factory, "do_orm_execute", _do_orm_execute)
+    event.listen(session_factory, "after_commit", _after_commit)
+    event.listen(session_factory, "after_rollback", _after_rollback)
@@ -0,0 +1,133 @@
+# frame_scheduler.py
+# Coalesces UI updates. Instead of calling page.update() (which diffs the
+# whole control tree, a 150-line bill included) the screens and background
+# threads mark() the controls they changed; once per frame the scheduler
+# sends every marked control of a page in one page.update(*controls).
+# Marking the page itself asks for a full update at the next frame.
+#
+# Controls not on a page yet are skipped: they go out with their parent.
+#
+# stats() reports the last second's frames, updates sent and controls
+# diffed, for profiling; set POS_PROFILE_UI=1 to have main.py print them.
+
+import os
+import threading
+import time
+
+import flet as ft
+
+
+def _tree_size(control):
+    """Controls in `control`'s subtree: what Flet diffs when it is updated."""
+    size, stack = 0, [control]
+    while stack:
+        c = stack.pop()
+        size += 1
+        try:
+            stack.extend(c._get_children())
+        except Exception:
+            pass
+    return size
+
+
+class FrameScheduler:
+    """
+    Collects dirty controls per page and flushes them at most `fps` times a second.
+    """
+
+    def __init__(self, fps=30, profile=False):
+        self.interval = 1.0 / fps
+        self.profile = profile
+        self._dirty = {}     # id(page) -> (page, {id(control): control}); the page itself means "everything"
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._second = int(time.monotonic())
+        self._counting = {"frames": 0, "updates": 0, "controls": 0}
+        self._last = dict(self._counting)
+
+    def mark(self, *controls):
+        """Queue `controls` (or a Page, for a full update) for the next frame."""
+        with self._lock:
+            for control in controls:
+                page = control if isinstance(control, ft.Page) else control.page
+                if page is None:
+                    continue
+                self._dirty.setdefault(id(page), (page, {}))[1][id(control)] = control
+            self._ensure_running()
+        self._wake.set()
+
+    def flush(self):
+        """Send everything marked so far, now."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+
+        updates = controls = 0
+        for page, marked in dirty.values():
+            try:
+                if id(page) in marked:
+                    page.update()
+                    sent = [page]
+                else:
+                    sent = [c for c in marked.values() if c.page is page]
+                    if not sent:
+                        continue
+                    page.update(*sent)
+            except Exception as e:
+                print(f"Error updating page: {e}")
+                continue
+            updates += 1
+            if self.profile:
+                controls += sum(_tree_size(c) for c in sent)
+        self._count(updates, controls)
+
+    def stats(self):
+        """{"frames", "updates", "controls"} for the last complete second."""
+        self._count(0, 0, frame=False)
+        return dict(self._last)
+
+    def stop(self, timeout=1):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _count(self, updates, controls, frame=True):
+        with self._lock:
+            now = int(time.monotonic())
+            if now != self._second:
+                # an idle gap means the last second had nothing
+                self._last = dict(self._counting) if now == self._second + 1 else \
+                    {"frames": 0, "updates": 0, "controls": 0}
+                self._counting = {"frames": 0, "updates": 0, "controls": 0}
+                self._second = now
+            if frame:
+                self._counting["frames"] += 1
+                self._counting["updates"] += updates
+                self._counting["controls"] += controls
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="frames", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        last = 0.0
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            # one flush per frame: marks arriving before the frame is due ride along
+            wait = last + self.interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self.flush()
+            last = time.monotonic()
+
+
+FRAMES = FrameScheduler(profile=bool(os.environ.get("POS_PROFILE_UI")))
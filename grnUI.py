@@ -1,14 +1,15 @@
-import decimal
 import time
 
 import flet as ft
 from datetime import datetime
-import pandas as pd
 from sqlalchemy import update, create_engine, insert, select, or_, func
 from sqlalchemy.orm import Session
 import DB
+import rows
+import postings
+from debouncer import Debouncer
 
-SESSION: Session
+SESSION: Session = None
 CONN: create_engine
 USER_ID: int
 ACCOUNT_ID: int = 1
@@ -48,6 +49,7 @@ class Bill:
         )
 
         self.supplier_id = None
+        self.lines = dict()
 
         self.total_items = ft.Text(
             "0 Item(s)",
@@ -179,6 +181,8 @@ class Bill:
             padding=0
         )
 
+        self.supplier_search = Debouncer(self.search_suppliers, self.show_suppliers)
+
         self.supplier_dropdown_container = ft.Container(
             content=self.supplier_dropdown,
             animate=ft.Animation(300, "easeInOut"),
@@ -651,112 +655,59 @@ class Bill:
         self.page.update()
 
     def print_bill(self, e):
-        # Convert to SQLAlchemy
-        new_supplier = DB.Supplier(
-            name=self.supplier_name.value,
-            company_name=self.company.value,
-        )
-        SESSION.add(new_supplier)
-        SESSION.commit()
-
-        time.sleep(0.1)
-
-        # Convert to SQLAlchemy
-        new_grn = DB.GRN(
-            total_amount=decimal.Decimal(float(self.amount_to_be_paid.value.split(" ")[1])),
-            discount_amount=decimal.Decimal(float(self.discount_amount.value if self.discount_amount.value else "0.0")),
-            paid_amount=decimal.Decimal(float(self.total_amount.value.split(' ')[1]) - float(self.credit_amount.value)),
-            status='paid' if float(self.credit_amount.value) < 1 else 'pending',
-            supplier_id=self.supplier_id,
-            user_id=USER_ID
-        )
-        SESSION.add(new_grn)
-        SESSION.commit()
-
-        # Convert to SQLAlchemy
-        grnId = SESSION.query(func.max(DB.GRN.id)).scalar()
-
-
-        expenses = DB.ExpenseTracker(
-            description=f"GRN #{grnId} - {self.supplier_name.value}",
-            outcome=float(self.total_amount.value.split(" ")[1])
-        )
-
-        SESSION.add(expenses)
-        SESSION.commit()
-        CONN.commit()
-
-        for p_id, stock in Item.items[bill_tabs.selected_index].items():
-            # Convert to SQLAlchemy
-            new_stock = DB.Stock(
-                stock_in=stock.qty,
-                current_stock=stock.qty,
-                product_id=p_id,
-                actual_price=stock.rate,
-                min_selling_price=stock.min_price,
-                selling_price=stock.sell_price,
-                expire_date=stock.exp if stock.exp else None,
-            )
-            SESSION.add(new_stock)
-            SESSION.commit()
-
-            time.sleep(0.1)
-
-            # Convert to SQLAlchemy
-            stockId = SESSION.query(func.max(DB.Stock.id)).scalar()
-
-            # Convert to SQLAlchemy
-            stock_movement = DB.StockMovement(
-                stock_id=stockId,
-                movement_type="in",
-                quantity=stock.qty,
-                reference_id=grnId,
-                reference_type="grn"
-            )
-            SESSION.add(stock_movement)
-            SESSION.commit()
-            CONN.commit()
+        global SESSION
 
+        cheque = None
         if self.cheque_amount.value:
-            date = self.cheque_number.suffix_text.split("-")
-            yr = int(date[0])
-            mon = int(date[1])
-            day = int(date[2])
-            cheque = DB.Cheque(
-                cheque_number=self.cheque_number.value,
-                cheque_date=datetime(yr, mon, day),
+            yr, mon, day = (int(i) for i in self.cheque_number.suffix_text.split("-"))
+            cheque = {
+                "cheque_number": self.cheque_number.value,
+                "cheque_date": datetime(yr, mon, day),
+                "amount": self.cheque_amount.value,
+            }
+
+        lines = [
+            {
+                "product_id": p_id,
+                "qty": stock.qty,
+                "cost": stock.rate,
+                "min_price": stock.min_price,
+                "sell_price": stock.sell_price,
+                "expire_date": stock.exp,
+            }
+            for p_id, stock in self.lines.items()
+        ]
+
+        # One transaction for the whole GRN: supplier, GRN, stocks, movements,
+        # cheque, payment and expenses are written together or not at all.
+        SESSION.close()
+        SESSION = DB.SessionLocal()
+        try:
+            postings.post_grn(
+                SESSION,
+                user_id=USER_ID,
+                account_id=ACCOUNT_ID,
                 supplier_id=self.supplier_id,
-                grn_id=grnId,
-                amount=decimal.Decimal(self.cheque_amount.value),
-                status='pending',
-            )
-            expenses = DB.ExpenseTracker(
-                description=f"Cheque #{self.cheque_number.value} - GRN #{grnId} - {self.supplier_name.value}",
-                outcome=float(self.cheque_amount.value)
+                new_supplier=None if self.supplier_id else {
+                    "name": self.supplier_name.value,
+                    "company_name": self.company.value,
+                },
+                supplier_label=self.supplier_name.value,
+                lines=lines,
+                total=float(self.total_amount.value.split(" ")[1]),
+                discount=float(self.discount_amount.value if self.discount_amount.value else "0.0"),
+                credit=float(self.credit_amount.value or 0),
+                cheque=cheque,
+                cheque_number=self.cheque_number.value,
+                card_transaction_id=self.card_transaction_id.value,
             )
-            SESSION.add(cheque)
-            SESSION.commit()
-            SESSION.add(expenses)
-            SESSION.commit()
-            CONN.commit()
-
-
-        # Convert to SQLAlchemy
-        grn_transaction = DB.GRNTransaction(
-            amount=decimal.Decimal(float(self.total_amount.value.split(" ")[1])),
-            grn_id=grnId,
-            account_id=ACCOUNT_ID,
-            transaction_type="payment",
-            cheque_number=self.cheque_number.value,
-            card_transaction_id=self.card_transaction_id.value,
-        )
-        SESSION.add(grn_transaction)
-        SESSION.commit()
-
-        if self.credit_amount.value:
-            sup = SESSION.get(DB.Supplier, self.supplier_id)
-            sup.credit += decimal.Decimal(self.credit_amount.value)
             SESSION.commit()
+        except Exception as ex:
+            SESSION.rollback()
+            print(f"Error posting GRN: {ex}")
+            self.page.open(ft.SnackBar(ft.Text("Could not save the GRN. Nothing was recorded, please try again.")))
+            self.page.update()
+            return
 
         self.delete_bill(None)
 
@@ -779,11 +730,11 @@ class Bill:
             self.supplier_id = supplier["id"]
             self.company.value = supplier["company_name"]
         except:
-            # Convert to SQLAlchemy
-            max_id = SESSION.query(func.max(DB.Supplier.id)).scalar()
-            self.supplier_id = max_id + 1 if max_id else 1
+            # new supplier; created together with the GRN in print_bill
+            self.supplier_id = None
             self.company.value = ""
         self.supplier_name.value = supplier["name"].title()
+        self.supplier_search.cancel()
         self.hide_dropdown()
         self.page.update()
 
@@ -792,25 +743,33 @@ class Bill:
         self.page.update()
 
     def filter_supplier(self, e):
-        global suppliers
         query = self.supplier_name.value.lower()
         if query == "":
+            self.supplier_search.cancel()
             self.hide_dropdown()
             return
-        self.show_dropdown()
-
-        # Convert to SQLAlchemy
-        suppliers_query = SESSION.query(DB.Supplier).filter(
-            or_(
-                DB.Supplier.name.ilike(f"%{query}%"),
-                DB.Supplier.company_name.ilike(f"%{query}%"),
-                DB.Supplier.phone_number.ilike(f"%{query}%"),
-                DB.Supplier.email.ilike(f"%{query}%")
-            )
-        ).limit(5).all()
 
-        suppliers = [s.__dict__ for s in suppliers_query]
+        self.supplier_search(query)
+
+    def search_suppliers(self, query):
+        # Runs on the search worker, so it takes its own short-lived session
+        with DB.SessionLocal() as session:
+            suppliers_query = session.query(DB.Supplier).filter(
+                or_(
+                    DB.Supplier.name.ilike(f"%{query}%"),
+                    DB.Supplier.company_name.ilike(f"%{query}%"),
+                    DB.Supplier.phone_number.ilike(f"%{query}%"),
+                    DB.Supplier.email.ilike(f"%{query}%")
+                )
+            ).limit(5).all()
+
+            return [s.__dict__ for s in suppliers_query]
+
+    def show_suppliers(self, query, results):
+        global suppliers
+        suppliers = results
 
+        self.supplier_dropdown.visible = True
         self.supplier_dropdown.controls = [
                                               ft.ListTile(
                                                   title=ft.Text(supplier["name"]),
@@ -903,8 +862,6 @@ def scroll_to_end():
 
 
 class Item:
-    items = dict()
-
     def __init__(self, page, p_id, p_name, qty, exp, cost, min_price, sell_price):
         self.page = page
         self.p_id = p_id
@@ -953,8 +910,7 @@ class Item:
         Bill.bills[bill_tabs.selected_index + 1].proceed_to_payment.disabled = False
         Bill.bills[bill_tabs.selected_index + 1].proceed_to_payment.style = ft.ButtonStyle(color=ft.Colors.GREEN, )
 
-        self.items[bill_tabs.selected_index] = dict()
-        self.items[bill_tabs.selected_index][self.p_id] = self
+        Bill.bills[bill_tabs.selected_index + 1].lines[self.p_id] = self
         self.page.update()
 
 
@@ -963,7 +919,7 @@ def grn(page: ft.Page, conn: create_engine, user_id):
 
     CONN = conn
     USER_ID = user_id
-    SESSION = Session(CONN)
+    SESSION = DB.new_session(SESSION)
 
     # Convert to SQLAlchemy
     products_query = SESSION.query(DB.Product).limit(5).all()
@@ -973,6 +929,7 @@ def grn(page: ft.Page, conn: create_engine, user_id):
     units_query = SESSION.query(DB.Unit).all()
     for unit in units_query:
         units[unit.id] = unit.unit
+    DB.release(SESSION)
 
     title = ft.Row(
         controls=[
@@ -1167,40 +1124,17 @@ def grn(page: ft.Page, conn: create_engine, user_id):
 
         selected_product = product
 
-        # Convert to SQLAlchemy
-        stock_query = SESSION.query(DB.Stock).filter(DB.Stock.product_id == selected_product['id']).all()
-
-        # Convert to list of dictionaries
-        stock_list = []
-        for stock in stock_query:
-            stock_dict = {c.name: getattr(stock, c.name) for c in stock.__table__.columns}
-            stock_list.append(stock_dict)
-
-        # Create DataFrame for easier manipulation
-        stock = pd.DataFrame(stock_list)
-        if not stock.empty:
-            stock.drop(columns="product_id", inplace=True, errors='ignore')
-
-        temp = stock["status"].copy() if not stock.empty else pd.Series()
-
-        # Update status for expired items
-        if not stock.empty and 'expire_date' in stock.columns:
-            stock["status"] = [
-                ("Expired" if date and date < datetime.now().date() else status_val)
-                for date, status_val in zip(stock["expire_date"], stock["status"])
-            ]
-
-            # Update database for expired items using SQLAlchemy
-            for i, (old_status, new_status) in enumerate(zip(temp, stock["status"])):
-                if old_status != new_status and new_status == "Expired":
-                    SESSION.execute(
-                        update(DB.Stock)
-                        .where(DB.Stock.id == stock['id'].iloc[i])
-                        .values(status='Expired')
-                    )
-            SESSION.commit()
+        # mark this product's lapsed batches Expired, then read its stock
+        postings.expire_batches(SESSION, selected_product['id'])
+        SESSION.commit()
 
-        selected_stocks = stock.to_dict("records") if not stock.empty else []
+        selected_stocks = rows.as_dicts(
+            SESSION,
+            select(*[c for c in DB.Stock.__table__.columns if c.name != "product_id"])
+            .where(DB.Stock.product_id == selected_product['id'])
+            .order_by(DB.Stock.id)
+        )
+        DB.release(SESSION)
 
         product_search.value = product["title"]
         quantity_unit.value = units[product["unit_id"]]
@@ -1279,6 +1213,7 @@ def grn(page: ft.Page, conn: create_engine, user_id):
             ).limit(5).all()
 
             filtered_products = [p.__dict__ for p in filtered_products_query]
+            DB.release(SESSION)
 
             show_product_dropdown()
             page.update()
@@ -1323,6 +1258,7 @@ def grn(page: ft.Page, conn: create_engine, user_id):
             ).limit(5).all()
 
             filtered_suppliers = [s.__dict__ for s in filtered_suppliers_query]
+            DB.release(SESSION)
 
             show_supplier_dropdown()
 
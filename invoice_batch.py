@@ -0,0 +1,207 @@
+# invoice_batch.py
+# Batch re-export of invoice PDFs, e.g. every invoice of a month for the
+# accountants. Headers, customers and line items are loaded with two set-based
+# queries, and the PDFs are rendered across a process pool.
+#
+#   python invoice_batch.py --from 2025-01-01 --to 2025-01-31
+#   python invoice_batch.py --ids 101 102 103 --merge month.pdf
+#
+# Merging into one PDF needs the optional `pypdf` package. Each file is
+# appended as soon as it is rendered, but the merged document is held in
+# memory and only written once every invoice is in, so very large merges
+# need memory in proportion.
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy.orm import Session
+
+import DB
+
+try:
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
+
+
+def load_invoices(session, date_from=None, date_to=None, ids=None):
+    """
+    Load everything needed to render a set of invoices.
+
+    Args:
+        session: SQLAlchemy session.
+        date_from (date): First day to include (optional).
+        date_to (date): Last day to include (optional, inclusive).
+        ids (list): Invoice ids to include (optional).
+
+    Returns:
+        list: Plain dicts (picklable) ordered by invoice id, each with the
+        invoice header, its customer, its line items and the tax rate it was
+        charged at (from its stored tax_amount, not today's setting).
+    """
+    query = (session.query(DB.Invoice.id, DB.Invoice.created_on, DB.Invoice.tax_amount,
+                           DB.Customer.name, DB.Customer.company, DB.Customer.street_address,
+                           DB.Customer.city, DB.Customer.mobile)
+             .outerjoin(DB.Customer, DB.Invoice.customer_id == DB.Customer.id))
+    if ids:
+        query = query.filter(DB.Invoice.id.in_(ids))
+    if date_from:
+        query = query.filter(DB.Invoice.created_on >= date_from)
+    if date_to:
+        query = query.filter(DB.Invoice.created_on < date_to + timedelta(days=1))
+
+    invoices = {}
+    for row in query.order_by(DB.Invoice.id):
+        invoices[row.id] = {
+            "id": row.id,
+            "date": row.created_on.strftime("%Y-%m-%d") if row.created_on else "",
+            "customer": {
+                "name": row.name or "",
+                "company": row.company or "",
+                "address": row.street_address or "",
+                "city": row.city or "",
+                "phone": row.mobile or "",
+            },
+            "items": [],
+            "tax_amount": Decimal(str(row.tax_amount or 0)),
+        }
+    if not invoices:
+        return []
+
+    items = (session.query(DB.InvoiceHasStock.invoice_id, DB.Product.title,
+                           DB.InvoiceHasStock.unit_price, DB.InvoiceHasStock.quantity)
+             .join(DB.Stock, DB.InvoiceHasStock.stock_id == DB.Stock.id)
+             .join(DB.Product, DB.Stock.product_id == DB.Product.id)
+             .filter(DB.InvoiceHasStock.invoice_id.in_(list(invoices)))
+             .order_by(DB.InvoiceHasStock.invoice_id, DB.InvoiceHasStock.id))
+    for row in items:
+        invoices[row.invoice_id]["items"].append(
+            (row.title or "Item", float(row.unit_price), float(row.quantity))
+        )
+
+    # the generator charges tax as a percentage of the line subtotal; pick
+    # the one that reproduces the tax the invoice was actually charged
+    for invoice in invoices.values():
+        subtotal = sum(Decimal(str(price)) * Decimal(str(qty)) for _, price, qty in invoice["items"])
+        tax_amount = invoice.pop("tax_amount")
+        invoice["tax_rate"] = float(tax_amount * 100 / subtotal) if subtotal else 0.0
+
+    return list(invoices.values())
+
+
+def render_invoice(job):
+    """Render one loaded invoice to `job["output_path"]`; runs in a worker process."""
+    from invoice_generator import Customer, InvoiceItem, ProfessionalInvoiceGenerator
+
+    invoice = job["invoice"]
+    items = [InvoiceItem(description=d, unit_price=p, quantity=q) for d, p, q in invoice["items"]]
+
+    generator = ProfessionalInvoiceGenerator(logo_path=job.get("logo_path"))
+    generator.create_invoice(
+        invoice_number=f"INV-{invoice['id']}",
+        invoice_date=invoice["date"],
+        customer=Customer(**invoice["customer"]),
+        items=items,
+        tax_rate=invoice["tax_rate"],
+        output_path=job["output_path"],
+    )
+    return job["output_path"]
+
+
+def export_invoices(session, date_from=None, date_to=None, ids=None, output_dir="invoices",
+                    workers=None, merge_path=None, logo_path=None):
+    """
+    Export many invoices to PDF in parallel.
+
+    Args:
+        session: SQLAlchemy session used to load the invoices.
+        date_from, date_to (date): Inclusive date range (optional).
+        ids (list): Invoice ids (optional).
+        output_dir (str): Directory for the per-invoice PDFs.
+        workers (int): Render processes; defaults to the CPU count.
+        merge_path (str): If set, also write all invoices into this one PDF
+            (built in memory, written at the end).
+        logo_path (str): Path to the company logo image (optional).
+
+    Returns:
+        dict: paths (list), count, seconds and per_second.
+    """
+    if merge_path and PdfWriter is None:
+        raise RuntimeError("Merging invoices needs the 'pypdf' package (pip install pypdf)")
+
+    start = time.perf_counter()
+    invoices = load_invoices(session, date_from, date_to, ids)
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [
+        {
+            "invoice": invoice,
+            "output_path": os.path.join(output_dir, f"invoice_{invoice['id']}.pdf"),
+            "logo_path": logo_path,
+        }
+        for invoice in invoices
+    ]
+
+    paths = []
+    writer = PdfWriter() if merge_path else None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields in invoice order as renders finish, so merging can
+        # append each file while the rest are still rendering; the merged
+        # pages stay in the writer until it is written below
+        for path in pool.map(render_invoice, jobs, chunksize=max(1, len(jobs) // 64)):
+            paths.append(path)
+            if writer is not None:
+                writer.append(path)
+
+    if writer is not None:
+        with open(merge_path, "wb") as f:
+            writer.write(f)
+        writer.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        "paths": paths,
+        "count": len(paths),
+        "seconds": seconds,
+        "per_second": len(paths) / seconds if seconds else 0.0,
+    }
+
+
+def _date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-export invoice PDFs in bulk.")
+    parser.add_argument("--from", dest="date_from", type=_date, help="first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", type=_date, help="last day, YYYY-MM-DD")
+    parser.add_argument("--ids", type=int, nargs="+", help="invoice ids")
+    parser.add_argument("--out", default="invoices", help="output directory")
+    parser.add_argument("--workers", type=int, default=None, help="render processes")
+    parser.add_argument("--merge", dest="merge_path", help="also write one combined PDF")
+    parser.add_argument("--logo", dest="logo_path", help="company logo image")
+    args = parser.parse_args(argv)
+
+    if not (args.date_from or args.date_to or args.ids):
+        parser.error("give a date range (--from/--to) or --ids")
+
+    conn, engine = DB.connect_db()
+    try:
+        with Session(conn) as session:
+            result = export_invoices(session, args.date_from, args.date_to, args.ids, args.out,
+                                     args.workers, args.merge_path, args.logo_path)
+    finally:
+        conn.close()
+        engine.dispose()
+
+    print(f"Exported {result['count']} invoice(s) in {result['seconds']:.2f}s "
+          f"({result['per_second']:.1f} invoices/s)")
+    if args.merge_path and result["count"]:
+        print(f"Combined PDF: {args.merge_path}")
+
+
+if __name__ == "__main__":
+    main()
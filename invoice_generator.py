@@ -11,8 +11,7 @@ from reportlab.lib import colors
 from reportlab.platypus import Table, TableStyle
 from reportlab.lib.utils import ImageReader
 import DB
-from PIL import Image, ImageDraw
-import io
+import invoice_assets
 import os
 from datetime import datetime
 
@@ -122,14 +121,16 @@ class ProfessionalInvoiceGenerator:
     and a totals section.
     """
 
-    def __init__(self, config: InvoiceConfig = None):
+    def __init__(self, config: InvoiceConfig = None, logo_path: str = None):
         """
         Initializes the generator with an optional configuration.
         
         Args:
             config (InvoiceConfig): The configuration object. Defaults to a new instance.
+            logo_path (str): Path to the company logo image (optional).
         """
         self.config = config or InvoiceConfig()
+        self.logo_path = logo_path
         self.canvas = None
         self.current_page = 1
 
@@ -148,45 +149,16 @@ class ProfessionalInvoiceGenerator:
 
     def _create_round_logo_placeholder(self) -> ImageReader:
         """
-        Creates a round logo placeholder with the company's initials.
+        Returns the round logo: the image at `logo_path` if one was given,
+        otherwise a placeholder with the company's initials.
+
+        The logo is prepared once per config and logo file (see invoice_assets)
+        and shared by every invoice rendered in this process.
         
         Returns:
             ImageReader: A ReportLab-compatible image reader object.
         """
-        img_size = int(self.config.LOGO_SIZE * 2)
-        img = Image.new('RGBA', (img_size, img_size), (255, 255, 255, 0))
-        draw = ImageDraw.Draw(img)
-        
-        # Draw a primary-colored circle
-        primary_color_rgb = (11, 134, 200) # RGB equivalent of #0B86C8
-        draw.ellipse([0, 0, img_size - 1, img_size - 1], fill=primary_color_rgb + (255,))
-        
-        # Add company initials
-        initials = ''.join([word[0] for word in self.config.COMPANY_NAME.split() if word])[:3]
-        
-        try:
-            from PIL import ImageFont
-            font_size = img_size // 3
-            try:
-                font = ImageFont.truetype("arial.ttf", font_size)
-            except IOError:
-                font = ImageFont.load_default()
-        except ImportError:
-            font = ImageFont.load_default()
-
-        # Calculate text position for centering
-        bbox = draw.textbbox((0, 0), initials, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        x = (img_size - text_width) // 2
-        y = (img_size - text_height) // 2
-        
-        draw.text((x, y), initials, fill='white', font=font)
-        
-        img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
-        return ImageReader(img_buffer)
+        return invoice_assets.round_logo(self.config, self.logo_path)
 
     def _draw_first_page_header(self):
         """Draws the main header for the first page of the invoice."""
@@ -619,7 +591,7 @@ def export_invoice_from_db(session, invoice_id: int, tax_percent: float, output_
             items.append(item)
             
         # Generate the multi-page invoice PDF
-        generator = ProfessionalInvoiceGenerator()
+        generator = ProfessionalInvoiceGenerator(logo_path=logo_path)
         output_path = os.path.join(output_dir, f"invoice_{invoice_id}.pdf")
         
         invoice_date = invoice.created_on.strftime("%Y-%m-%d")
@@ -0,0 +1,123 @@
+# invoice_queue.py
+# Background invoice rendering. Checkout only enqueues the invoice id; the PDF
+# is rendered on a worker thread with its own database session. Pending ids are
+# kept in a small JSON file next to the invoices, so receipts that were queued
+# but not rendered when the app stopped are picked up again on the next start.
+# A failed render is retried a few times with growing delays before it is
+# left for the next start.
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.orm import Session
+
+
+class InvoiceQueue:
+    """
+    De-duplicating render queue for invoice PDFs.
+
+    submit() accepts an invoice id at most once while it is queued,
+    rendering or waiting for a retry, and once more only after it has
+    failed for good. A failed render is tried again `retries` times, after
+    `backoff`, 2 * `backoff`, ... seconds. on_done(invoice_id, path) is
+    called from the worker thread when a render finishes; path is None if
+    every attempt failed (the job then stays in the pending file for the
+    next start).
+    """
+
+    def __init__(self, output_dir="invoices", workers=1, retries=3, backoff=2.0, keep_done=1000):
+        self.output_dir = output_dir
+        self.pending_path = os.path.join(output_dir, "pending.json")
+        self.retries = retries
+        self.backoff = backoff
+        self.keep_done = keep_done
+        self._lock = threading.Lock()
+        self._pending = {}      # invoice id -> tax percent, queued, rendering or waiting to retry
+        self._done = OrderedDict()  # the last `keep_done` ids rendered by this process
+        self._engine = None
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="invoice")
+
+    def start(self, engine, on_done=None):
+        """Bind the queue to an engine and re-queue jobs left over from a previous run."""
+        self._engine = engine
+        for invoice_id, tax_percent in self._load().items():
+            self.submit(invoice_id, tax_percent, on_done)
+
+    def submit(self, invoice_id, tax_percent=0, on_done=None):
+        """Queue an invoice for rendering. Returns False if it is already queued or rendered."""
+        invoice_id = int(invoice_id)
+        with self._lock:
+            if invoice_id in self._pending or invoice_id in self._done:
+                return False
+            self._pending[invoice_id] = float(tax_percent or 0)
+            self._save()
+        self._pool.submit(self._render, invoice_id, on_done)
+        return True
+
+    def pending(self):
+        with self._lock:
+            return sorted(self._pending)
+
+    def _render(self, invoice_id, on_done, attempt=0):
+        with self._lock:
+            tax_percent = self._pending.get(invoice_id, 0)
+
+        path = None
+        try:
+            # reportlab and PIL load on the first render, not at app start
+            from invoice_generator import export_invoice_from_db
+            with Session(self._engine) as session:
+                path = export_invoice_from_db(session, invoice_id, tax_percent, output_dir=self.output_dir)
+        except Exception as e:
+            print(f"Error rendering invoice {invoice_id}: {e}")
+
+        if not path and attempt < self.retries:
+            # still pending, so submit() keeps ignoring it until the retry has run
+            retry = threading.Timer(self.backoff * 2 ** attempt, self._pool.submit,
+                                    (self._render, invoice_id, on_done, attempt + 1))
+            retry.daemon = True
+            retry.start()
+            return
+
+        with self._lock:
+            if path:
+                self._pending.pop(invoice_id, None)
+                self._done[invoice_id] = None
+                while len(self._done) > self.keep_done:
+                    self._done.popitem(last=False)
+                self._save()
+            else:
+                # keep it in the pending file for the next start, but let it be resubmitted now
+                self._pending.pop(invoice_id, None)
+
+        if on_done:
+            try:
+                on_done(invoice_id, path)
+            except Exception as e:
+                print(f"Error reporting invoice {invoice_id}: {e}")
+
+    def _load(self):
+        try:
+            with open(self.pending_path) as f:
+                return {int(k): v for k, v in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (ValueError, OSError) as e:
+            print(f"Could not read pending invoices: {e}")
+            return {}
+
+    def _save(self):
+        # pending file = everything not yet rendered, including earlier failures
+        jobs = {k: v for k, v in self._load().items() if k not in self._done}
+        jobs.update(self._pending)
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp = self.pending_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({str(k): v for k, v in jobs.items()}, f)
+        os.replace(tmp, self.pending_path)
+
+
+QUEUE = InvoiceQueue()
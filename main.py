@@ -1,5 +1,9 @@
-import threading
 import time
+_STARTED = time.perf_counter()  # for the startup probe (bench_startup.py)
+
+import atexit
+import os
+import threading
 from datetime import datetime
 
 import flet as ft
@@ -8,24 +12,55 @@ from flet import (
     Colors, margin, IconButton
 )
 
-from DB import connect_db
-from dashboardUI import dashboard
-from addStockUI import addStock
-from addProductUI import addProduct
-from recentTransactionUI import recentTransaction
-from billingUI import bill
-from grnUI import grn
-from customersDetailsUI import customerDetails
-from supplierDetailsUI import supplierDetails
-from accountsUI import accounts
-from settingsUI import settings
-from chequeManagementUI import chequeManagement
-
-CONN, engine = connect_db()
+
+import DB
+import app_context
+import change_feed
+import events
+import frame_scheduler
+import invoice_queue
+import metrics
+import migrate
+import search_index
+import screen_cache
+import screens
+import summaries
+
+# One pooled engine for the whole app; every screen and background job takes
+# its own short-lived session from it instead of sharing a single connection
+engine = DB.get_engine()
+
+# Committed writes made through DB.SessionLocal sessions publish the tables they touched
+events.track(DB.SessionLocal)
+
+# Bring the schema (indexes etc.) up to date before anything queries it
+migrate.upgrade(engine)
+
+# Product search index is built once per process and kept current by the screens
+with DB.SessionLocal() as _session:
+    search_index.INDEX.build(_session)
+
+# Dashboard rollups: create and backfill on first run, then kept current by the posting code
+metrics.ensure(engine)
+
+# Report summaries: folded forward in the background every few minutes
+summaries.ensure(engine)
+summary_scheduler = summaries.SummaryScheduler(engine)
+summary_scheduler.start()
+
+# Stock / product / customer / settings changes from every terminal, via LISTEN/NOTIFY
+change_feed.FEED.subscribe("products", search_index.INDEX.on_changes)
+change_feed.FEED.start(engine)
+
+# Invoice PDFs render in the background; re-queue any left pending by the last run
+invoice_queue.QUEUE.start(engine)
 
 USER_ID = 1
 ACCOUNT_ID = 1
 
+# Load the page's other screens in the background once the first one is shown
+PREWARM_SCREENS = True
+
 def main(page: Page):
     global ACCOUNT_ID
 
@@ -42,19 +77,24 @@ def main(page: Page):
     page.window.center()
     page.on_resized = handle_resize
 
-    # Nav items
-    nav_items = [
-        {"icon": Icons.DASHBOARD, "label": "Dashboard", "function": dashboard},
-        {"icon": Icons.RECEIPT, "label": "Billing", "function": bill},
-        {"icon": Icons.HISTORY, "label": "Recent Transactions", "function": recentTransaction},
-        {"icon": Icons.PEOPLE, "label": "Customer Details", "function": customerDetails},
-        {"icon": Icons.INVENTORY, "label": "Add Stock", "function": grn},
-        {"icon": Icons.ADD_SHOPPING_CART, "label": "Add Product", "function": addProduct},
-        {"icon": Icons.BUSINESS, "label": "Supplier Details", "function": supplierDetails},
-        {"icon": Icons.CURRENCY_EXCHANGE, "label": "Report", "function": accounts},
-        {"icon": Icons.PAYMENTS, "label": "Cheque", "function": chequeManagement},
-        {"icon": Icons.SETTINGS, "label": "Settings", "function": settings},
-    ]
+    # Screens mark changed controls; they go out together once per frame
+    frames = frame_scheduler.FRAMES
+
+    # Nav items; each screen's module is imported the first time it is opened
+    nav_items = screens.REGISTRY
+
+    # This page's own copies of the screens, their state and DB sessions
+    context = app_context.AppContext(page, engine, USER_ID, nav_items)
+
+    # Built screens are kept and refreshed on table changes instead of being rebuilt per click
+    cache = screen_cache.ScreenCache(
+        nav_items,
+        context.build,
+        on_refreshed=page.update,
+        module=context.loaded_module,
+    )
+    context.on_close(events.BUS.subscribe(events.ALL, cache.invalidate))
+    context.on_close(cache.drop)
 
     # State variables
     selected_index = 0  # Changed from 3 to 0 to avoid index issues
@@ -66,8 +106,8 @@ def main(page: Page):
             expand=True,
             content=Row(
                 controls=[
-                    Icon(item["icon"], size=24),
-                    Text(item["label"], size=14, opacity=1 if not is_sidebar_compact else 0),
+                    Icon(item.icon, size=24),
+                    Text(item.label, size=14, opacity=1 if not is_sidebar_compact else 0),
                 ],
                 spacing=15,
             ),
@@ -76,14 +116,14 @@ def main(page: Page):
             bgcolor=Colors.BLUE_200 if selected_index == index else None,
             on_hover=lambda e: highlight_item(e, index),
             on_click=lambda e: select_nav_item(index),
-            tooltip=item["label"] if is_sidebar_compact else None,
+            tooltip=item.label if is_sidebar_compact else None,
         )
 
     # Highlight item on hover
     def highlight_item(e, index):
         if selected_index != index:
             e.control.bgcolor = Colors.BLUE_100 if e.data == "true" else None
-        e.control.update()
+        frames.mark(e.control)
 
     # Select nav item
     def select_nav_item(index):
@@ -98,7 +138,6 @@ def main(page: Page):
         update_nav_items()
         update_content()
         page.update()
-        CONN.commit()
 
     # Toggle sidebar between compact and full
     def toggle_sidebar(e=None):
@@ -146,10 +185,10 @@ def main(page: Page):
 
         # Get the content from the selected function
         try:
-            content_widget = nav_items[selected_index]["function"](page, CONN, USER_ID)
+            content_widget = cache.get(selected_index)
         except Exception as e:
             print(f"Error loading content: {e}")
-            content_widget = Text(f"Error loading {nav_items[selected_index]['label']}")
+            content_widget = Text(f"Error loading {nav_items[selected_index].label}")
 
         # Update content area
         content_area.content = Column(
@@ -200,17 +239,18 @@ def main(page: Page):
         text_align=ft.TextAlign.RIGHT,
     )
 
-    # Function to update time
+    # Function to update time; only the two Text controls are sent, not the page
+    page_closed = threading.Event()
+
     def update_time():
-        while True:
+        while not page_closed.is_set():
             now = datetime.now()
             clock.value = now.strftime("%H:%M:%S")
             date_display.value = now.strftime("%A, %B %d, %Y")
-            try:
-                page.update()
-            except:
-                break  # Stop if page is closed
-            time.sleep(1)
+            frames.mark(clock, date_display)
+            if frames.profile:
+                print(f"ui {frames.stats()}", flush=True)
+            page_closed.wait(1)
 
     # Start the clock update thread
     clock_thread = threading.Thread(target=update_time, daemon=True)
@@ -232,9 +272,10 @@ def main(page: Page):
     # Initialize the content
     update_content()
 
+    # Only this page's state goes; the shared services stop with the process
     def cls(e):
-        CONN.commit()
-        CONN.close()
+        page_closed.set()
+        context.close()
 
     page.on_close = cls
 
@@ -251,5 +292,32 @@ def main(page: Page):
         )
     )
 
+    if os.environ.get("POS_STARTUP_PROBE"):
+        # bench_startup.py: report time to the first frame and quit
+        print(f"first-frame {time.perf_counter() - _STARTED:.3f}", flush=True)
+        os._exit(0)
+
+    if PREWARM_SCREENS:
+        context.prewarm(skip={selected_index})
+
+def shutdown():
+    frame_scheduler.FRAMES.stop()
+    summary_scheduler.stop()
+    change_feed.FEED.stop()
+    engine.dispose()
+
+
+atexit.register(shutdown)
+
 if __name__ == "__main__":
-    ft.app(target=main, upload_dir="")
\ No newline at end of file
+    # POS_WEB_PORT=8550 serves the app over Flet web mode, one page context
+    # per browser session. Several such processes can run behind a reverse
+    # proxy with sticky (websocket) sessions; they share nothing but the
+    # database, and change_feed keeps their caches in step. Size the pool
+    # per process with POS_POOL_SIZE / POS_POOL_OVERFLOW (see DB.py).
+    web_port = os.environ.get("POS_WEB_PORT")
+    if web_port:
+        ft.app(target=main, view=None, host=os.environ.get("POS_WEB_HOST", "0.0.0.0"),
+               port=int(web_port), upload_dir="")
+    else:
+        ft.app(target=main, upload_dir="")
\ No newline at end of file
@@ -0,0 +1,261 @@
+# metrics.py
+# Dashboard metrics kept as rollups. Posting code (checkout, GRN, add stock,
+# customer payments, batch expiry) adds to the rollup rows in the same
+# transaction as the document itself, so the dashboard reads a handful of
+# small rows instead of scanning invoices, transactions and stocks.
+# check_metrics.py checks that these increments add up to rebuild().
+#
+# Every posting of the day would otherwise update the same daily_metrics
+# row and hold its lock until commit, so the daily figures are appended as
+# one daily_metric_deltas row per posting instead. fold() moves them into
+# daily_metrics (SummaryScheduler runs it), and readers add what is not
+# folded yet.
+#
+#   python metrics.py    # rebuild every rollup from the raw tables
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+import DB
+
+LOW_STOCK_LEVEL = 10
+EXPIRY_WINDOW_DAYS = 30
+TOP_SELLER_DAYS = 30
+
+ROLLUP_TABLES = [DB.DailyMetric.__table__, DB.DailyMetricDelta.__table__,
+                 DB.ProductDailySales.__table__, DB.ProductStockLevel.__table__]
+DAILY_COLUMNS = ["sales", "income", "expense", "cash_in", "cash_out", "invoice_count", "grn_count"]
+
+
+def _dec(value):
+    return Decimal(str(value or 0))
+
+
+# ---- write side: called inside the posting transaction ----
+
+def record_day(session, day, **amounts):
+    """
+    Add amounts to the day's figures, as a delta row fold() picks up later.
+
+    Keyword arguments are DailyMetric columns (sales, income, expense,
+    cash_in, cash_out, invoice_count, grn_count). A plain INSERT: nothing
+    is locked, so concurrent postings never wait on each other here.
+    """
+    values = {k: v if k.endswith("_count") else _dec(v) for k, v in amounts.items() if v}
+    if not values:
+        return
+    session.execute(insert(DB.DailyMetricDelta).values(day=day, **values))
+
+
+def record_sales(session, day, lines):
+    """Book sold lines: [(product_id, quantity, revenue)]."""
+    sold = {}
+    for product_id, qty, revenue in lines:
+        q, r = sold.get(product_id, (Decimal(0), Decimal(0)))
+        sold[product_id] = (q + _dec(qty), r + _dec(revenue))
+    if not sold:
+        return
+
+    stmt = pg_insert(DB.ProductDailySales).values([
+        {"day": day, "product_id": p, "quantity": q, "revenue": r} for p, (q, r) in sold.items()
+    ])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[DB.ProductDailySales.day, DB.ProductDailySales.product_id],
+        set_={
+            "quantity": DB.ProductDailySales.quantity + stmt.excluded.quantity,
+            "revenue": DB.ProductDailySales.revenue + stmt.excluded.revenue,
+        },
+    ))
+    _adjust_stock(session, {p: -q for p, (q, _) in sold.items()})
+
+
+def record_stock_in(session, lines):
+    """Book received stock: [(product_id, quantity)]."""
+    received = {}
+    for product_id, qty in lines:
+        received[product_id] = received.get(product_id, Decimal(0)) + _dec(qty)
+    _adjust_stock(session, received)
+
+
+def record_expired(session, lines):
+    """Take what expired batches still held off the stock levels: [(product_id, quantity)]."""
+    expired = {}
+    for product_id, qty in lines:
+        expired[product_id] = expired.get(product_id, Decimal(0)) - _dec(qty)
+    _adjust_stock(session, {p: q for p, q in expired.items() if q})
+
+
+def _adjust_stock(session, deltas):
+    if not deltas:
+        return
+    stmt = pg_insert(DB.ProductStockLevel).values([
+        {"product_id": p, "on_hand": q} for p, q in sorted(deltas.items())
+    ])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[DB.ProductStockLevel.product_id],
+        set_={"on_hand": DB.ProductStockLevel.on_hand + stmt.excluded.on_hand},
+    ))
+
+
+def fold(session):
+    """
+    Move every delta row into daily_metrics; the caller commits. Returns
+    the number of rows folded. The DELETE ... RETURNING takes each delta
+    once, so concurrent folds (one per process) don't count anything twice.
+    """
+    sums = ", ".join(f"COALESCE(SUM({c}), 0)" for c in DAILY_COLUMNS)
+    updates = ", ".join(f"{c} = COALESCE(daily_metrics.{c}, 0) + EXCLUDED.{c}" for c in DAILY_COLUMNS)
+    return session.execute(text(f"""
+        WITH moved AS (DELETE FROM daily_metric_deltas RETURNING *),
+             folded AS (
+                 INSERT INTO daily_metrics (day, {", ".join(DAILY_COLUMNS)})
+                 SELECT day, {sums} FROM moved GROUP BY day
+                 ON CONFLICT (day) DO UPDATE SET {updates}
+             )
+        SELECT COUNT(*) FROM moved
+    """)).scalar()
+
+
+# ---- read side: used by the dashboard ----
+
+def _day_total(session, column, day=None):
+    """Sum of `column` over daily_metrics plus the unfolded deltas, for one day or all."""
+    total = Decimal(0)
+    for model in (DB.DailyMetric, DB.DailyMetricDelta):
+        query = select(func.coalesce(func.sum(column(model)), 0))
+        if day is not None:
+            query = query.where(model.day == day)
+        total += _dec(session.execute(query).scalar())
+    return total
+
+
+def today_summary(session, today=None):
+    """Today's income and expense, current cash and supplier credit outstanding."""
+    today = today or date.today()
+    income = _day_total(session, lambda m: m.income, today)
+    expense = _day_total(session, lambda m: m.expense, today)
+    cash = _day_total(session, lambda m: m.cash_in - m.cash_out)
+    pending = session.execute(
+        select(func.coalesce(func.sum(DB.Supplier.credit), 0)).where(DB.Supplier.credit > 0)
+    ).scalar()
+    return {
+        "income": float(income),
+        "expense": float(expense),
+        "cash": float(cash),
+        "pending": float(pending),
+    }
+
+
+def pending_suppliers(session, limit=10):
+    return session.execute(
+        select(DB.Supplier.name, DB.Supplier.company_name, DB.Supplier.credit)
+        .where(DB.Supplier.credit > 0)
+        .order_by(DB.Supplier.credit.desc())
+        .limit(limit)
+    ).all()
+
+
+def top_sellers(session, days=TOP_SELLER_DAYS, limit=6, today=None):
+    since = (today or date.today()) - timedelta(days=days)
+    qty = func.sum(DB.ProductDailySales.quantity).label("quantity")
+    return session.execute(
+        select(DB.Product.title, qty)
+        .join(DB.Product, DB.Product.id == DB.ProductDailySales.product_id)
+        .where(DB.ProductDailySales.day >= since)
+        .group_by(DB.Product.id, DB.Product.title)
+        .order_by(qty.desc())
+        .limit(limit)
+    ).all()
+
+
+def low_stock(session, level=LOW_STOCK_LEVEL, limit=10):
+    return session.execute(
+        select(DB.Product.title, DB.ProductStockLevel.on_hand)
+        .join(DB.Product, DB.Product.id == DB.ProductStockLevel.product_id)
+        .where(DB.ProductStockLevel.on_hand <= level)
+        .order_by(DB.ProductStockLevel.on_hand)
+        .limit(limit)
+    ).all()
+
+
+def near_expiry(session, days=EXPIRY_WINDOW_DAYS, limit=10, today=None):
+    today = today or date.today()
+    return session.execute(
+        select(DB.Product.title, DB.Stock.expire_date, DB.Stock.current_stock)
+        .join(DB.Product, DB.Product.id == DB.Stock.product_id)
+        .where(DB.Stock.status == 'active',
+               DB.Stock.expire_date >= today,
+               DB.Stock.expire_date <= today + timedelta(days=days),
+               DB.Stock.current_stock > 0)
+        .order_by(DB.Stock.expire_date)
+        .limit(limit)
+    ).all()
+
+
+# ---- rebuild ----
+
+def rebuild(session):
+    """Recompute every rollup from the raw tables; the caller commits."""
+    for table in ROLLUP_TABLES:
+        session.execute(delete(table))
+
+    session.execute(text("""
+        INSERT INTO daily_metrics (day, sales, income, expense, cash_in, cash_out, invoice_count, grn_count)
+        SELECT day, SUM(sales), SUM(income), SUM(expense), SUM(cash_in), SUM(cash_out),
+               SUM(invoice_count), SUM(grn_count)
+        FROM (
+            SELECT created_on::date AS day, total AS sales, paid_amount AS income, 0 AS expense,
+                   0 AS cash_in, 0 AS cash_out, 1 AS invoice_count, 0 AS grn_count
+              FROM invoices
+            UNION ALL
+            SELECT created_on::date, 0, 0, paid_amount, 0, 0, 0, 1 FROM grn
+            UNION ALL
+            SELECT date::date, 0, 0, 0, amount, 0, 0, 0 FROM invoice_transactions
+            UNION ALL
+            SELECT date::date, 0, 0, 0, 0, amount, 0, 0 FROM grn_transactions
+        ) AS m
+        WHERE day IS NOT NULL
+        GROUP BY day
+    """))
+
+    session.execute(text("""
+        INSERT INTO product_daily_sales (day, product_id, quantity, revenue)
+        SELECT i.created_on::date, s.product_id, SUM(ihs.quantity), SUM(ihs.quantity * ihs.unit_price)
+          FROM invoice_has_stock ihs
+          JOIN invoices i ON i.id = ihs.invoice_id
+          JOIN stocks s ON s.id = ihs.stock_id
+         WHERE i.created_on IS NOT NULL
+         GROUP BY i.created_on::date, s.product_id
+    """))
+
+    session.execute(text("""
+        INSERT INTO product_stock_levels (product_id, on_hand)
+        SELECT product_id, SUM(COALESCE(current_stock, 0))
+          FROM stocks
+         WHERE status = 'active'
+         GROUP BY product_id
+    """))
+
+
+def ensure(engine):
+    """Create the rollup tables if missing and backfill them on first use."""
+    DB.Base.metadata.create_all(engine, tables=ROLLUP_TABLES)
+    with Session(engine) as session:
+        if session.execute(select(DB.ProductStockLevel.product_id).limit(1)).first() is None:
+            rebuild(session)
+            session.commit()
+
+
+if __name__ == "__main__":
+    conn, engine = DB.connect_db()
+    DB.Base.metadata.create_all(engine, tables=ROLLUP_TABLES)
+    with Session(engine) as s:
+        rebuild(s)
+        s.commit()
+    print("Metrics rebuilt.")
+    conn.close()
+    engine.dispose()
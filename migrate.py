@@ -0,0 +1,121 @@
+# migrate.py
+# Applies the versioned SQL files in migrations/ (0001_*.sql, 0002_*.sql, ...)
+# in order, each in its own transaction, and records them in
+# schema_migrations so every file runs once per database.
+#
+# A file containing the line "-- migrate: no-transaction" runs statement by
+# statement in autocommit mode instead, which CREATE / DROP INDEX
+# CONCURRENTLY needs. Such a file must hold no function bodies, and each of
+# its statements must be safe to repeat: if it fails halfway, the whole file
+# runs again next time. Indexes its interrupted CONCURRENTLY builds left
+# INVALID are dropped first, so IF NOT EXISTS doesn't skip them.
+#
+# upgrade() holds a Postgres advisory lock while it works, so terminals and
+# services starting at the same time migrate one after the other.
+#
+#   python migrate.py           # apply whatever is pending
+#   python migrate.py --status  # list applied / pending versions
+
+import os
+import re
+import sys
+
+from sqlalchemy import text
+
+import DB
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+LOCK_KEY = 0x706F735F6D6967     # pg_advisory_lock key: "pos_mig"
+NO_TRANSACTION = "-- migrate: no-transaction"
+CONCURRENT_INDEX = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+"?(\w+)"?',
+                              re.IGNORECASE)
+
+
+def available():
+    """[(version, path)] for every migration file, oldest first."""
+    files = sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".sql"))
+    return [(f.split("_", 1)[0], os.path.join(MIGRATIONS_DIR, f)) for f in files]
+
+
+def applied(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(20) PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """))
+    return {v for (v,) in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def statements(sql):
+    """The statements of a no-transaction file, comments left out."""
+    lines = [line for line in sql.splitlines() if not line.lstrip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+def drop_invalid_indexes(conn, sql):
+    """Drop the indexes `sql` builds CONCURRENTLY that an earlier, interrupted run left INVALID."""
+    names = CONCURRENT_INDEX.findall(sql)
+    if not names:
+        return
+    invalid = conn.execute(text("""
+        SELECT c.relname
+          FROM pg_index i
+          JOIN pg_class c ON c.oid = i.indexrelid
+         WHERE NOT i.indisvalid AND c.relname = ANY(:names)
+    """), {"names": names}).scalars().all()
+    for name in invalid:
+        print(f"Dropping invalid index {name} left by an interrupted migration")
+        conn.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def upgrade(engine):
+    """Apply every pending migration; returns the versions applied."""
+    # the lock's connection stays in autocommit: an open transaction on it
+    # would make CREATE INDEX CONCURRENTLY wait for it forever
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock:
+        lock.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+        try:
+            # read under the lock: whoever held it before may have applied some
+            return _apply_pending(engine, applied(lock))
+        finally:
+            lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+
+
+def _apply_pending(engine, done):
+    ran = []
+    for version, path in available():
+        if version in done:
+            continue
+        with open(path, encoding="utf-8") as f:
+            sql = f.read()
+        record = (text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+                  {"v": version, "n": os.path.basename(path)})
+        if NO_TRANSACTION in sql:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                drop_invalid_indexes(conn, sql)
+                for stmt in statements(sql):
+                    conn.exec_driver_sql(stmt)
+                conn.execute(*record)
+        else:
+            with engine.begin() as conn:
+                # the files are plain SQL with no bind parameters
+                conn.exec_driver_sql(sql)
+                conn.execute(*record)
+        print(f"Applied migration {os.path.basename(path)}")
+        ran.append(version)
+    return ran
+
+
+if __name__ == "__main__":
+    engine = DB.get_engine()
+    if "--status" in sys.argv:
+        with engine.begin() as conn:
+            done = applied(conn)
+        for version, path in available():
+            print(f"{'applied' if version in done else 'pending'}  {os.path.basename(path)}")
+    else:
+        ran = upgrade(engine)
+        print(f"{len(ran)} migration(s) applied.")
+    engine.dispose()
@@ -0,0 +1,41 @@
+-- 0001_hot_path_indexes.sql
+-- Secondary indexes for the predicates the screens filter on. DB.py declares
+-- the same indexes (same names) so a fresh create_database() matches; the
+-- IF NOT EXISTS guards make this a no-op there. Built CONCURRENTLY so the
+-- tills keep selling while a large stocks / invoices table is indexed.
+-- migrate: no-transaction
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- declared in DB.py earlier but never added to existing databases
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_barcode ON products (barcode);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_stocks_expire_date ON stocks (expire_date);
+
+-- billing: a product's batches, and the active, unexpired ones it offers
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_stocks_product_status_expire ON stocks (product_id, status, expire_date);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_stocks_active_product ON stocks (product_id, expire_date)
+    WHERE status = 'active';
+
+-- invoice lines and stock movements by parent
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_invoice_has_stock_invoice_id ON invoice_has_stock (invoice_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_stock_movement_stock_id ON stock_movement (stock_id);
+
+-- customer history / pending invoices, and recent transactions by date
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_invoices_customer_status ON invoices (customer_id, status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_invoices_created_on ON invoices (created_on);
+
+-- accounts screen and cheque reminders
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "ix_expenseTracker_date" ON "expenseTracker" (date);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_cheques_date_status ON cheques (cheque_date, status);
+
+-- ilike '%term%' searches
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_title_trgm ON products USING gin (title gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_code_trgm ON products USING gin (code gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_note_trgm ON products USING gin (note gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customers_name_trgm ON customers USING gin (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customers_mobile_trgm ON customers USING gin (mobile gin_trgm_ops);
+
+ANALYZE products;
+ANALYZE stocks;
+ANALYZE customers;
+ANALYZE invoices;
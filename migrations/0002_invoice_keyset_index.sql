@@ -0,0 +1,8 @@
+-- 0002_invoice_keyset_index.sql
+-- Recent Transactions pages by seeking past the last (created_on, id) shown.
+-- A composite index serves both the row comparison and the ORDER BY, and
+-- makes the single-column created_on index from 0001 redundant.
+-- migrate: no-transaction
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_invoices_created_on_id ON invoices (created_on, id);
+DROP INDEX CONCURRENTLY IF EXISTS ix_invoices_created_on;
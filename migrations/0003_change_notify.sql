@@ -0,0 +1,47 @@
+-- 0003_change_notify.sql
+-- Every committed change to the tables the terminals cache (stock levels,
+-- products, units, customers, settings) sends a NOTIFY on pos_changes, so
+-- change_feed.py on each terminal can update just what changed.
+-- Payload: {"table", "op", "id", "product_id" (stocks only), "origin"}, where
+-- origin is the sending process's application_name (DB.APP_NAME).
+-- Notifications are delivered at commit and dropped on rollback.
+
+CREATE OR REPLACE FUNCTION pos_notify_change() RETURNS trigger AS $$
+DECLARE
+    row_json jsonb;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        row_json := to_jsonb(OLD);
+    ELSE
+        row_json := to_jsonb(NEW);
+    END IF;
+    PERFORM pg_notify('pos_changes', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', lower(TG_OP),
+        'id', (row_json->>'id')::int,
+        'product_id', (row_json->>'product_id')::int,
+        'origin', current_setting('application_name')
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS stocks_notify ON stocks;
+CREATE TRIGGER stocks_notify AFTER INSERT OR UPDATE OR DELETE ON stocks
+    FOR EACH ROW EXECUTE FUNCTION pos_notify_change();
+
+DROP TRIGGER IF EXISTS products_notify ON products;
+CREATE TRIGGER products_notify AFTER INSERT OR UPDATE OR DELETE ON products
+    FOR EACH ROW EXECUTE FUNCTION pos_notify_change();
+
+DROP TRIGGER IF EXISTS units_notify ON units;
+CREATE TRIGGER units_notify AFTER INSERT OR UPDATE OR DELETE ON units
+    FOR EACH ROW EXECUTE FUNCTION pos_notify_change();
+
+DROP TRIGGER IF EXISTS customers_notify ON customers;
+CREATE TRIGGER customers_notify AFTER INSERT OR UPDATE OR DELETE ON customers
+    FOR EACH ROW EXECUTE FUNCTION pos_notify_change();
+
+DROP TRIGGER IF EXISTS variables_notify ON variables;
+CREATE TRIGGER variables_notify AFTER INSERT OR UPDATE OR DELETE ON variables
+    FOR EACH ROW EXECUTE FUNCTION pos_notify_change();
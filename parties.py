@@ -0,0 +1,88 @@
+# parties.py
+# Customer and supplier lists for the details screens, with each party's
+# document count, outstanding balance and last activity in the same query.
+# The page of parties is picked first (search + limit) and only those rows
+# are joined to their invoices / GRNs and grouped, so the list costs one
+# round trip however many parties it shows. Per-party documents are left
+# to the screens to load when a row is selected.
+
+from sqlalchemy import case, func, or_, select
+
+import DB
+
+
+def _pick_customers(query, limit):
+    pattern = f"%{query}%"
+    return (
+        select(DB.Customer.id, DB.Customer.name, DB.Customer.mobile, DB.Customer.credit)
+        .where(or_(DB.Customer.name.ilike(pattern), DB.Customer.mobile.ilike(pattern)))
+        .order_by(DB.Customer.id)
+        .limit(limit)
+        .subquery()
+    )
+
+
+def customers(session, query="", limit=20):
+    """
+    [Row(id, name, mobile, credit, invoice_count, outstanding, last_activity)]
+    for up to `limit` customers matching `query` on name or mobile.
+    `outstanding` is what is still unpaid on their pending invoices.
+    """
+    picked = _pick_customers(query, limit)
+    inv = DB.Invoice
+    unpaid = case((inv.status == 'pending', inv.total - inv.paid_amount), else_=0)
+    return session.execute(
+        select(
+            picked.c.id, picked.c.name, picked.c.mobile, picked.c.credit,
+            func.count(inv.id).label("invoice_count"),
+            func.coalesce(func.sum(unpaid), 0).label("outstanding"),
+            func.max(inv.created_on).label("last_activity"),
+        )
+        .outerjoin(inv, inv.customer_id == picked.c.id)
+        .group_by(picked.c.id, picked.c.name, picked.c.mobile, picked.c.credit)
+        .order_by(picked.c.id)
+    ).all()
+
+
+def _pick_suppliers(query, limit):
+    s = DB.Supplier
+    pattern = f"%{query}%"
+    return (
+        select(s.id, s.name, s.company_name, s.code, s.phone_number, s.land_line,
+               s.email, s.address, s.credit)
+        .where(or_(
+            s.name.ilike(pattern),
+            s.phone_number.ilike(pattern),
+            s.company_name.ilike(pattern),
+            s.land_line.ilike(pattern),
+            s.email.ilike(pattern),
+            s.address.ilike(pattern),
+            s.code.ilike(pattern),
+        ))
+        .order_by(s.id)
+        .limit(limit)
+        .subquery()
+    )
+
+
+def suppliers(session, query="", limit=20):
+    """
+    [Row(id, name, company_name, code, phone_number, land_line, email, address,
+    credit, grn_count, outstanding, last_activity)] for up to `limit`
+    suppliers matching `query`. `outstanding` is the unpaid part of their GRNs.
+    """
+    picked = _pick_suppliers(query, limit)
+    grn = DB.GRN
+    unpaid = func.greatest(grn.total_amount - func.coalesce(grn.paid_amount, 0), 0)
+    columns = list(picked.c)
+    return session.execute(
+        select(
+            *columns,
+            func.count(grn.id).label("grn_count"),
+            func.coalesce(func.sum(unpaid), 0).label("outstanding"),
+            func.max(grn.created_on).label("last_activity"),
+        )
+        .outerjoin(grn, grn.supplier_id == picked.c.id)
+        .group_by(*columns)
+        .order_by(picked.c.id)
+    ).all()
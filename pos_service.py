@@ -0,0 +1,488 @@
+# pos_service.py
+# Headless POS service: the checkout, stock and lookup operations the
+# screens perform, without a UI, plus a local HTTP/JSON API for them.
+#
+# PosService holds the operations; each runs as one transaction on its own
+# pooled session and goes through the same code the screens use
+# (search_index, allocation, postings), so the API and the tills can't drift.
+# A transaction Postgres aborts as a deadlock victim or serialization
+# failure is run again, up to RETRIES times.
+#
+# The HTTP side is a small asyncio server (keep-alive HTTP/1.1, JSON in and
+# out). Request parsing happens on the event loop; the database work runs
+# on a thread pool sized to the connection pool, so slow queries never
+# block other clients.
+#
+#   GET  /health
+#   GET  /products?q=<query>&limit=18       product search with sellable batches
+#   POST /allocations                       {"product_id", "qty"} -> FEFO split (nothing written)
+#   POST /invoices                          {"items": [{"product_id", "qty", "unit_price"?}],
+#                                            "customer_id"?, "paid"?, "discount"?}
+#   POST /grns                              postings.post_grn arguments, as JSON
+#   POST /customers/<id>/payments           {"cash"?, "cheque"?: {"cheque_number", "cheque_date", "amount"}}
+#
+# Errors come back as {"error": ...}: 400 for a malformed request or input
+# the tills would refuse too (quantities <= 0, prices under the batch's
+# minimum, unpaid balances without a customer, negative payments or GRN
+# prices), 404 for unknown routes and for customers or suppliers that don't
+# exist, 409 when stock ran out, 500 otherwise.
+#
+#   python pos_service.py --port 8600 --workers 16
+
+import argparse
+import asyncio
+import inspect
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from urllib.parse import parse_qs, urlsplit
+
+from sqlalchemy import or_, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import selectinload
+
+import DB
+import allocation
+import postings
+import search_index
+
+MAX_BODY = 1 << 20
+RETRIES = 3
+RETRY_CODES = {"40P01", "40001"}    # deadlock_detected, serialization_failure
+
+
+class InvalidRequest(Exception):
+    """The request asks for something the tills would refuse. Nothing has been written."""
+
+
+class NotFound(Exception):
+    """A customer or supplier the request names doesn't exist. Nothing has been written."""
+
+
+def _require(session, model, record_id, name):
+    """NotFound unless `model` has a row with id `record_id`."""
+    if session.scalar(select(model.id).where(model.id == record_id)) is None:
+        raise NotFound(f"no {name} #{record_id}")
+
+
+def _amount(value, name, positive=False):
+    """`value` as a Decimal, or InvalidRequest if it isn't a number >= 0 (> 0 if `positive`)."""
+    try:
+        amount = Decimal(str(value))
+    except ArithmeticError:
+        raise InvalidRequest(f"{name} is not a number: {value!r}")
+    if not amount.is_finite() or amount < 0 or (positive and amount == 0):
+        raise InvalidRequest(f"{name} must be {'greater than' if positive else 'at least'} 0, got {value}")
+    return amount
+
+
+class PosService:
+    """Checkout, stock and lookup operations, one transaction each."""
+
+    def __init__(self, session_factory=None, user_id=1, account_id=1):
+        self.session_factory = session_factory or DB.SessionLocal
+        self.user_id = user_id
+        self.account_id = account_id
+
+    def _run(self, work, commit=True):
+        for attempt in range(RETRIES + 1):
+            with self.session_factory() as session:
+                try:
+                    result = work(session)
+                    if commit:
+                        session.commit()
+                    else:
+                        session.rollback()
+                    return result
+                except OperationalError as e:
+                    session.rollback()
+                    # Postgres picked this transaction as a deadlock victim or
+                    # serialization failure: nothing was written, run it again
+                    if getattr(e.orig, "pgcode", None) not in RETRY_CODES or attempt == RETRIES:
+                        raise
+                except Exception:
+                    session.rollback()
+                    raise
+
+    def tax_percent(self, session):
+        value = session.scalar(select(DB.Variables.value).where(DB.Variables.name == 'tax_percentage'))
+        return Decimal(value) if value else Decimal(0)
+
+    def search_products(self, query="", limit=18):
+        """Ranked products with their active, unexpired batches."""
+        def work(session):
+            search_index.INDEX.ensure_built(session)
+            ids = search_index.INDEX.search(query, limit)
+            if not ids:
+                return []
+            today = datetime.now().date()
+            products = session.scalars(
+                select(DB.Product)
+                .where(DB.Product.id.in_(ids))
+                .options(selectinload(
+                    DB.Product.stocks.and_(
+                        DB.Stock.status == 'active',
+                        DB.Stock.current_stock > 0,
+                        or_(DB.Stock.expire_date.is_(None), DB.Stock.expire_date >= today),
+                    )
+                ))
+            ).all()
+            rank = {pid: n for n, pid in enumerate(ids)}
+            products.sort(key=lambda p: rank[p.id])
+            return [
+                {
+                    "id": p.id,
+                    "title": p.title,
+                    "code": p.code,
+                    "barcode": p.barcode,
+                    "stocks": [
+                        {
+                            "stock_id": st.id,
+                            "current_stock": st.current_stock,
+                            "selling_price": st.selling_price,
+                            "min_selling_price": st.min_selling_price,
+                            "expire_date": st.expire_date,
+                        }
+                        for st in sorted(p.stocks, key=lambda st: st.id)
+                    ],
+                }
+                for p in products
+            ]
+        return self._run(work, commit=False)
+
+    def allocate(self, product_id, qty):
+        """The FEFO split a sale of `qty` would take right now; nothing is written."""
+        qty = _amount(qty, "qty", positive=True)
+
+        def work(session):
+            return [
+                {"stock_id": stock_id, "qty": take, "selling_price": price}
+                for stock_id, take, price in allocation.allocate(session, product_id, qty)
+            ]
+        return self._run(work, commit=False)
+
+    def checkout(self, items, customer_id=None, paid=None, discount=0, customer_label="API"):
+        """
+        Sell `items` ([{product_id, qty, unit_price?}]) allocated FEFO and
+        return {invoice_id, total, lines}. `paid` defaults to the full total;
+        paying less needs a customer to carry the balance.
+        """
+        if not items:
+            raise InvalidRequest("items is empty")
+        checked = []
+        for item in items:
+            line = {"product_id": item["product_id"], "qty": _amount(item["qty"], "qty", positive=True)}
+            if item.get("unit_price") is not None:
+                line["unit_price"] = _amount(item["unit_price"], "unit_price")
+            checked.append(line)
+        items = checked
+        discount = _amount(discount or 0, "discount")
+        if paid is not None:
+            paid = _amount(paid, "paid")
+
+        def work(session):
+            if customer_id is not None:
+                _require(session, DB.Customer, customer_id, "customer")
+            lines = allocation.allocate_lines(session, items)
+            self._check_prices(session, lines)
+            subtotal = sum(Decimal(str(line["qty"])) * Decimal(str(line["unit_price"])) for line in lines)
+            after_discount = subtotal - discount
+            tax = (after_discount * self.tax_percent(session) / 100).quantize(Decimal("0.01"))
+            total = after_discount + tax
+            if paid is not None and paid < total and customer_id is None:
+                raise InvalidRequest(f"paid {paid} is less than the total {total} and there is no customer_id")
+            invoice_id = postings.post_invoice(
+                session,
+                user_id=self.user_id,
+                account_id=self.account_id,
+                customer_id=customer_id,
+                lines=lines,
+                total=total,
+                discount=discount,
+                tax=tax,
+                paid=total if paid is None else paid,
+                customer_label=customer_label,
+            )
+            return {"invoice_id": invoice_id, "total": total, "lines": lines}
+        return self._run(work)
+
+    @staticmethod
+    def _check_prices(session, lines):
+        """InvalidRequest if a line sells below its batch's minimum selling price."""
+        minimum = dict(session.execute(
+            select(DB.Stock.id, DB.Stock.min_selling_price)
+            .where(DB.Stock.id.in_([line["stock_id"] for line in lines]))
+        ).all())
+        for line in lines:
+            floor = minimum.get(line["stock_id"])
+            if floor is not None and Decimal(str(line["unit_price"])) < Decimal(str(floor)):
+                raise InvalidRequest(
+                    f"unit_price {line['unit_price']} is below the minimum {floor} of batch #{line['stock_id']}"
+                )
+
+    def post_grn(self, supplier_id, lines, total, **kwargs):
+        """Receive stock; returns {grn_id}. Takes postings.post_grn's arguments."""
+        if not lines:
+            raise InvalidRequest("lines is empty")
+        checked = []
+        for line in lines:
+            min_price = _amount(line["min_price"], "min_price")
+            sell_price = _amount(line["sell_price"], "sell_price")
+            if sell_price < min_price:
+                raise InvalidRequest(f"sell_price {sell_price} is below min_price {min_price}")
+            checked.append({
+                "product_id": line["product_id"],
+                "qty": _amount(line["qty"], "qty", positive=True),
+                "cost": _amount(line["cost"], "cost"),
+                "min_price": min_price,
+                "sell_price": sell_price,
+                "expire_date": _date(line["expire_date"]) if line.get("expire_date") else None,
+            })
+        lines = checked
+        total = _amount(total, "total")
+        for name in ("discount", "credit"):
+            if kwargs.get(name) is not None:
+                kwargs[name] = _amount(kwargs[name], name)
+        if kwargs.get("cheque"):
+            kwargs["cheque"] = dict(kwargs["cheque"], cheque_date=_date(kwargs["cheque"]["cheque_date"]),
+                                    amount=_amount(kwargs["cheque"]["amount"], "cheque amount"))
+
+        def work(session):
+            if supplier_id is not None:
+                _require(session, DB.Supplier, supplier_id, "supplier")
+            grn_id = postings.post_grn(
+                session, user_id=self.user_id, account_id=self.account_id,
+                supplier_id=supplier_id, lines=lines, total=total, **kwargs,
+            )
+            return {"grn_id": grn_id}
+        return self._run(work)
+
+    def customer_payment(self, customer_id, cash=0, cheque=None):
+        """Book a customer payment; returns {applied: [{invoice_id, amount}]}."""
+        cash = _amount(cash or 0, "cash")
+        if cheque:
+            cheque = dict(cheque, cheque_date=_date(cheque["cheque_date"]),
+                          amount=_amount(cheque["amount"], "cheque amount"))
+
+        def work(session):
+            _require(session, DB.Customer, customer_id, "customer")
+            applied = postings.post_customer_payment(
+                session, customer_id=customer_id, account_id=self.account_id,
+                cash=cash, cheque=cheque,
+            )
+            return {"applied": [{"invoice_id": i, "amount": a} for i, a in applied]}
+        return self._run(work)
+
+
+def _date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise InvalidRequest(f"not a YYYY-MM-DD date: {value!r}")
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# ---- HTTP ----
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict", 500: "Internal Server Error"}
+
+
+class PosServer:
+    """asyncio HTTP/JSON front end for a PosService."""
+
+    def __init__(self, service, workers=16):
+        self.service = service
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pos-service")
+
+    def route(self, method, path, query, body):
+        """
+        (function, args) for a request, or raise HttpError. Everything the
+        operation needs is read out of the request here, so a missing or
+        mistyped field fails before any work starts.
+        """
+        s = self.service
+        parts = [p for p in path.split("/") if p]
+        if method == "GET" and parts == ["health"]:
+            return (lambda: {"ok": True}), ()
+        if method == "GET" and parts == ["products"]:
+            q = query.get("q", [""])[0]
+            limit = max(1, min(int(query.get("limit", ["18"])[0]), 100))
+            return s.search_products, (q, limit)
+        if method == "POST" and parts == ["allocations"]:
+            return s.allocate, (int(body["product_id"]), body["qty"])
+        if method == "POST" and parts == ["invoices"]:
+            items = [
+                {"product_id": int(item["product_id"]), "qty": item["qty"], "unit_price": item.get("unit_price")}
+                for item in body["items"]
+            ]
+            customer_id = body.get("customer_id")
+            return s.checkout, (items, None if customer_id is None else int(customer_id),
+                                body.get("paid"), body.get("discount", 0))
+        if method == "POST" and parts == ["grns"]:
+            lines = [
+                {
+                    "product_id": int(line["product_id"]),
+                    "qty": line["qty"],
+                    "cost": line["cost"],
+                    "min_price": line["min_price"],
+                    "sell_price": line["sell_price"],
+                    "expire_date": line.get("expire_date"),
+                }
+                for line in body["lines"]
+            ]
+            supplier_id = body.get("supplier_id")
+            kwargs = {k: v for k, v in body.items() if k not in ("supplier_id", "lines", "total")}
+            if kwargs.get("cheque"):
+                kwargs["cheque"] = {key: kwargs["cheque"][key] for key in ("cheque_number", "cheque_date", "amount")}
+            if kwargs.get("new_supplier"):
+                kwargs["new_supplier"] = {key: str(kwargs["new_supplier"][key]) for key in ("name", "company_name")}
+            args = (None if supplier_id is None else int(supplier_id), lines, body["total"])
+            # only arguments postings.post_grn takes; the service supplies user and account
+            inspect.signature(postings.post_grn).bind(None, user_id=None, account_id=None, supplier_id=args[0],
+                                                      lines=lines, total=args[2], **kwargs)
+            return (lambda: s.post_grn(*args, **kwargs)), ()
+        if method == "POST" and len(parts) == 3 and parts[0] == "customers" and parts[2] == "payments":
+            cheque = body.get("cheque")
+            if cheque:
+                cheque = {key: cheque[key] for key in ("cheque_number", "cheque_date", "amount")}
+            return s.customer_payment, (int(parts[1]), body.get("cash", 0), cheque)
+        raise HttpError(404, f"no route for {method} {path}")
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, raw = request
+                status, payload = await self._respond(loop, method, target, raw)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, loop, method, target, raw):
+        try:
+            url = urlsplit(target)
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                raise HttpError(400, "body is not JSON")
+            if not isinstance(body, dict):
+                raise HttpError(400, "body is not a JSON object")
+            try:
+                fn, args = self.route(method, url.path, parse_qs(url.query), body)
+            except (KeyError, TypeError, ValueError) as e:
+                raise HttpError(400, f"bad request: {e!r}")
+            return 200, await loop.run_in_executor(self.pool, fn, *args)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except InvalidRequest as e:
+            return 400, {"error": str(e)}
+        except NotFound as e:
+            return 404, {"error": str(e)}
+        except allocation.OutOfStock as e:
+            return 409, {"error": str(e), "requested": e.requested, "available": e.available}
+        except Exception as e:
+            print(f"Error handling {method} {target}: {e}")
+            return 500, {"error": "internal error"}
+
+    @staticmethod
+    async def _read_request(reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0) or 0)
+        if length > MAX_BODY:
+            return None
+        raw = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, raw
+
+    @staticmethod
+    def _write(writer, status, payload, keep_alive):
+        body = json.dumps(payload, default=_json_default).encode()
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"POS service on http://{host}:{port} ({self.workers} workers)", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless POS service (HTTP/JSON)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=DB.POOL_SIZE + DB.MAX_OVERFLOW,
+                        help="database worker threads (default: the connection pool size)")
+    parser.add_argument("--user", type=int, default=1, help="user id invoices and GRNs are posted as")
+    parser.add_argument("--account", type=int, default=1, help="account payments are booked against")
+    args = parser.parse_args(argv)
+
+    import change_feed
+    import metrics
+    import migrate
+
+    engine = DB.get_engine()
+    migrate.upgrade(engine)
+    metrics.ensure(engine)
+    with DB.SessionLocal() as session:
+        search_index.INDEX.build(session)
+    # other terminals' product edits keep the search index current
+    change_feed.FEED.subscribe("products", search_index.INDEX.on_changes)
+    change_feed.FEED.start(engine)
+
+    server = PosServer(PosService(user_id=args.user, account_id=args.account), workers=args.workers)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        change_feed.FEED.stop()
+        server.pool.shutdown(wait=False)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+# postings.py
+# Write paths for the POS documents (GRNs, invoices, customer payments) and
+# for expiring lapsed batches, set-based where they touch many stock rows at
+# once. They carry no UI, so the screens and pos_service.py share them. Each
+# function does all of its work on the given session inside the caller's
+# transaction and leaves commit / rollback to the caller, so a document is
+# either written completely or not at all.
+
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import Integer, Numeric, case, column, func, insert, or_, select, update, values
+
+import DB
+import metrics
+from allocation import OutOfStock
+
+
+def post_grn(session, *, user_id, account_id, supplier_id, lines, total, discount=0, credit=0,
+             new_supplier=None, supplier_label="", cheque=None, cheque_number=None, card_transaction_id=None):
+    """
+    Write a complete GRN as one unit of work and return its id.
+
+    Args:
+        session: SQLAlchemy session; the caller commits or rolls back.
+        user_id (int): User posting the GRN.
+        account_id (int): Account the GRN payment is booked against.
+        supplier_id (int): Existing supplier, or None when `new_supplier` is given.
+        lines (list): Dicts with product_id, qty, cost, min_price, sell_price and expire_date.
+        total: GRN value before discount; booked as the expense and payment.
+        discount: Discount given by the supplier.
+        credit: Amount left unpaid and added to the supplier's credit.
+        new_supplier (dict): name / company_name of a supplier to create first.
+        supplier_label (str): Name used in the expense descriptions.
+        cheque (dict): cheque_number, cheque_date and amount when paid by cheque.
+        cheque_number (str): Cheque number recorded on the GRN transaction.
+        card_transaction_id (str): Card reference recorded on the GRN transaction.
+    """
+    now = datetime.now()
+
+    if new_supplier:
+        supplier = DB.Supplier(**new_supplier)
+        session.add(supplier)
+        session.flush()
+        supplier_id = supplier.id
+
+    grn = DB.GRN(
+        total_amount=Decimal(str(total)) - Decimal(str(discount or 0)),
+        discount_amount=Decimal(str(discount or 0)),
+        paid_amount=Decimal(str(total)) - Decimal(str(credit or 0)),
+        status='paid' if float(credit or 0) < 1 else 'pending',
+        supplier_id=supplier_id,
+        user_id=user_id,
+    )
+    session.add(grn)
+    session.flush()
+
+    # Stocks in one multi-row INSERT ... RETURNING id; ids come back in line order
+    stock_ids = []
+    if lines:
+        stock_ids = session.scalars(
+            insert(DB.Stock).returning(DB.Stock.id, sort_by_parameter_order=True),
+            [
+                {
+                    "stock_in": line["qty"],
+                    "current_stock": line["qty"],
+                    "product_id": line["product_id"],
+                    "actual_price": line["cost"],
+                    "min_selling_price": line["min_price"],
+                    "selling_price": line["sell_price"],
+                    "expire_date": line.get("expire_date") or None,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for line in lines
+            ],
+        ).all()
+
+        session.execute(
+            insert(DB.StockMovement),
+            [
+                {
+                    "stock_id": stock_id,
+                    "movement_type": "in",
+                    "quantity": line["qty"],
+                    "reference_id": grn.id,
+                    "reference_type": "grn",
+                    "created_at": now,
+                }
+                for stock_id, line in zip(stock_ids, lines)
+            ],
+        )
+
+    session.add(DB.ExpenseTracker(
+        description=f"GRN #{grn.id} - {supplier_label}",
+        outcome=Decimal(str(total)),
+        date=now,
+    ))
+
+    if cheque:
+        session.add(DB.Cheque(
+            cheque_number=cheque["cheque_number"],
+            cheque_date=cheque["cheque_date"],
+            supplier_id=supplier_id,
+            grn_id=grn.id,
+            amount=Decimal(str(cheque["amount"])),
+            status='pending',
+        ))
+        session.add(DB.ExpenseTracker(
+            description=f"Cheque #{cheque['cheque_number']} - GRN #{grn.id} - {supplier_label}",
+            outcome=Decimal(str(cheque["amount"])),
+            date=now,
+        ))
+
+    session.add(DB.GRNTransaction(
+        amount=Decimal(str(total)),
+        grn_id=grn.id,
+        account_id=account_id,
+        transaction_type="payment",
+        cheque_number=cheque_number,
+        card_transaction_id=card_transaction_id,
+        date=now,
+    ))
+
+    if credit and supplier_id:
+        session.execute(
+            update(DB.Supplier)
+            .where(DB.Supplier.id == supplier_id)
+            .values(credit=DB.Supplier.credit + Decimal(str(credit)))
+        )
+
+    # rollups last, stock levels before the day row, the order post_invoice takes them in
+    metrics.record_stock_in(session, [(line["product_id"], line["qty"]) for line in lines])
+    metrics.record_day(
+        session, now.date(),
+        expense=Decimal(str(total)) - Decimal(str(credit or 0)),
+        cash_out=Decimal(str(total)),
+        grn_count=1,
+    )
+
+    session.flush()
+    return grn.id
+
+
+def post_invoice(session, *, user_id, account_id, customer_id, lines, total, discount=0, tax=0, paid=0,
+                 new_customer=None, customer_label="", cheque=None, cheque_number=None, now=None):
+    """
+    Write a complete sale as one unit of work and return the invoice id.
+
+    Args:
+        session: SQLAlchemy session; the caller commits or rolls back.
+        user_id (int): Cashier posting the invoice.
+        account_id (int): Account the payment is booked against.
+        customer_id (int): Existing customer, or None for a walk-in / `new_customer`.
+        lines (list): Batch lines for post_invoice_lines() (stock_id, qty, unit_price, max_price).
+        total: Amount due, after discount and tax.
+        discount: Discount given on the bill.
+        tax: Tax included in `total`.
+        paid: Cash / card paid now.
+        new_customer (dict): name / mobile of a customer to create first.
+        customer_label (str): Name used in the income descriptions.
+        cheque (dict): cheque_number, cheque_date and amount when part is paid by cheque.
+        cheque_number (str): Cheque number recorded on the payment transaction.
+        now (datetime): Invoice timestamp.
+
+    Whatever `paid` plus the cheque leaves unpaid is added to the customer's
+    credit and the invoice stays 'pending'.
+
+    Raises:
+        OutOfStock: From post_invoice_lines(); nothing should be committed.
+    """
+    now = now or datetime.now()
+    total = Decimal(str(total))
+    paid = Decimal(str(paid or 0))
+    balance = paid + (Decimal(str(cheque["amount"])) if cheque else 0) - total
+
+    if new_customer:
+        customer = DB.Customer(**new_customer)
+        session.add(customer)
+        session.flush()
+        customer_id = customer.id
+
+    inv = DB.Invoice(
+        created_on=now,
+        total=total,
+        discount_amount=Decimal(str(discount or 0)),
+        tax_amount=Decimal(str(tax or 0)),
+        paid_amount=paid,
+        status='paid' if balance >= Decimal("-0.01") else 'pending',
+        customer_id=customer_id,
+        user_id=user_id,
+    )
+    session.add(inv)
+    session.flush()
+
+    if paid > 0:
+        session.add(DB.InvoiceTransaction(
+            amount=paid,
+            date=now,
+            invoice_id=inv.id,
+            account_id=account_id,
+            transaction_type='payment',
+            cheque_number=cheque_number,
+        ))
+        session.add(DB.ExpenseTracker(
+            description=f"Invoice #{inv.id} - {customer_label}",
+            income=paid,
+            outcome=Decimal(0),
+            date=now,
+        ))
+
+    post_invoice_lines(session, inv.id, lines, now=now)
+
+    if cheque:
+        session.add(DB.Cheque(
+            cheque_number=cheque["cheque_number"],
+            cheque_date=cheque["cheque_date"],
+            customer_id=customer_id,
+            invoice_id=inv.id,
+            amount=Decimal(str(cheque["amount"])),
+            status='pending',
+        ))
+        session.add(DB.ExpenseTracker(
+            description=f"Cheque #{cheque['cheque_number']} - Invoice #{inv.id} - {customer_label}",
+            outcome=Decimal(str(cheque["amount"])),
+            income=Decimal(0),
+            date=now,
+        ))
+
+    if balance < Decimal("-0.01") and customer_id:
+        session.execute(
+            update(DB.Customer)
+            .where(DB.Customer.id == customer_id)
+            .values(credit=func.coalesce(DB.Customer.credit, 0) - balance)
+        )
+
+    # rollups last: the stock rows are locked first, in id order, on every path
+    metrics.record_day(session, now.date(), sales=total, income=paid, cash_in=paid, invoice_count=1)
+
+    session.flush()
+    return inv.id
+
+
+def post_customer_payment(session, *, customer_id, account_id, cash=0, cheque=None, now=None):
+    """
+    Book money a customer brings in against their credit and return what was
+    applied to invoices: [(invoice_id, amount)].
+
+    Cash is applied first, then the cheque, to the customer's pending
+    invoices oldest first; each invoice that gets money gets a payment
+    transaction, and fully covered invoices are marked 'paid'. The rollups
+    (metrics.py) get the money as cash in today and as income on each
+    invoice's own day, the way metrics.rebuild() counts it.
+
+    Args:
+        session: SQLAlchemy session; the caller commits or rolls back.
+        customer_id (int): Paying customer.
+        account_id (int): Account the payments are booked against.
+        cash: Cash paid.
+        cheque (dict): cheque_number, cheque_date and amount for a cheque payment.
+        now (datetime): Timestamp for the transactions.
+    """
+    now = now or datetime.now()
+    cash = Decimal(str(cash or 0))
+    cheque_amount = Decimal(str(cheque["amount"])) if cheque else Decimal(0)
+
+    customer = session.get(DB.Customer, customer_id, with_for_update=True)
+    if customer is None:
+        raise ValueError(f"No customer #{customer_id}")
+    customer.credit = (customer.credit or 0) - cash - cheque_amount
+
+    # lock the pending invoices so two tills can't pay the same balance twice
+    pending = session.execute(
+        select(DB.Invoice)
+        .where(DB.Invoice.customer_id == customer_id, DB.Invoice.status == 'pending')
+        .order_by(DB.Invoice.created_on, DB.Invoice.id)
+        .with_for_update()
+    ).scalars().all()
+
+    applied = []
+    income = {}     # invoice day -> paid against that day's invoices
+    payments = [(cash, None)]
+    if cheque:
+        payments.append((cheque_amount, cheque["cheque_number"]))
+        session.add(DB.Cheque(
+            cheque_number=cheque["cheque_number"],
+            cheque_date=cheque["cheque_date"],
+            customer_id=customer_id,
+            amount=cheque_amount,
+            status='pending',
+        ))
+
+    for amount, number in payments:
+        if amount <= 0:
+            continue
+        session.add(DB.ExpenseTracker(
+            description=f"Cheque deposit - {number} - {customer.name}" if number else f"Money deposit - {customer.name}",
+            income=amount,
+            outcome=Decimal(0),
+            date=now,
+        ))
+        for inv in pending:
+            if amount <= 0:
+                break
+            due = (inv.total or 0) - (inv.paid_amount or 0)
+            if due <= 0:
+                continue
+            part = min(due, amount)
+            inv.paid_amount = (inv.paid_amount or 0) + part
+            if part == due:
+                inv.status = 'paid'
+            amount -= part
+            session.add(DB.InvoiceTransaction(
+                amount=part,
+                date=now,
+                invoice_id=inv.id,
+                account_id=account_id,
+                transaction_type='payment',
+                cheque_number=number,
+            ))
+            applied.append((inv.id, part))
+            income[inv.created_on.date()] = income.get(inv.created_on.date(), Decimal(0)) + part
+
+    # rollups last, each day's row once and in day order
+    for day in sorted(income):
+        metrics.record_day(session, day, income=income[day])
+    metrics.record_day(session, now.date(), cash_in=sum(part for _, part in applied))
+
+    session.flush()
+    return applied
+
+
+def expire_batches(session, product_id, today=None):
+    """
+    Mark `product_id`'s lapsed batches 'Expired' and return how many were.
+
+    What the batches that were still active held comes off the product's
+    stock level (metrics.py), as metrics.rebuild() only counts active batches.
+    """
+    today = today or datetime.now().date()
+    lapsed = session.execute(
+        select(DB.Stock.id, DB.Stock.status, DB.Stock.current_stock)
+        .where(
+            DB.Stock.product_id == product_id,
+            DB.Stock.expire_date < today,
+            or_(DB.Stock.status.is_(None), DB.Stock.status != 'Expired'),
+        )
+        .order_by(DB.Stock.id)
+        .with_for_update()
+    ).all()
+    if not lapsed:
+        return 0
+
+    session.execute(
+        update(DB.Stock)
+        .where(DB.Stock.id.in_([row.id for row in lapsed]))
+        .values(status='Expired')
+    )
+    metrics.record_expired(session, [(product_id, row.current_stock) for row in lapsed if row.status == 'active'])
+    return len(lapsed)
+
+
+def post_invoice_lines(session, invoice_id, lines, now=None):
+    """
+    Book the stock side of an invoice with set-based statements.
+
+    All sold stocks are decremented by a single UPDATE stocks ... FROM (VALUES ...),
+    which also raises stock_out and marks emptied stocks 'out'. The UPDATE only
+    takes a stock that still holds the quantity sold, so a batch another
+    terminal has just sold out raises OutOfStock instead of going negative;
+    the sold stocks are row-locked in id order first so two checkouts that
+    share batches can't deadlock. Stock movements
+    and invoice items are then written with one executemany each, so the number
+    of statements does not grow with the number of lines. Sold quantities are
+    added to the dashboard rollups (metrics.py).
+
+    Args:
+        session: SQLAlchemy session; the caller commits or rolls back.
+        invoice_id (int): Invoice the lines belong to.
+        lines (list): Dicts with stock_id, qty, unit_price and max_price
+            (allocation.allocate_lines() makes these from product quantities).
+        now (datetime): Timestamp for the stock and movement rows.
+
+    Raises:
+        OutOfStock: A stock holds less than is sold from it; the caller rolls back.
+    """
+    if not lines:
+        return
+    now = now or datetime.now()
+
+    sold = {}
+    for line in lines:
+        sold[line["stock_id"]] = sold.get(line["stock_id"], Decimal(0)) + Decimal(str(line["qty"]))
+
+    sold_values = values(
+        column("stock_id", Integer),
+        column("qty", Numeric(10, 2)),
+        name="sold",
+    ).data(list(sold.items()))
+
+    session.execute(
+        select(DB.Stock.id)
+        .where(DB.Stock.id.in_(list(sold)))
+        .order_by(DB.Stock.id)
+        .with_for_update()
+    )
+
+    remaining = func.coalesce(DB.Stock.current_stock, 0) - sold_values.c.qty
+    products = session.execute(
+        update(DB.Stock)
+        .where(DB.Stock.id == sold_values.c.stock_id, remaining >= 0)
+        .values(
+            stock_out=func.coalesce(DB.Stock.stock_out, 0) + sold_values.c.qty,
+            current_stock=remaining,
+            status=case((remaining <= 0, 'out'), else_=DB.Stock.status),
+            updated_at=now,
+        )
+        .returning(DB.Stock.id, DB.Stock.product_id),
+        execution_options={"synchronize_session": False},
+    ).all()
+    product_of = {stock_id: product_id for stock_id, product_id in products}
+    if len(product_of) < len(sold):
+        short = next(stock_id for stock_id in sold if stock_id not in product_of)
+        available = session.scalar(select(DB.Stock.current_stock).where(DB.Stock.id == short))
+        raise OutOfStock(sold[short], available or 0, stock_id=short)
+
+    session.execute(
+        insert(DB.StockMovement),
+        [
+            {
+                "stock_id": line["stock_id"],
+                "movement_type": "out",
+                "quantity": Decimal(str(line["qty"])),
+                "reference_id": invoice_id,
+                "reference_type": "invoice",
+                "created_at": now,
+            }
+            for line in lines
+        ],
+    )
+
+    session.execute(
+        insert(DB.InvoiceHasStock),
+        [
+            {
+                "invoice_id": invoice_id,
+                "stock_id": line["stock_id"],
+                "quantity": Decimal(str(line["qty"])),
+                "unit_price": Decimal(str(line["unit_price"])),
+                "discount_amount": Decimal(str(line["max_price"])) - Decimal(str(line["unit_price"])),
+            }
+            for line in lines
+        ],
+    )
+
+    metrics.record_sales(session, now.date(), [
+        (product_of[line["stock_id"]], line["qty"], Decimal(str(line["qty"])) * Decimal(str(line["unit_price"])))
+        for line in lines
+        if line["stock_id"] in product_of
+    ])
@@ -9,8 +9,7 @@ from reportlab.lib.enums import TA_LEFT, TA_RIGHT, TA_CENTER
 from datetime import datetime
 import os
 from reportlab.lib.utils import ImageReader
-from PIL import Image, ImageDraw
-import io
+import invoice_assets
 import math
 
 
@@ -92,98 +91,16 @@ class ProfessionalInvoiceGenerator:
         return f"${decimal_amount:,.2f}"
 
     def _create_round_logo_placeholder(self, size: float) -> ImageReader:
-        """Create a round logo placeholder with company initials"""
-        # Create a square image
-        img_size = int(size * 2)  # Higher resolution for better quality
-        img = Image.new('RGBA', (img_size, img_size), (255, 255, 255, 0))
-        draw = ImageDraw.Draw(img)
-
-        # Draw circle background
-        primary_color_rgb = (11, 134, 200)  # RGB equivalent of #0B86C8
-        draw.ellipse([0, 0, img_size - 1, img_size - 1], fill=primary_color_rgb + (255,))
-
-        # Add company initials or icon
-        try:
-            # Try to use a font for the initials
-            from PIL import ImageFont
-            font_size = img_size // 3
-            try:
-                font = ImageFont.truetype("arial.ttf", font_size)
-            except:
-                font = ImageFont.load_default()
-        except ImportError:
-            font = None
-
-        # Extract initials from company name
-        company_initials = ''.join([word[0] for word in self.config.COMPANY_NAME.split() if word])[:3]
-
-        # Calculate text position for centering
-        if font:
-            bbox = draw.textbbox((0, 0), company_initials, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-        else:
-            text_width = len(company_initials) * (img_size // 6)
-            text_height = img_size // 4
-
-        x = (img_size - text_width) // 2
-        y = (img_size - text_height) // 2
-
-        # Draw the initials
-        draw.text((x, y), company_initials, fill='white', font=font)
-
-        # Convert PIL image to ImageReader
-        img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
-
-        return ImageReader(img_buffer)
+        """Create a round logo placeholder with company initials (cached per config and size)"""
+        return invoice_assets.round_logo(self.config, size=size)
 
     def _draw_round_logo(self, logo_path: str = None):
         """Draw a round company logo"""
-        c = self.canvas
-        logo_x = self.config.LOGO_POSITION_X
-        logo_y = self.config.LOGO_POSITION_Y
-        logo_size = self.config.LOGO_SIZE
-
-        if logo_path and os.path.exists(logo_path):
-            # Use provided logo image
-            try:
-                # Load and process the image to make it round
-                original_img = Image.open(logo_path)
-                # Convert to RGBA if not already
-                if original_img.mode != 'RGBA':
-                    original_img = original_img.convert('RGBA')
-
-                # Resize to square
-                img_size = int(logo_size * 2)  # Higher resolution
-                original_img = original_img.resize((img_size, img_size), Image.Resampling.LANCZOS)
-
-                # Create circular mask
-                mask = Image.new('L', (img_size, img_size), 0)
-                mask_draw = ImageDraw.Draw(mask)
-                mask_draw.ellipse([0, 0, img_size - 1, img_size - 1], fill=255)
-
-                # Apply mask to make image circular
-                original_img.putalpha(mask)
-
-                # Convert to ImageReader
-                img_buffer = io.BytesIO()
-                original_img.save(img_buffer, format='PNG')
-                img_buffer.seek(0)
-                logo_image = ImageReader(img_buffer)
-
-            except Exception as e:
-                print(f"Error loading logo image: {e}")
-                logo_image = self._create_round_logo_placeholder(logo_size)
-        else:
-            # Use placeholder logo
-            logo_image = self._create_round_logo_placeholder(logo_size)
-
-        # Draw the logo
-        c.drawImage(logo_image, logo_x, logo_y,
-                    width=logo_size, height=logo_size,
-                    mask='auto')
+        # Prepared once per config / logo file and reused for every invoice
+        logo_image = invoice_assets.round_logo(self.config, logo_path)
+        self.canvas.drawImage(logo_image, self.config.LOGO_POSITION_X, self.config.LOGO_POSITION_Y,
+                              width=self.config.LOGO_SIZE, height=self.config.LOGO_SIZE,
+                              mask='auto')
 
     def _start_new_page(self):
         """Start a new page and draw continuation header"""
@@ -1,20 +1,104 @@
 import flet as ft
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta
 import random
-import pandas as pd
-from sqlalchemy import create_engine, func, or_
+from sqlalchemy import create_engine, func, or_, tuple_
 from sqlalchemy.orm import sessionmaker, Session
 import DB # Assuming DB.py contains SQLAlchemy models for Invoice, Customer, User, InvoiceHasStock, Stock, and Product
+from virtual_table import VColumn, VirtualTable
 
 theme_color = ft.Colors.BLUE
 
+SESSION: Session = None
+APP = None
+
+PAGE_SIZE = 20
+
+# Next-page prefetches run here, off the Flet event thread; made on first use,
+# so copies of the module that never page (a prewarmed one) don't hold one
+_PREFETCH = None
+
+
+def _prefetcher():
+    global _PREFETCH
+    if _PREFETCH is None:
+        _PREFETCH = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+    return _PREFETCH
+
+
+def id_name(iid, n):
+    v = str(iid)
+    for i in [10 ** i for i in range(n, 0, -1)]:
+        if int(iid) < i:
+            v = "0" + v
+    return v
+
+
+def status_style(status):
+    status = str(status).lower()
+    if status == "pending":
+        return {"bgcolor": ft.Colors.RED_400, "color": ft.Colors.WHITE, "weight": ft.FontWeight.BOLD}
+    if status == "paid":
+        return {"bgcolor": ft.Colors.GREEN_400, "color": ft.Colors.WHITE, "weight": ft.FontWeight.BOLD}
+    return None
+
+
+def fetch_invoices(session, filters, cursor=None, limit=PAGE_SIZE):
+    """
+    One page of invoices, newest first. `cursor` is the (created_on, id) of
+    the last row already shown; seeking past it with a row comparison on the
+    (created_on, id) index costs the same on page 1 and page 500, unlike
+    OFFSET, which reads and discards every earlier row.
+    """
+    query = session.query(
+        DB.Invoice.id,
+        DB.Invoice.created_on,
+        DB.Invoice.total,
+        DB.Invoice.paid_amount,
+        DB.Invoice.status,
+        DB.Customer.name.label('customer_name'),
+        DB.User.name.label('cashier_name')
+        ).outerjoin(DB.Customer, DB.Customer.id == DB.Invoice.customer_id
+        ).join(DB.User, DB.User.id == DB.Invoice.user_id
+        ).order_by(DB.Invoice.created_on.desc(), DB.Invoice.id.desc())
+
+    # Apply search conditions
+    if filters["query"]:
+        search_term = f"%%{filters['query']}%%"
+        query = query.filter(or_(
+            DB.Customer.name.ilike(search_term),
+            DB.Customer.mobile.ilike(search_term)
+        ))
+
+    # plain ranges on created_on, not func.date(created_on), so the index applies
+    if filters["from"]:
+        query = query.filter(DB.Invoice.created_on >= datetime.combine(filters["from"], time.min))
+    if filters["to"]:
+        query = query.filter(DB.Invoice.created_on < datetime.combine(filters["to"] + timedelta(days=1), time.min))
+
+    if filters["min"] is not None:
+        query = query.filter(DB.Invoice.total >= filters["min"])
+    if filters["max"] is not None:
+        query = query.filter(DB.Invoice.total <= filters["max"])
+
+    if cursor is not None:
+        query = query.filter(tuple_(DB.Invoice.created_on, DB.Invoice.id) < cursor)
+
+    return query.limit(limit).all()
+
+
+def _fetch_in_background(filters, cursor):
+    # the screen's session isn't thread-safe, so the prefetch takes its own
+    with DB.SessionLocal() as session:
+        return fetch_invoices(session, filters, cursor)
+
 
 class RecentTransaction:
     def __init__(self, page: ft.Page, conn, user_id):
         self.invoice_quarry = None
         self.page = page
         self.conn = conn
-        self.session = Session(conn)
+        self.session = SESSION
         self.user_id = user_id
 
         self.header = ft.Column(
@@ -211,148 +295,41 @@ class RecentTransaction:
             )
         )
 
-        self.bill_table = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("Item", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Qty", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Price", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Total", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-            ],
+        self.bill_table = VirtualTable(
+            [VColumn("Item", expand=3), VColumn("Qty"), VColumn("Price"), VColumn("Total")],
+            header_color=theme_color + "600",
             bgcolor=theme_color + "100",
-            heading_row_color=theme_color + "600",
-            border_radius=ft.BorderRadius(0, 0, 15, 15),
-            heading_row_height=0,
-            expand=True
-        )
-
-        self.dummy_bill_table = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("Item", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Qty", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Price", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Total", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-            ],
-            heading_row_color=theme_color + "600",
-            data_row_max_height=0,
-            data_row_min_height=0,
-            border_radius=8,
-            expand=True
-        )
-
-        self.invoice_table = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("Invoice ID", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Date", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Total", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Paid", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Status", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Customer", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Cashier", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-            ],
-            border=ft.border.all(1, ft.Colors.GREY_200),
-            bgcolor=ft.Colors.WHITE,
-            border_radius=8,
-            heading_row_height=0,
-            expand=True
         )
 
-        self.dummy_invoice_table = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("Invoice ID", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE),
-                              heading_row_alignment=ft.MainAxisAlignment.CENTER),
-                ft.DataColumn(ft.Text("Date", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE),
-                              heading_row_alignment=ft.MainAxisAlignment.CENTER),
-                ft.DataColumn(ft.Text("Total", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE),
-                              heading_row_alignment=ft.MainAxisAlignment.CENTER),
-                ft.DataColumn(ft.Text("Paid", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE),
-                              heading_row_alignment=ft.MainAxisAlignment.CENTER),
-                ft.DataColumn(ft.Text("Status", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE),
-                              heading_row_alignment=ft.MainAxisAlignment.CENTER),
-                ft.DataColumn(ft.Text("Customer", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE),
-                              heading_row_alignment=ft.MainAxisAlignment.CENTER),
-                ft.DataColumn(ft.Text("Cashier", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE),
-                              heading_row_alignment=ft.MainAxisAlignment.CENTER),
+        self.invoice_table = VirtualTable(
+            [
+                VColumn("Invoice ID", expand=2, format=lambda iid: f"INV-{id_name(iid, 8)}"),
+                VColumn("Date", expand=2),
+                VColumn("Total"),
+                VColumn("Paid"),
+                VColumn("Status", style=status_style),
+                VColumn("Customer", expand=2),
+                VColumn("Cashier"),
             ],
-            heading_row_color=theme_color + "600",
-            data_row_max_height=0,
-            data_row_min_height=0,
-            border_radius=8,
-            expand=True
+            header_color=theme_color + "600",
+            select_color=theme_color + "50",
+            on_select=self.show_invoice,
+            on_end_reached=self.load_more,
         )
 
         self.reload_btn = ft.IconButton(
             icon=ft.Icons.REFRESH,
             expand=True,
-            on_click=self.filter_invoice
-        )
-
-        ft.Container(
-            ft.Row(
-                [
-                    ft.Container(
-                        ft.Column(
-                            [
-                                self.dummy_bill_table,
-                                ft.Column(
-                                    [
-                                        self.bill_table
-                                    ],
-                                    scroll=ft.ScrollMode.AUTO,
-                                    expand=True,
-                                )
-                            ],
-                            spacing=0,
-                            expand=True,
-                        ),
-                        expand=True,
-                    )
-                ],
-                alignment=ft.MainAxisAlignment.START,
-                expand=True
-            ),
-            expand=True,
-            alignment=ft.alignment.top_center
+            on_click=self.load_more
         )
 
         self.invoices_container = ft.Container(
-            content=ft.Row(
+            content=ft.Column(
                 [
-                    ft.Container(
-                        ft.Column(
-                            [
-                                ft.Row(
-                                    [
-                                        self.dummy_invoice_table
-                                    ]
-                                ),
-                                ft.Column(
-                                    [
-                                        ft.Container(
-                                            ft.Row(
-                                                [
-                                                    self.invoice_table,
-                                                ]
-                                            )
-                                        ),
-                                        ft.Container(
-                                            ft.Row(
-                                                [
-                                                    self.reload_btn
-                                                ],
-
-                                            )
-                                        )
-                                    ],
-                                    scroll=ft.ScrollMode.AUTO,
-                                    expand=True
-                                )
-                            ],
-                            spacing=0
-                        ),
-                        expand=True
-                    )
+                    self.invoice_table.control,
+                    ft.Row([self.reload_btn]),
                 ],
-                alignment=ft.MainAxisAlignment.CENTER,
+                spacing=0,
             ),
             alignment=ft.alignment.top_center,
             expand=True,
@@ -381,41 +358,7 @@ class RecentTransaction:
                             spacing=10),
                     ),
                     self.invoice_details,
-                    ft.Container(
-                        content=ft.Row(
-                            [
-                                ft.Container(
-                                    ft.Column(
-                                        [
-                                            ft.Row(
-                                                [
-                                                    self.dummy_bill_table
-                                                ]
-                                            ),
-                                            ft.Column(
-                                                [
-                                                    ft.Container(
-                                                        ft.Row(
-                                                            [
-                                                                self.bill_table
-                                                            ]
-                                                        )
-                                                    )
-                                                ],
-                                                scroll=ft.ScrollMode.AUTO,
-                                                expand=True
-                                            )
-                                        ],
-                                        spacing=0
-                                    ),
-                                    expand=True
-                                )
-                            ],
-                            alignment=ft.MainAxisAlignment.CENTER,
-                        ),
-                        alignment=ft.alignment.top_center,
-                        expand=True,
-                    )
+                    self.bill_table.control,
                 ],
                 alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
             )
@@ -424,224 +367,125 @@ class RecentTransaction:
         # Initialize with initial load
         self.filter_invoice()
 
-    class Invoice:
-        data = []
-        dummy_data = []
-
-        def __init__(self, page, iid, date, total_amount, paid_amount, status, customer_name, cashier_name, bill_table,
-                     dummy_bill_table, bill_details, conn):
-            self.page = page
-            self.id = iid
-            self.date = date
-            self.total_amount = total_amount
-            self.paid_amount = paid_amount
-            self.status = status
-            self.customer_name = customer_name
-            self.cashier_name = cashier_name
-            self.bill_table = bill_table
-            self.dummy_bill_table = dummy_bill_table
-            self.bill_details = bill_details
-            self.session = Session(conn)
-
-            self.bill_data = {
-                "INVOICE ID": f"inv-{self.id_name(8)}",
-                "DATE": str(self.date),
-                "CUSTOMER NAME": str(self.customer_name),
-                "CASHIER NAME": str(self.cashier_name)
-            }
-
-            status_list = ["paid", "pending"]
-
-            self.data.append(ft.DataRow(
-                [
-                    ft.DataCell(
-                        ft.Container(
-                            ft.Text(
-                                str(data),
-                                weight=ft.FontWeight.BOLD if str(data).lower() in status_list else None,
-                                color=ft.Colors.WHITE if str(data).lower() in status_list else ft.Colors.BLACK,
-                            ),
-                            border_radius=15,
-                            padding=2,
-                            width=75 if str(data).lower() in status_list else None,
-                            height=25 if str(data).lower() in status_list else None,
-                            bgcolor=ft.Colors.RED_400 if str(data).lower() == "pending"
-                            else ft.Colors.GREEN_400 if str(data).lower() == "paid"
-                            else ft.Colors.TRANSPARENT,
-                            alignment=ft.Alignment(0, 0)
-                        ),
-                    ) for data in
-                    [f"INV-{self.id_name(8)}", str(self.date), str(self.total_amount), str(self.paid_amount),
-                     str(self.status), str(self.customer_name), str(self.cashier_name)]
-                ],
-                on_select_changed=self.select,
-            ))
-
-            self.dummy_data.append(ft.DataRow(
-                [
-                    ft.DataCell(
-                        ft.Text(str(data)),
-                    ) for data in
-                    [f"INV-{self.id_name(8)}", str(self.date), str(self.total_amount), str(self.paid_amount),
-                     str(self.status),
-                     str(self.customer_name), str(self.cashier_name)]
-                ],
-            ))
-
-        def id_name(self, n):
-            v = str(self.id)
-            for i in [10 ** i for i in range(n, 0, -1)]:
-                if int(self.id) < i:
-                    v = "0" + v
-            return v
-
-        def select(self, e):
-            for row in self.data:
-                row.color = ft.Colors.WHITE
-
-            e.control.color = theme_color + "50"
-
-            self.bill_details.content = ft.Column(
-                [
-                    ft.Row(
-                        [
-                            ft.Text(
-                                value=title,
-                                weight=ft.FontWeight.BOLD,
-                                color=theme_color
-                            ),
-                            ft.Text(
-                                value=str(value).upper(),
-                                weight=ft.FontWeight.BOLD,
-                                selectable=True
-                            )
-                        ],
-                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
-                    ) for title, value in self.bill_data.items()
-
-                ],
-                expand=True,
-            )
-
-            # Use SQLAlchemy ORM to get invoice items
-            invoice_items = (self.session.query(DB.Product.title, DB.InvoiceHasStock.quantity, DB.InvoiceHasStock.unit_price)
-                             .join(DB.Stock, DB.InvoiceHasStock.stock_id == DB.Stock.id)
-                             .join(DB.Product, DB.Stock.product_id == DB.Product.id)
-                             .filter(DB.InvoiceHasStock.invoice_id == self.id)
-                             .all())
-
-            self.bill_table.rows = [
-                ft.DataRow(
-                    [
-                        ft.DataCell(
-                            ft.Text(item.title),
-                        ),
-                        ft.DataCell(
-                            ft.Text(str(item.quantity)),
-                        ),
-                        ft.DataCell(
-                            ft.Text(str(item.unit_price)),
-                        ),
-                        ft.DataCell(
-                            ft.Text(str(round(item.quantity * item.unit_price, 2))),
-                        )
-                    ]
-                ) for item in invoice_items
-            ]
+    def show_invoice(self, index, invoice):
+        iid, date, total_amount, paid_amount, status, customer_name, cashier_name = invoice
+        bill_data = {
+            "INVOICE ID": f"inv-{id_name(iid, 8)}",
+            "DATE": str(date),
+            "CUSTOMER NAME": str(customer_name),
+            "CASHIER NAME": str(cashier_name)
+        }
 
-            self.dummy_bill_table.rows = [
-                ft.DataRow(
+        self.invoice_details.content = ft.Column(
+            [
+                ft.Row(
                     [
-                        ft.DataCell(
-                            ft.Text(item.title),
+                        ft.Text(
+                            value=title,
+                            weight=ft.FontWeight.BOLD,
+                            color=theme_color
                         ),
-                        ft.DataCell(
-                            ft.Text(str(item.quantity)),
-                        ),
-                        ft.DataCell(
-                            ft.Text(str(item.unit_price)),
-                        ),
-                        ft.DataCell(
-                            ft.Text(str(round(item.quantity * item.unit_price, 2))),
+                        ft.Text(
+                            value=str(value).upper(),
+                            weight=ft.FontWeight.BOLD,
+                            selectable=True
                         )
-                    ]
-                ) for item in invoice_items
-            ]
-            self.page.update()
+                    ],
+                    alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                ) for title, value in bill_data.items()
 
-    def filter_invoice(self, e=None):
-        try:
-            self.invoice_quarry = self.search_bar.value.lower() if self.search_bar.value else ""
-            self.Invoice.data = []
-            self.Invoice.dummy_data = []
-            self.reload_btn.disabled = False
-            self.reload_btn.height = 40
-        except Exception:
-            pass
+            ],
+            expand=True,
+        )
 
-        temp = len(self.Invoice.data)
-
-        query = self.session.query(
-            DB.Invoice.id,
-            DB.Invoice.created_on,
-            DB.Invoice.total,
-            DB.Invoice.paid_amount,
-            DB.Invoice.status,
-            DB.Customer.name.label('customer_name'),
-            DB.User.name.label('cashier_name')
-            ).outerjoin(DB.Customer, DB.Customer.id == DB.Invoice.customer_id
-            ).join(DB.User, DB.User.id == DB.Invoice.user_id
-            ).order_by(DB.Invoice.created_on.desc())
-
-        # Apply search conditions
-        if self.invoice_quarry:
-            search_term = f"%%{self.invoice_quarry}%%"
-            query = query.filter(or_(
-                DB.Customer.name.ilike(search_term),
-                DB.Customer.mobile.ilike(search_term)
-            ))
+        # Use SQLAlchemy ORM to get invoice items
+        invoice_items = (self.session.query(DB.Product.title, DB.InvoiceHasStock.quantity, DB.InvoiceHasStock.unit_price)
+                         .join(DB.Stock, DB.InvoiceHasStock.stock_id == DB.Stock.id)
+                         .join(DB.Product, DB.Stock.product_id == DB.Product.id)
+                         .filter(DB.InvoiceHasStock.invoice_id == iid)
+                         .all())
+        DB.release(self.session)
+
+        self.bill_table.set_rows(
+            (item.title, item.quantity, item.unit_price, round(item.quantity * item.unit_price, 2))
+            for item in invoice_items
+        )
+        self.page.update()
 
+    def _read_filters(self):
+        """Snapshot of the search fields, taken once per search so later pages match the first."""
+        filters = {
+            "query": self.search_bar.value.lower() if self.search_bar.value else "",
+            "from": None, "to": None, "min": None, "max": None,
+        }
         if self.from_date.value:
-            from_date = datetime.strptime(self.from_date.value, '%Y-%m-%d').date()
-            query = query.filter(func.date(DB.Invoice.created_on) >= from_date)
-
+            filters["from"] = datetime.strptime(self.from_date.value, '%Y-%m-%d').date()
         if self.to_date.value:
-            to_date = datetime.strptime(self.to_date.value, '%Y-%m-%d').date()
-            query = query.filter(func.date(DB.Invoice.created_on) <= to_date)
-
+            filters["to"] = datetime.strptime(self.to_date.value, '%Y-%m-%d').date()
         try:
             if self.price_min.value:
-                query = query.filter(DB.Invoice.total >= float(self.price_min.value))
+                filters["min"] = float(self.price_min.value)
             if self.price_max.value:
-                query = query.filter(DB.Invoice.total <= float(self.price_max.value))
+                filters["max"] = float(self.price_max.value)
         except ValueError:
             # Handle invalid number input gracefully
             pass
+        return filters
+
+    def filter_invoice(self, e=None, session=None):
+        """Start a new search: forget the cursor and load the first page."""
+        self.invoice_table.clear()
+        self.reload_btn.disabled = False
+        self.reload_btn.height = 40
+
+        self._filters = self._read_filters()
+        self.invoice_quarry = self._filters["query"]
+        self._cursor = None
+        self._exhausted = False
+        self._prefetch = None
+        self._generation = getattr(self, "_generation", 0) + 1
+        self.load_more(session=session)
+
+    def load_more(self, e=None, session=None):
+        """
+        Append the page after the cursor, using the prefetched one when it is
+        ready. `session` reads instead of the screen's own (see refresh()).
+        """
+        if self._exhausted:
+            return
+        key = (self._generation, self._cursor)
+        prefetch, self._prefetch = self._prefetch, None
+        invoices = None
+        if prefetch is not None and prefetch[0] == key:
+            try:
+                invoices = prefetch[1].result()
+            except Exception as ex:
+                print(f"Error prefetching invoices: {ex}")
+        if invoices is None and session is not None:
+            invoices = fetch_invoices(session, self._filters, self._cursor)
+        elif invoices is None:
+            invoices = fetch_invoices(self.session, self._filters, self._cursor)
+            DB.release(self.session)
+
+        # rows are plain tuples; the table only builds controls for the visible ones
+        self.invoice_table.extend(
+            (invoice.id, invoice.created_on, invoice.total, invoice.paid_amount,
+             invoice.status, invoice.customer_name, invoice.cashier_name)
+            for invoice in invoices
+        )
 
-        invoices = query.order_by(DB.Invoice.id.desc()).limit(20).offset(len(self.Invoice.data)).all()
-
-        for invoice in invoices:
-            self.Invoice(
-                self.page,
-                invoice.id,
-                invoice.created_on,
-                invoice.total,
-                invoice.paid_amount,
-                invoice.status,
-                invoice.customer_name,
-                invoice.cashier_name,
-                self.bill_table,
-                self.dummy_bill_table,
-                self.invoice_details,
-                self.conn
-            )
-
-        self.invoice_table.rows = self.Invoice.data
-        self.dummy_invoice_table.rows = self.Invoice.dummy_data
-
-        if temp == len(self.Invoice.data):
+        if len(invoices) < PAGE_SIZE:
+            self._exhausted = True
             self.reload_btn.disabled = True
             self.reload_btn.height = 0
+        else:
+            # fetch the next page while the user reads this one
+            last = invoices[-1]
+            self._cursor = (last.created_on, last.id)
+            self._prefetch = (
+                (self._generation, self._cursor),
+                _prefetcher().submit(_fetch_in_background, self._filters, self._cursor),
+            )
 
         self.page.update()
 
@@ -698,6 +542,25 @@ class RecentTransaction:
 
 
 def recentTransaction(page: ft.Page, session, user_id):
+    global SESSION, APP
+    SESSION = DB.new_session(SESSION)
     app = RecentTransaction(page, session, user_id)
     app.filter_invoice()
+    APP = app
     return app.build()
+
+
+def refresh():
+    """
+    Screen cache hook: invoices changed, so re-run the current search. Runs on
+    the events thread, so it reads through its own short-lived session.
+    """
+    if APP:
+        with DB.SessionLocal() as session:
+            APP.filter_invoice(session=session)
+
+
+def close():
+    """The page is gone (app_context.py): stop the prefetch worker."""
+    if _PREFETCH is not None:
+        _PREFETCH.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,37 @@
+# rows.py
+# Lightweight result handling for the screens, in place of pandas
+# round-trips (pd.read_sql(...).to_dict("records")). Rows come back as
+# named tuples built once per column set, or as plain dicts for code that
+# indexes by column name.
+
+from collections import namedtuple
+from functools import lru_cache
+
+
+@lru_cache(maxsize=256)
+def record_type(fields):
+    """A named tuple class for this tuple of column names (cached)."""
+    return namedtuple("Record", fields, rename=True)
+
+
+def _records(result):
+    Record = record_type(tuple(result.keys()))
+    return (Record._make(row) for row in result)
+
+
+def fetch_all(executor, stmt, params=None):
+    """Every row of `stmt` as a list of records."""
+    return list(_records(executor.execute(stmt, params or {})))
+
+
+def fetch_one(executor, stmt, params=None):
+    """The first row of `stmt` as a record, or None."""
+    result = executor.execute(stmt, params or {})
+    row = result.first()
+    return record_type(tuple(result.keys()))._make(row) if row is not None else None
+
+
+def as_dicts(executor, stmt, params=None):
+    """Every row of `stmt` as a {column: value} dict."""
+    return [dict(m) for m in executor.execute(stmt, params or {}).mappings()]
+
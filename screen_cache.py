@@ -0,0 +1,87 @@
+# screen_cache.py
+# Keeps built screens alive so switching sidebar items doesn't rebuild the
+# screen and re-run all of its queries. A bounded LRU holds the most
+# recently shown screens; table-change events (events.py) mark the screens
+# that read those tables stale. A stale screen is refreshed in place
+# through its module's refresh() hook if it has one (right away when it is
+# on screen), or dropped and rebuilt the next time it is opened.
+#
+# invalidate() runs on the events dispatcher thread, so a refresh() hook
+# may run while the page's own handlers are using the screen's session. The
+# hooks therefore read through their own short-lived DB.SessionLocal()
+# session, never the screen's SESSION.
+
+import sys
+import threading
+from collections import OrderedDict
+
+
+class ScreenCache:
+    """
+    LRU of built screen controls, keyed by nav index.
+
+    `build(index)` makes a screen; `module(index)` is the module its
+    refresh() hook lives in (by default the imported one); `on_refreshed()`
+    is called after a visible screen was refreshed by an event (main.py
+    updates the page).
+    """
+
+    def __init__(self, registry, build, capacity=4, on_refreshed=None, module=None):
+        self.registry = registry
+        self.build = build
+        self.module = module or (lambda index: sys.modules.get(registry[index].module))
+        self.capacity = capacity
+        self.on_refreshed = on_refreshed
+        self.current = None
+        self._entries = OrderedDict()   # index -> [control, stale]
+        self._lock = threading.RLock()
+
+    def get(self, index):
+        """The control for nav item `index`: cached, refreshed, or freshly built."""
+        with self._lock:
+            self.current = index
+            entry = self._entries.get(index)
+            if entry is not None:
+                self._entries.move_to_end(index)
+                if not entry[1] or self._refresh(index, entry):
+                    return entry[0]
+                del self._entries[index]
+
+            control = self.build(index)
+            self._entries[index] = [control, False]
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            return control
+
+    def drop(self, index=None):
+        """Forget one screen, or all of them."""
+        with self._lock:
+            if index is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(index, None)
+
+    def invalidate(self, tables):
+        """Event handler: mark screens reading any of `tables` stale."""
+        refreshed = False
+        with self._lock:
+            for index, entry in list(self._entries.items()):
+                if not tables & set(self.registry[index].tables):
+                    continue
+                entry[1] = True
+                if index == self.current:
+                    refreshed = self._refresh(index, entry)
+        if refreshed and self.on_refreshed:
+            self.on_refreshed()
+
+    def _refresh(self, index, entry):
+        refresh = getattr(self.module(index), "refresh", None)
+        if refresh is None:
+            return False
+        try:
+            refresh()
+        except Exception as e:
+            print(f"Error refreshing {self.registry[index].label}: {e}")
+            return False
+        entry[1] = False
+        return True
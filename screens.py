@@ -0,0 +1,92 @@
+# screens.py
+# Lazy navigation registry. The sidebar only needs each screen's icon and
+# label, so the screen modules (and what they pull in: reportlab, PIL,
+# google.genai, module-level Flet controls) are imported the first time
+# their nav item is opened instead of before the window appears.
+#
+# These are the process-wide imports; each page shows screens from its own
+# private copy of the module (app_context.py), so screen state isn't shared.
+# AppContext.prewarm() loads a page's copies, and with them these imports,
+# in the background once the first screen is shown.
+
+import importlib
+import threading
+
+from flet import Icons
+
+
+class Screen:
+    """
+    A nav entry: icon, label, where its builder function lives, and the
+    tables it reads, so the screen cache knows when its data is stale.
+    """
+
+    __slots__ = ("icon", "label", "module", "function", "tables")
+
+    def __init__(self, icon, label, module, function, tables=()):
+        self.icon = icon
+        self.label = label
+        self.module = module
+        self.function = function
+        self.tables = tables
+
+
+SCREENS = [
+    Screen(Icons.DASHBOARD, "Dashboard", "dashboardUI", "dashboard",
+           tables=("invoices", "grn", "stocks", "suppliers", "expenseTracker")),
+    # the billing grid is kept live per card by change_feed.py, not by the cache
+    Screen(Icons.RECEIPT, "Billing", "billingUI", "bill"),
+    Screen(Icons.HISTORY, "Recent Transactions", "recentTransactionUI", "recentTransaction",
+           tables=("invoices", "customers")),
+    Screen(Icons.PEOPLE, "Customer Details", "customersDetailsUI", "customerDetails",
+           tables=("customers", "invoices")),
+    Screen(Icons.INVENTORY, "Add Stock", "grnUI", "grn"),
+    Screen(Icons.ADD_SHOPPING_CART, "Add Product", "addProductUI", "addProduct"),
+    Screen(Icons.BUSINESS, "Supplier Details", "supplierDetailsUI", "supplierDetails",
+           tables=("suppliers", "grn")),
+    Screen(Icons.CURRENCY_EXCHANGE, "Report", "accountsUI", "accounts",
+           tables=("expenseTracker", "invoices", "invoice_has_stock")),
+    Screen(Icons.PAYMENTS, "Cheque", "chequeManagementUI", "chequeManagement",
+           tables=("cheques",)),
+    Screen(Icons.SETTINGS, "Settings", "settingsUI", "settings"),
+]
+
+
+class ScreenRegistry:
+    """Imports a screen's module on first use and remembers it."""
+
+    def __init__(self, screens):
+        self.screens = screens
+        self._modules = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.screens)
+
+    def __iter__(self):
+        return iter(self.screens)
+
+    def __getitem__(self, index):
+        return self.screens[index]
+
+    def module(self, index):
+        """The module of nav item `index`, importing it if needed."""
+        screen = self.screens[index]
+        # the lock keeps a click and the prewarm thread from importing the
+        # same module twice at once
+        with self._lock:
+            module = self._modules.get(screen.module)
+            if module is None:
+                module = importlib.import_module(screen.module)
+                self._modules[screen.module] = module
+        return module
+
+    def builder(self, index):
+        """The screen function for nav item `index`, importing its module if needed."""
+        return getattr(self.module(index), self.screens[index].function)
+
+    def loaded(self, index):
+        return self.screens[index].module in self._modules
+
+
+REGISTRY = ScreenRegistry(SCREENS)
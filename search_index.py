@@ -0,0 +1,210 @@
+# search_index.py
+# Process-local product search index for the billing search bar.
+# Built once from the products table and kept current by the screens that
+# add or edit products (and, for other terminals' edits, by change_feed.py),
+# so a keystroke never has to scan `products` in SQL.
+
+import threading
+from bisect import bisect_left, insort
+
+import DB
+
+
+def _trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ProductSearchIndex:
+    """
+    In-memory index over product code, barcode, id, title and note.
+
+    search() ranks results the way a cashier expects:
+        1. exact code / barcode / id match
+        2. title starts with the query
+        3. query appears anywhere in code, id, title or note
+    Within each tier products keep the grid's id order.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}       # id -> (exact keys, title, haystack fields)
+        self._exact = {}      # code / barcode / id -> set of ids
+        self._barcodes = {}   # full barcode -> id, for the scanner fast path
+        self._grams = {}      # trigram -> set of ids
+        self._titles = []     # sorted (title, id) pairs for prefix lookups
+        self._ids = []        # sorted ids
+        self.ready = False
+
+    def build(self, session):
+        """(Re)build the whole index from the products table."""
+        rows = session.query(
+            DB.Product.id, DB.Product.code, DB.Product.barcode, DB.Product.title, DB.Product.note
+        ).all()
+
+        with self._lock:
+            self._docs = {}
+            self._exact = {}
+            self._barcodes = {}
+            self._grams = {}
+            self._titles = []
+            self._ids = []
+            for r in rows:
+                self._add(r.id, r.code, r.barcode, r.title, r.note)
+            self._titles.sort()
+            self._ids.sort()
+            self.ready = True
+
+    def ensure_built(self, session):
+        if not self.ready:
+            self.build(session)
+
+    def upsert(self, product_id, code, barcode, title, note):
+        """Add a new product or refresh an edited one."""
+        with self._lock:
+            self._remove(product_id)
+            self._add(product_id, code, barcode, title, note, keep_sorted=True)
+
+    def upsert_product(self, product):
+        self.upsert(product.id, product.code, product.barcode, product.title, product.note)
+
+    def sync(self, product_ids):
+        """Re-read `product_ids` from the database after they changed elsewhere."""
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+        with DB.SessionLocal() as session:
+            rows = session.query(
+                DB.Product.id, DB.Product.code, DB.Product.barcode, DB.Product.title, DB.Product.note
+            ).filter(DB.Product.id.in_(product_ids)).all()
+
+        with self._lock:
+            for r in rows:
+                self._remove(r.id)
+                self._add(r.id, r.code, r.barcode, r.title, r.note, keep_sorted=True)
+            for product_id in product_ids - {r.id for r in rows}:
+                self._remove(product_id)
+
+    def on_changes(self, changes):
+        """change_feed handler for the products table."""
+        if changes is None:
+            with DB.SessionLocal() as session:
+                self.build(session)
+        else:
+            self.sync(c.id for c in changes)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def by_barcode(self, barcode):
+        """Resolve a full scanned barcode to a product id, or None."""
+        return self._barcodes.get((barcode or "").strip().lower())
+
+    def search(self, query, limit=18):
+        """Return up to `limit` product ids ranked for `query`."""
+        q = (query or "").strip().lower()
+
+        with self._lock:
+            if not q:
+                return self._ids[:limit]
+
+            results = []
+            seen = set()
+
+            def take(ids):
+                for i in ids:
+                    if i not in seen:
+                        seen.add(i)
+                        results.append(i)
+                        if len(results) == limit:
+                            return True
+                return False
+
+            # 1. exact code / barcode / id
+            if take(sorted(self._exact.get(q, ()))):
+                return results
+
+            # 2. title prefix
+            prefixed = []
+            pos = bisect_left(self._titles, (q,))
+            while pos < len(self._titles) and self._titles[pos][0].startswith(q):
+                prefixed.append(self._titles[pos][1])
+                pos += 1
+            if take(sorted(prefixed)):
+                return results
+
+            # 3. substring anywhere, narrowed by trigrams when the query is long enough
+            if len(q) >= 3:
+                postings = sorted((self._grams.get(g, set()) for g in _trigrams(q)), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+                candidates = sorted(candidates)
+            else:
+                candidates = self._ids
+
+            for i in candidates:
+                if i in seen:
+                    continue
+                if any(q in field for field in self._docs[i][2]):
+                    seen.add(i)
+                    results.append(i)
+                    if len(results) == limit:
+                        break
+
+            return results
+
+    def _add(self, product_id, code, barcode, title, note, keep_sorted=False):
+        code = (code or "").lower()
+        barcode = (barcode or "").lower()
+        title = (title or "").lower()
+        note = (note or "").lower()
+
+        exact = {k for k in (code, barcode, str(product_id)) if k}
+        fields = (code, str(product_id), title, note)
+        self._docs[product_id] = (exact, title, fields)
+
+        for k in exact:
+            self._exact.setdefault(k, set()).add(product_id)
+        if barcode:
+            self._barcodes[barcode] = product_id
+        for field in fields:
+            for g in _trigrams(field):
+                self._grams.setdefault(g, set()).add(product_id)
+
+        if keep_sorted:
+            insort(self._titles, (title, product_id))
+            insort(self._ids, product_id)
+        else:
+            self._titles.append((title, product_id))
+            self._ids.append(product_id)
+
+    def _remove(self, product_id):
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        exact, title, fields = doc
+
+        for k in exact:
+            if self._barcodes.get(k) == product_id:
+                del self._barcodes[k]
+            ids = self._exact.get(k)
+            if ids:
+                ids.discard(product_id)
+                if not ids:
+                    del self._exact[k]
+        for field in fields:
+            for g in _trigrams(field):
+                ids = self._grams.get(g)
+                if ids:
+                    ids.discard(product_id)
+                    if not ids:
+                        del self._grams[g]
+
+        pos = bisect_left(self._titles, (title, product_id))
+        if pos < len(self._titles) and self._titles[pos] == (title, product_id):
+            self._titles.pop(pos)
+        pos = bisect_left(self._ids, product_id)
+        if pos < len(self._ids) and self._ids[pos] == product_id:
+            self._ids.pop(pos)
+
+
+INDEX = ProductSearchIndex()
@@ -1,6 +1,7 @@
 import flet as ft
 from sqlalchemy.orm import Session
 from sqlalchemy import create_engine
+import DB
 from DB import Variables, Category, SubCategory
 
 # Global variables
@@ -16,7 +17,7 @@ def settings(page: ft.Page, conn, user_id: int):
     PAGE = page
     CONN = conn
     USER_ID = user_id
-    SESSION = Session(CONN)
+    SESSION = DB.new_session(SESSION)
 
     # Load existing settings
     settings_data = load_settings()
@@ -117,6 +118,7 @@ def settings(page: ft.Page, conn, user_id: int):
     def update_ui():
         update_categories_list()
         update_subcategory_list()
+        DB.release(SESSION)
         page.update()
 
     def update_categories_list():
@@ -0,0 +1,242 @@
+# summaries.py
+# Summary tables for the reports: sales per day and product (with category,
+# revenue, cost and margin) and income / outcome per day from the expense
+# tracker. A background scheduler folds new raw rows into the summaries past
+# a per-table watermark (and metrics.fold()s the dashboard's daily deltas),
+# and rebuild() recomputes everything from scratch.
+#
+# Readers add the raw rows past the watermark ("tail") to the summary rows,
+# so reports are exact even between refreshes while only ever scanning a few
+# minutes of raw data.
+#
+#   python summaries.py    # rebuild every summary from the raw tables
+
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+
+import DB
+import metrics
+
+SUMMARY_TABLES = [DB.SalesSummary.__table__, DB.LedgerSummary.__table__, DB.SummaryState.__table__]
+
+# Rows younger than this are left to the tail, so a transaction that is
+# still open when a refresh runs can't commit an id below the watermark.
+SETTLE_TIME = timedelta(minutes=5)
+
+_SALES_ROWS = """
+    SELECT ihs.id, i.created_on::date AS day, s.product_id, sc.category_id,
+           ihs.quantity, ihs.quantity * ihs.unit_price AS revenue,
+           ihs.quantity * s.actual_price AS cost
+      FROM invoice_has_stock ihs
+      JOIN invoices i ON i.id = ihs.invoice_id
+      JOIN stocks s ON s.id = ihs.stock_id
+      JOIN products p ON p.id = s.product_id
+      LEFT JOIN subcategory sc ON sc.id = p.sub_category_id
+"""
+
+_LEDGER_ROWS = """
+    SELECT id, date::date AS day, COALESCE(income, 0) AS income, COALESCE(outcome, 0) AS outcome
+      FROM "expenseTracker"
+"""
+
+
+def _watermark(session, name):
+    state = session.get(DB.SummaryState, name, with_for_update=True)
+    if state is None:
+        state = DB.SummaryState(name=name, last_id=0)
+        session.add(state)
+        session.flush()
+    return state
+
+
+def _refresh_sales(session, settled_before):
+    state = _watermark(session, "sales")
+    upto = session.execute(text(f"""
+        SELECT MAX(b.id) FROM ({_SALES_ROWS}
+         WHERE ihs.id > :after AND i.created_on < :settled) b
+    """), {"after": state.last_id, "settled": settled_before}).scalar()
+    if upto is None:
+        return 0
+
+    session.execute(text(f"""
+        INSERT INTO sales_summary (day, product_id, category_id, quantity, revenue, cost)
+        SELECT day, product_id, MAX(category_id), SUM(quantity), SUM(revenue), SUM(cost)
+          FROM ({_SALES_ROWS} WHERE ihs.id > :after AND ihs.id <= :upto) b
+         GROUP BY day, product_id
+        ON CONFLICT (day, product_id) DO UPDATE SET
+            quantity = sales_summary.quantity + EXCLUDED.quantity,
+            revenue = sales_summary.revenue + EXCLUDED.revenue,
+            cost = sales_summary.cost + EXCLUDED.cost
+    """), {"after": state.last_id, "upto": upto})
+
+    folded = upto - state.last_id
+    state.last_id = upto
+    state.refreshed_at = datetime.now()
+    return folded
+
+
+def _refresh_ledger(session, settled_before):
+    state = _watermark(session, "ledger")
+    upto = session.execute(text(f"""
+        SELECT MAX(id) FROM ({_LEDGER_ROWS} WHERE id > :after AND date < :settled) b
+    """), {"after": state.last_id, "settled": settled_before}).scalar()
+    if upto is None:
+        return 0
+
+    session.execute(text(f"""
+        INSERT INTO ledger_summary (day, income, outcome)
+        SELECT day, SUM(income), SUM(outcome)
+          FROM ({_LEDGER_ROWS} WHERE id > :after AND id <= :upto) b
+         WHERE day IS NOT NULL
+         GROUP BY day
+        ON CONFLICT (day) DO UPDATE SET
+            income = ledger_summary.income + EXCLUDED.income,
+            outcome = ledger_summary.outcome + EXCLUDED.outcome
+    """), {"after": state.last_id, "upto": upto})
+
+    folded = upto - state.last_id
+    state.last_id = upto
+    state.refreshed_at = datetime.now()
+    return folded
+
+
+def refresh(session, now=None):
+    """
+    Fold settled raw rows past the watermarks into the summaries; the caller
+    commits. Returns how far the watermarks moved (0 when nothing was new).
+    """
+    settled_before = (now or datetime.now()) - SETTLE_TIME
+    return _refresh_sales(session, settled_before) + _refresh_ledger(session, settled_before)
+
+
+def rebuild(session):
+    """Recompute every summary from the raw tables; the caller commits."""
+    session.execute(text("DELETE FROM sales_summary"))
+    session.execute(text("DELETE FROM ledger_summary"))
+    session.execute(text("DELETE FROM summary_state"))
+    session.flush()
+    refresh(session)
+
+
+# ---- read side ----
+
+def _last_id(session, name):
+    return session.execute(
+        select(DB.SummaryState.last_id).where(DB.SummaryState.name == name)
+    ).scalar() or 0
+
+
+def ledger_totals(session, start, end):
+    """Income and outcome between start (inclusive) and end (exclusive)."""
+    summary = session.execute(
+        select(func.coalesce(func.sum(DB.LedgerSummary.income), 0),
+               func.coalesce(func.sum(DB.LedgerSummary.outcome), 0))
+        .where(DB.LedgerSummary.day >= start.date(), DB.LedgerSummary.day < end.date())
+    ).one()
+    tail = session.execute(text(f"""
+        SELECT COALESCE(SUM(income), 0), COALESCE(SUM(outcome), 0)
+          FROM ({_LEDGER_ROWS} WHERE id > :after) b
+         WHERE day >= :start AND day < :end
+    """), {"after": _last_id(session, "ledger"), "start": start.date(), "end": end.date()}).one()
+    return summary[0] + tail[0], summary[1] + tail[1]
+
+
+def sales_totals(session, start, end):
+    """Quantity, revenue, cost and margin between start (inclusive) and end (exclusive)."""
+    summary = session.execute(
+        select(func.coalesce(func.sum(DB.SalesSummary.quantity), 0),
+               func.coalesce(func.sum(DB.SalesSummary.revenue), 0),
+               func.coalesce(func.sum(DB.SalesSummary.cost), 0))
+        .where(DB.SalesSummary.day >= start.date(), DB.SalesSummary.day < end.date())
+    ).one()
+    tail = session.execute(text(f"""
+        SELECT COALESCE(SUM(quantity), 0), COALESCE(SUM(revenue), 0), COALESCE(SUM(cost), 0)
+          FROM ({_SALES_ROWS} WHERE ihs.id > :after) b
+         WHERE day >= :start AND day < :end
+    """), {"after": _last_id(session, "sales"), "start": start.date(), "end": end.date()}).one()
+    quantity, revenue, cost = (a + b for a, b in zip(summary, tail))
+    return {"quantity": quantity, "revenue": revenue, "cost": cost, "margin": revenue - cost}
+
+
+def monthly_ledger(session, year):
+    """[(month, income, outcome)] for every month of `year` that has entries."""
+    month = func.extract("month", DB.LedgerSummary.day)
+    rows = session.execute(
+        select(month, func.sum(DB.LedgerSummary.income), func.sum(DB.LedgerSummary.outcome))
+        .where(DB.LedgerSummary.day >= datetime(year, 1, 1).date(),
+               DB.LedgerSummary.day < datetime(year + 1, 1, 1).date())
+        .group_by(month)
+    ).all()
+    totals = {int(m): [i, o] for m, i, o in rows}
+
+    tail = session.execute(text(f"""
+        SELECT EXTRACT(MONTH FROM day), SUM(income), SUM(outcome)
+          FROM ({_LEDGER_ROWS} WHERE id > :after) b
+         WHERE EXTRACT(YEAR FROM day) = :year
+         GROUP BY 1
+    """), {"after": _last_id(session, "ledger"), "year": year}).all()
+    for m, i, o in tail:
+        t = totals.setdefault(int(m), [0, 0])
+        t[0] += i
+        t[1] += o
+
+    return [(m, t[0], t[1]) for m, t in sorted(totals.items())]
+
+
+# ---- scheduler ----
+
+class SummaryScheduler:
+    """Runs refresh() on a daemon thread every `interval` seconds."""
+
+    def __init__(self, engine, interval=300):
+        self.engine = engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="summaries", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        with Session(self.engine) as session:
+            try:
+                # the dashboard's per-posting deltas ride along with the summaries
+                metrics.fold(session)
+                folded = refresh(session)
+                session.commit()
+                return folded
+            except Exception as e:
+                session.rollback()
+                print(f"Error refreshing summaries: {e}")
+                return 0
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+
+def ensure(engine):
+    """Create the summary tables if missing; the first refresh backfills them."""
+    DB.Base.metadata.create_all(engine, tables=SUMMARY_TABLES)
+
+
+if __name__ == "__main__":
+    conn, engine = DB.connect_db()
+    ensure(engine)
+    with Session(engine) as s:
+        rebuild(s)
+        s.commit()
+    print("Summaries rebuilt.")
+    conn.close()
+    engine.dispose()
@@ -1,22 +1,34 @@
 import flet as ft
-import pandas as pd
 from sqlalchemy.orm import Session
 from sqlalchemy import select, or_, func
 import DB
+import parties
+from virtual_table import VColumn, VirtualTable
 
 theme_color = ft.Colors.BLUE
 
+SESSION: Session = None
+APP = None
+
+
+def id_name(iid, n):
+    v = str(iid)
+    for i in [10 ** i for i in range(n, 0, -1)]:
+        if iid < i:
+            v = "0" + v
+    return v
+
 
 class SupplierDetails:
     def __init__(self, page: ft.Page, conn, user_id):
         self.page = page
         self.conn = conn
         self.user_id = user_id
-        self.session = Session(self.conn)
+        self.session = SESSION
 
-        # Load initial suppliers data using SQLAlchemy
-        suppliers_query = self.session.query(DB.Supplier).limit(20).all()
-        self.suppliers = [s.__dict__ for s in suppliers_query]
+        # Load initial suppliers, with their GRN count and balance, in one query
+        self.suppliers = parties.suppliers(self.session)
+        DB.release(self.session)
 
         self.header = ft.Column(
             [
@@ -143,21 +155,34 @@ class SupplierDetails:
             )
         )
 
-        self.grn_table = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("GRN ID", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Date", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Amount", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Paid Amount", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("Status", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
-                ft.DataColumn(ft.Text("User", weight=ft.FontWeight.BOLD, color=ft.Colors.WHITE)),
+        self.grn_table = VirtualTable(
+            [
+                VColumn("GRN ID", expand=2, format=lambda gid: f"grn-{id_name(gid, 8)}"),
+                VColumn("Date", expand=2),
+                VColumn("Amount"),
+                VColumn("Paid Amount"),
+                VColumn("Status"),
+                VColumn("User"),
             ],
-
-            border=ft.border.all(1, ft.Colors.GREY_200),
+            header_color=theme_color + "600",
             bgcolor=theme_color + "100",
-            heading_row_color=theme_color + "600",
-            border_radius=8,
-            expand=True
+        )
+
+        # one row per supplier: (id, (name, company), credit, GRNs, unpaid, last GRN, supplier)
+        self.supplier_table = VirtualTable(
+            [
+                VColumn("ID"),
+                VColumn("Name / Company Name", expand=3, format=lambda nc: f"{nc[0]}\n{nc[1]}"),
+                VColumn("Credit", expand=2),
+                VColumn("GRNs"),
+                VColumn("Unpaid", expand=2),
+                VColumn("Last GRN", expand=2, format=lambda d: d.strftime('%Y-%m-%d') if d else "-"),
+            ],
+            row_height=52,
+            header_color=ft.Colors.GREY_100,
+            header_text_color=ft.Colors.GREY_900,
+            select_color=theme_color + "50",
+            on_select=self.select_supplier,
         )
 
         self.grn_section = ft.Container(
@@ -173,302 +198,106 @@ class SupplierDetails:
                             spacing=10),
                     ),
                     self.supplier_details,
-                    ft.Container(
-                        ft.Row(
-                            [
-                                ft.Container(
-                                    content=self.grn_table,
-                                    expand=True,
-                                )
-                            ],
-                            alignment=ft.MainAxisAlignment.START,
-                            expand=True
-                        ),
-                        expand=True,
-                        alignment=ft.alignment.top_center
-                    )
-
-                ]
-            )
+                    self.grn_table.control,
+                ],
+                expand=True,
+            ),
+            expand=True,
         )
 
         # Initialize suppliers
-        self.Supplier.data = dict()
-        for supplier in self.suppliers:
-            self.Supplier(
-                self.page,
-                supplier["id"],
-                supplier["name"],
-                supplier["company_name"],
-                supplier["code"],
-                supplier["phone_number"],
-                supplier["land_line"],
-                supplier["email"],
-                supplier["address"],
-                supplier["credit"],
-                self.grn_table,
-                self.supplier_details,
-                self.conn
-            )
-        self.page.update()
-        print(len(self.Supplier.data))
-
-    class Supplier:
-        data = dict()
-
-        def __init__(self, page, sid, name, company_name, code, phone_number, land_line, email, address, credit,
-                     grnTable, supplierDetails, conn):
-            self.page = page
-            self.id = sid
-            self.name = name
-            self.company_name = company_name
-            self.code = code
-            self.mobile = phone_number
-            self.land_line = land_line
-            self.email = email
-            self.address = address
-            self.credit = credit
-            self.conn = conn
-            self.session = Session(self.conn)
-
-            # Get GRN data using SQLAlchemy
-            grn_query = self.session.query(DB.GRN).filter(DB.GRN.supplier_id == self.id).all()
-            self.grn = [g.__dict__ for g in grn_query]
-
-            self.supplierDetails = supplierDetails
-            self.grnTable = grnTable
-
-            self.data[self.id] = ft.DataRow(
-                [
-                    ft.DataCell(
-                        ft.Text(str(self.id)),
-                    ),
-                    ft.DataCell(
-                        ft.Column(
-                            [
-                                ft.Text(str(self.name)),
-                                ft.Text(str(self.company_name)),
-                            ]
-                        )
-                    ),
-                    ft.DataCell(
-                        ft.Text(str(self.credit)),
-                    )
-                ],
-                on_select_changed=self.select,
-            )
-
-            self.page.update()
-
-        def id_name(self, iid: str, n):
-            v = str(iid)
-            for i in [10 ** i for i in range(n, 0, -1)]:
-                if iid < i:
-                    v = "0" + v
-            return v
+        self.show_suppliers(self.suppliers)
 
-        def select(self, e):
-            for i, row in self.data.items():
-                row.color = ft.Colors.WHITE
-
-            e.control.color = theme_color + "50"
-
-            self.supplierDetails.content = ft.Row(
-                [
-                    ft.Row(
-                        [
-                            ft.Icon(
-                                ft.Icons.ACCOUNT_CIRCLE,
-                                color=theme_color
-                            ),
-                            ft.Text(
-                                str(self.name),
-                                size=12,
-                                weight=ft.FontWeight.BOLD,
-                                selectable=True
-                            )
-                        ]
-                    ),
-                    ft.Row(
-                        [
-                            ft.Icon(
-                                ft.Icons.BUSINESS,
-                                color=theme_color
-                            ),
-                            ft.Text(
-                                f"{self.company_name}, {self.address}",
-                                size=12,
-                                weight=ft.FontWeight.BOLD,
-                                selectable=True
-                            )
-                        ]
-                    ),
-                    ft.Row(
-                        [
-                            ft.Icon(
-                                ft.Icons.CONTACT_PHONE,
-                                color=theme_color
-                            ),
-                            ft.Text(
-                                f"{self.mobile} | {self.land_line}",
-                                size=12,
-                                weight=ft.FontWeight.BOLD,
-                            )
-                        ]
-                    ),
-                    ft.Row(
-                        [
-                            ft.Icon(
-                                ft.Icons.CURRENCY_EXCHANGE,
-                                color=theme_color
-                            ),
-                            ft.Text(
-                                str(self.credit),
-                                size=12,
-                                weight=ft.FontWeight.BOLD,
-                            )
-                        ]
-                    ),
-                ],
-                expand=True,
-                alignment=ft.MainAxisAlignment.SPACE_BETWEEN
-            )
+    def show_suppliers(self, suppliers):
+        self.supplier_table.set_rows(
+            (sup.id, (sup.name, sup.company_name), sup.credit, sup.grn_count, sup.outstanding,
+             sup.last_activity, sup)
+            for sup in suppliers
+        )
+        self.page.update()
 
-            # Get GRN data using SQLAlchemy
-            grn_query = self.session.query(DB.GRN).filter(DB.GRN.supplier_id == self.id).all()
-            result = [g.__dict__ for g in grn_query]
+    def select_supplier(self, index, row):
+        supplier = row[-1]
 
-            self.grnTable.rows = [
-                ft.DataRow(
+        self.supplier_details.content = ft.Row(
+            [
+                ft.Row(
                     [
-                        ft.DataCell(
-                            ft.Text(f'grn-{self.id_name(grn["id"], 8)}'),
-                        ),
-                        ft.DataCell(
-                            ft.Text(str(grn["created_on"])),
+                        ft.Icon(
+                            ft.Icons.ACCOUNT_CIRCLE,
+                            color=theme_color
                         ),
-                        ft.DataCell(
-                            ft.Text(str(grn["total_amount"])),
+                        ft.Text(
+                            str(supplier.name),
+                            size=12,
+                            weight=ft.FontWeight.BOLD,
+                            selectable=True
+                        )
+                    ]
+                ),
+                ft.Row(
+                    [
+                        ft.Icon(
+                            ft.Icons.BUSINESS,
+                            color=theme_color
                         ),
-                        ft.DataCell(
-                            ft.Text(str(grn["paid_amount"])),
+                        ft.Text(
+                            f"{supplier.company_name}, {supplier.address}",
+                            size=12,
+                            weight=ft.FontWeight.BOLD,
+                            selectable=True
+                        )
+                    ]
+                ),
+                ft.Row(
+                    [
+                        ft.Icon(
+                            ft.Icons.CONTACT_PHONE,
+                            color=theme_color
                         ),
-                        ft.DataCell(
-                            ft.Text(str(grn["status"])),
+                        ft.Text(
+                            f"{supplier.phone_number} | {supplier.land_line}",
+                            size=12,
+                            weight=ft.FontWeight.BOLD,
+                        )
+                    ]
+                ),
+                ft.Row(
+                    [
+                        ft.Icon(
+                            ft.Icons.CURRENCY_EXCHANGE,
+                            color=theme_color
                         ),
-                        ft.DataCell(
-                            ft.Text(str(grn["user_id"])),
+                        ft.Text(
+                            str(supplier.credit),
+                            size=12,
+                            weight=ft.FontWeight.BOLD,
                         )
                     ]
-                ) for grn in result
-            ]
+                ),
+            ],
+            expand=True,
+            alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+        )
+
+        # this supplier's GRNs load only now that the row is selected
+        grns = self.session.query(
+            DB.GRN.id, DB.GRN.created_on, DB.GRN.total_amount, DB.GRN.paid_amount, DB.GRN.status, DB.GRN.user_id
+        ).filter(DB.GRN.supplier_id == supplier.id).order_by(DB.GRN.id.desc()).all()
+        DB.release(self.session)
 
-            self.page.update()
+        self.grn_table.set_rows(tuple(grn) for grn in grns)
+
+        self.page.update()
 
     def filter_supplier(self, e):
         query = e.control.value.lower()
 
-        # Use SQLAlchemy for supplier search
-        suppliers_query = self.session.query(DB.Supplier).filter(
-            or_(
-                DB.Supplier.name.ilike(f"%{query}%"),
-                DB.Supplier.phone_number.ilike(f"%{query}%"),
-                DB.Supplier.company_name.ilike(f"%{query}%"),
-                DB.Supplier.land_line.ilike(f"%{query}%"),
-                DB.Supplier.email.ilike(f"%{query}%"),
-                DB.Supplier.address.ilike(f"%{query}%"),
-                DB.Supplier.code.ilike(f"%{query}%")
-            )
-        ).limit(20).all()
-
-        result = [s.__dict__ for s in suppliers_query]
-
-        self.Supplier.data = dict()
-
-        for supplier in result:
-            self.Supplier(
-                self.page,
-                supplier["id"],
-                supplier["name"],
-                supplier["company_name"],
-                supplier["code"],
-                supplier["phone_number"],
-                supplier["land_line"],
-                supplier["email"],
-                supplier["address"],
-                supplier["credit"],
-                self.grn_table,
-                self.supplier_details,
-                self.conn
-            )
+        result = parties.suppliers(self.session, query)
+        DB.release(self.session)
 
-        self.supplier_details_container.content = ft.Container(
-            ft.Row(
-                [
-                    ft.Column(
-                        [
-                            ft.Container(
-                                ft.Row(
-                                    [
-                                        ft.DataTable(
-                                            columns=[
-                                                ft.DataColumn(
-                                                    ft.Text("ID")
-                                                ),
-                                                ft.DataColumn(
-                                                    ft.Text("Name / Company Name")
-                                                ),
-                                                ft.DataColumn(
-                                                    ft.Text("Credit")
-                                                )
-                                            ],
-                                            expand=True,
-                                        ),
-                                    ],
-                                    expand=True,
-                                )
-                            ),
-                            ft.Container(
-                                ft.Column(
-                                    [
-                                        ft.Row(
-                                            [
-                                                ft.DataTable(
-                                                    columns=[
-                                                        ft.DataColumn(
-                                                            ft.Text("ID")
-                                                        ),
-                                                        ft.DataColumn(
-                                                            ft.Text("Name / Mobile")
-                                                        ),
-                                                        ft.DataColumn(
-                                                            ft.Text("Credit")
-                                                        )
-                                                    ],
-                                                    heading_row_height=0,
-                                                    rows=list(self.Supplier.data.values()),
-                                                    expand=True,
-                                                ),
-                                            ],
-                                            expand=True,
-                                        )
-                                    ],
-                                    expand=True,
-                                    scroll=ft.ScrollMode.AUTO
-                                ),
-                                expand=True
-                            ),
-                        ],
-                        spacing=0,
-                        alignment=ft.MainAxisAlignment.START,
-                        expand=True,
-                    ),
-                ],
-                expand=True,
-                alignment=ft.MainAxisAlignment.START,
-            ),
-            alignment=ft.Alignment(0, 0),
-        )
+        self.show_suppliers(result)
+        self.supplier_details_container.content = self.supplier_table.control
 
         self.page.update()
 
@@ -530,9 +359,23 @@ class SupplierDetails:
 
 
 def supplierDetails(page: ft.Page, conn, user_id):
+    global SESSION, APP
+    SESSION = DB.new_session(SESSION)
     app = SupplierDetails(page, conn, user_id)
+    APP = app
     return app.build()
 
 
+def refresh():
+    """
+    Screen cache hook: suppliers or GRNs changed; reload the list. Runs on the
+    events thread, so it reads through its own short-lived session.
+    """
+    if APP:
+        with DB.SessionLocal() as session:
+            suppliers = parties.suppliers(session, (APP.search_bar.value or "").lower())
+        APP.show_suppliers(suppliers)
+
+
 if __name__ == "__main__":
     ft.app(supplierDetails)
\ No newline at end of file
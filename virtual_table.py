@@ -0,0 +1,214 @@
+# virtual_table.py
+# Virtualized table for the history screens (recent transactions, customer
+# and supplier details). Rows live in a plain list of tuples; only the rows
+# in the visible window (plus a little overscan) exist as Flet controls, and
+# those controls are re-bound to new rows as the user scrolls. Memory and
+# the size of each UI diff therefore stay flat whether the store holds 20
+# rows or 100,000.
+#
+# The header is its own row above the scrolling body, so a second "dummy"
+# DataTable is no longer needed to keep it in view.
+
+import math
+
+import flet as ft
+
+
+class VColumn:
+    """
+    One column of a VirtualTable.
+
+    `format(value)` turns the raw value into the cell text. `style(value)`
+    may return a dict with "bgcolor", "color" and/or "weight" to draw the
+    cell as a pill (the status badges). Columns share the row width by
+    `expand`, unless given a fixed `width`.
+    """
+
+    __slots__ = ("label", "width", "expand", "format", "style")
+
+    def __init__(self, label, width=None, expand=1, format=str, style=None):
+        self.label = label
+        self.width = width
+        self.expand = None if width else expand
+        self.format = format
+        self.style = style
+
+
+class _Slot:
+    """A pooled row of controls, bound to whichever store index is in view."""
+
+    __slots__ = ("row", "pills", "texts", "index")
+
+    def __init__(self, row, pills, texts):
+        self.row = row
+        self.pills = pills
+        self.texts = texts
+        self.index = None
+
+
+class VirtualTable:
+    """
+    A table over a row store that only materializes the visible window.
+
+    set_rows() replaces the store, extend() appends a page. on_select(index,
+    row) fires when a row is clicked; on_end_reached() fires once per store
+    size when the user scrolls near the bottom, for loading the next page.
+    Use `control` to place the table in a layout.
+    """
+
+    def __init__(self, columns, row_height=40, visible_rows=20, overscan=5,
+                 header_color=ft.Colors.BLUE_600, header_text_color=ft.Colors.WHITE,
+                 bgcolor=ft.Colors.WHITE, select_color=None, on_select=None,
+                 on_end_reached=None, border_radius=8, expand=True):
+        self.columns = columns
+        self.row_height = row_height
+        self.overscan = overscan
+        self.bgcolor = bgcolor
+        self.select_color = select_color
+        self.on_select = on_select
+        self.on_end_reached = on_end_reached
+
+        self.rows = []
+        self.selected = None
+        self._first = 0
+        self._end_fired_at = None
+        self._pool = []
+
+        self._header = ft.Container(
+            ft.Row([self._cell(col, ft.Text(col.label, weight=ft.FontWeight.BOLD, color=header_text_color))
+                    for col in columns], spacing=0),
+            bgcolor=header_color,
+            height=row_height,
+            border_radius=ft.BorderRadius(border_radius, border_radius, 0, 0),
+        )
+
+        # the window of pooled rows sits at the scroll offset inside a canvas
+        # as tall as the whole store, so the scrollbar reflects every row
+        self._window = ft.Column(spacing=0)
+        self._slot = ft.Container(self._window, top=0, left=0, right=0)
+        self._canvas = ft.Stack([self._slot], height=0)
+        self._body = ft.Column(
+            [self._canvas],
+            scroll=ft.ScrollMode.AUTO,
+            expand=True,
+            spacing=0,
+            on_scroll=self._on_scroll,
+            on_scroll_interval=30,
+        )
+
+        self._grow(visible_rows + 2 * overscan)
+
+        self.control = ft.Container(
+            ft.Column([self._header, self._body], spacing=0, expand=True),
+            bgcolor=bgcolor,
+            border=ft.border.all(1, ft.Colors.GREY_200),
+            border_radius=border_radius,
+            expand=expand,
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    # ---- store ----
+
+    def set_rows(self, rows):
+        """Replace the store and scroll back to the top."""
+        self.rows = list(rows)
+        self.selected = None
+        self._first = 0
+        self._end_fired_at = None
+        self._render()
+        if self._body.page:
+            self._body.scroll_to(offset=0, duration=0)
+
+    def extend(self, rows):
+        """Append rows (the next page) to the store."""
+        self.rows.extend(rows)
+        self._render()
+
+    def clear(self):
+        self.set_rows([])
+
+    def select(self, index, notify=True):
+        """Highlight the row at `index` and, unless `notify` is false, call on_select for it."""
+        self.selected = index
+        for slot in self._pool:
+            self._paint(slot)
+        if notify and self.on_select and index is not None and index < len(self.rows):
+            self.on_select(index, self.rows[index])
+
+    # ---- window ----
+
+    def _cell(self, col, content):
+        return ft.Container(content, width=col.width, expand=col.expand,
+                            padding=ft.padding.symmetric(horizontal=8),
+                            alignment=ft.alignment.center_left)
+
+    def _grow(self, size):
+        while len(self._pool) < size:
+            pills, texts = [], []
+            cells = []
+            for col in self.columns:
+                text = ft.Text("", size=13, max_lines=2, overflow=ft.TextOverflow.ELLIPSIS)
+                pill = ft.Container(text, border_radius=15, padding=ft.padding.symmetric(2, 8))
+                texts.append(text)
+                pills.append(pill)
+                cells.append(self._cell(col, pill))
+            slot = _Slot(None, pills, texts)
+            slot.row = ft.Container(
+                ft.Row(cells, spacing=0),
+                height=self.row_height,
+                border=ft.border.only(bottom=ft.border.BorderSide(1, ft.Colors.GREY_200)),
+                on_click=lambda e, s=slot: self._clicked(s),
+            )
+            self._pool.append(slot)
+            self._window.controls.append(slot.row)
+
+    def _bind(self, slot, index):
+        slot.index = index
+        if index >= len(self.rows):
+            slot.row.visible = False
+            return
+        slot.row.visible = True
+        for col, value, pill, text in zip(self.columns, self.rows[index], slot.pills, slot.texts):
+            text.value = col.format(value)
+            style = col.style(value) if col.style else None
+            pill.bgcolor = style.get("bgcolor") if style else None
+            text.color = style.get("color") if style else None
+            text.weight = style.get("weight") if style else None
+        self._paint(slot)
+
+    def _paint(self, slot):
+        selected = self.select_color and slot.index is not None and slot.index == self.selected
+        slot.row.bgcolor = self.select_color if selected else None
+
+    def _render(self):
+        self._canvas.height = len(self.rows) * self.row_height
+        self._slot.top = self._first * self.row_height
+        for n, slot in enumerate(self._pool):
+            self._bind(slot, self._first + n)
+
+    def _clicked(self, slot):
+        if slot.index is not None and slot.index < len(self.rows):
+            self.select(slot.index)
+            self.control.update()
+
+    def _on_scroll(self, e):
+        changed = False
+        if e.viewport_dimension:
+            needed = math.ceil(e.viewport_dimension / self.row_height) + 2 * self.overscan
+            if needed > len(self._pool):
+                self._grow(needed)
+                changed = True
+
+        first = max(0, int(e.pixels // self.row_height) - self.overscan)
+        if first != self._first or changed:
+            self._first = first
+            self._render()
+            self._canvas.update()
+
+        near_end = e.max_scroll_extent is not None and \
+            e.pixels >= e.max_scroll_extent - self.overscan * self.row_height
+        if near_end and self.on_end_reached and self._end_fired_at != len(self.rows):
+            self._end_fired_at = len(self.rows)
+            self.on_end_reached()